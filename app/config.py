@@ -1,20 +1,189 @@
 import os
+import tempfile
 from functools import lru_cache
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     # API Keys
-    gemini_api_key: str
+    gemini_api_key: str = ""
     weather_api_key: str = ""
     
     # Database
     database_url: str = "sqlite:///./farmer_db.db"
+    db_echo: bool = False
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout_seconds: int = 10
+    db_pool_recycle_seconds: int = 1800
+    
+    # Query log (batched background writes)
+    query_log_enabled: bool = True
+    query_log_batch_size: int = 100
+    query_log_flush_ms: int = 500
+    query_log_max_queue: int = 10000
     
     # Server
     host: str = "localhost"
     port: int = 8000
     debug: bool = True
     
+    # LLM
+    llm_max_concurrency: int = 16
+    llm_warmup: bool = False
+    # Fallback chain: "gemini:<model>[@timeout]" and "stub[@timeout]" entries, tried in order
+    llm_backends: str = "gemini:gemini-pro,gemini:gemini-1.5-flash@20,stub@5"
+    llm_timeout_seconds: float = 30.0
+    llm_min_timeout_seconds: float = 5.0
+    llm_breaker_failures: int = 5
+    llm_breaker_reset_seconds: float = 30.0
+    llm_hedge_enabled: bool = True
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_samples: int = 20
+    llm_stub_latency_ms: float = 0.0
+    # Above llm_stub_latency_ms (then the median), stub latency is lognormal with this p99
+    llm_stub_latency_p99_ms: float = 0.0
+    gemini_models_url: str = "https://generativelanguage.googleapis.com/v1beta/models"
+    
+    # Prompt assembly
+    # Most prompt tokens per LLM call; history and advisory passages are left out beyond it
+    prompt_token_budget: int = 2000
+    # tokenizer.json (e.g. Gemma's) for exact token counts; estimated without it
+    prompt_tokenizer_path: str = ""
+    
+    # Conversation memory
+    memory_enabled: bool = True
+    memory_window_turns: int = 4
+    memory_max_sessions: int = 10000
+    memory_summary_max_chars: int = 600
+    memory_sqlite_path: str = ""
+    
+    # Batch queries
+    batch_max_items: int = 100
+    batch_max_concurrency: int = 8
+    
+    # Weather
+    weather_api_url: str = "http://api.openweathermap.org/data/2.5/weather"
+    weather_cache_ttl_seconds: int = 600
+    weather_cache_max_entries: int = 2048
+    
+    # Market prices (ingested AGMARKNET / eNAM dumps)
+    market_db_path: str = "./market_prices.db"
+    market_trend_window_days: int = 7
+    market_nearby_limit: int = 3
+    
+    # Location resolution (offline gazetteer)
+    gazetteer_path: str = "./data/geo/gazetteer.csv"
+    weather_stations_path: str = "./data/geo/weather_stations.csv"
+    location_fuzzy_cutoff: float = 0.8
+    location_cache_size: int = 10000
+    # Locations within this distance share their nearest station's weather
+    weather_station_max_km: float = 50.0
+    
+    # Image analysis (local pest/disease classifier)
+    image_model_path: str = "./data/models/pest_disease_int8.onnx"
+    image_labels_path: str = "./data/models/pest_disease_labels.txt"
+    image_input_size: int = 224
+    image_max_bytes: int = 5_000_000
+    image_max_pixels: int = 40_000_000
+    image_workers: int = 2
+    image_inference_threads: int = 2
+    image_max_batch: int = 8
+    image_batch_wait_ms: int = 10
+    image_cache_size: int = 1024
+    image_hash_max_distance: int = 4
+    image_top_k: int = 3
+    
+    # Voice queries (offline speech-to-text)
+    speech_model: str = "base"
+    speech_model_dir: str = ""
+    speech_compute_type: str = "int8"
+    speech_workers: int = 1
+    speech_threads: int = 2
+    speech_beam_size: int = 1
+    speech_max_bytes: int = 10_000_000
+    speech_max_seconds: float = 120.0
+    speech_segment_seconds: float = 8.0
+    
+    # Local agronomy knowledge base (retrieval for prompts and FAQ answers)
+    knowledge_enabled: bool = True
+    knowledge_docs_dir: str = "./data/agronomy"
+    knowledge_index_path: str = "./data/agronomy/index.db"
+    knowledge_top_k: int = 3
+    # Share of the question's terms a passage must contain to be used
+    knowledge_min_coverage: float = 0.55
+    # Term overlap (Jaccard) with a FAQ question above which its answer is served without the LLM
+    knowledge_faq_threshold: float = 0.75
+    knowledge_chunk_words: int = 120
+    
+    # Translation of English-only answers (FAQ, offline rules) into the farmer's language
+    translation_enabled: bool = True
+    # Tried in order until one translates the whole answer: "llm" (the LLM chain), "glossary" (offline phrase tables)
+    translation_backends: str = "llm,glossary"
+    translation_glossary_dir: str = "./data/translations"
+    translation_cache_max_entries: int = 2048
+    translation_cache_ttl_seconds: int = 604800
+    
+    # Multi-worker deployment (shared cache and rate limits)
+    workers: int = 1
+    shared_store_path: str = ""
+    rate_limit_enabled: bool = True
+    rate_limit_ip_per_minute: float = 120.0
+    rate_limit_ip_burst: int = 30
+    rate_limit_farmer_per_minute: float = 20.0
+    rate_limit_farmer_burst: int = 5
+    
+    # Response encoding (metered mobile data)
+    compression_enabled: bool = True
+    compression_min_bytes: int = 500
+    gzip_level: int = 6
+    brotli_quality: int = 5
+    compact_encoding_enabled: bool = True
+    static_cache_max_age_seconds: int = 3600
+    
+    # Health checks
+    health_refresh_seconds: float = 30.0
+    health_check_timeout_seconds: float = 3.0
+    
+    # Outbound HTTP
+    http_timeout_seconds: float = 5.0
+    http_connect_timeout_seconds: float = 2.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    
+    # Upstream calls (deadlines, retries, circuit breakers)
+    request_deadline_seconds: float = 60.0
+    upstream_timeout_percentile: float = 0.99
+    upstream_timeout_multiplier: float = 3.0
+    upstream_min_timeout_seconds: float = 0.25
+    upstream_max_attempts: int = 3
+    upstream_backoff_base_ms: int = 100
+    upstream_backoff_max_ms: int = 1000
+    upstream_breaker_failures: int = 5
+    upstream_breaker_reset_seconds: float = 30.0
+    upstream_hedge_enabled: bool = True
+    
+    # Response cache
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_ttl_seconds: int = 21600
+    response_cache_similarity: float = 0.8
+    
+    # Background jobs (?mode=async on the query endpoints)
+    jobs_enabled: bool = True
+    job_queue_path: str = "./jobs.db"
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_retry_base_seconds: float = 2.0
+    job_timeout_seconds: float = 120.0
+    job_poll_seconds: float = 1.0
+    # Finished jobs are deleted after this long (7 days)
+    job_retention_seconds: int = 604800
+    job_webhook_attempts: int = 3
+    # Webhooks carry X-Webhook-Signature: sha256=<HMAC of the body> when set
+    job_webhook_secret: str = ""
+    # Comma-separated hosts callback URLs may point to; empty disables callback URLs
+    job_webhook_allowed_hosts: str = ""
+    
     # Security
     secret_key: str = "your-secret-key-change-in-production"
     
@@ -24,4 +193,19 @@ class Settings(BaseSettings):
 
 @lru_cache()
 def get_settings():
-    return Settings()
\ No newline at end of file
+    return Settings()
+
+def worker_count(settings: Settings) -> int:
+    """WORKERS, or one worker per CPU core when it is 0"""
+    return settings.workers or os.cpu_count() or 1
+
+def use_shared_store_file(settings: Settings) -> str:
+    """
+    Point every worker at one shared store file, unless SHARED_STORE_PATH
+    already names one. Spawned workers read it from the environment;
+    forked workers inherit the updated settings object.
+    """
+    if not settings.shared_store_path:
+        settings.shared_store_path = os.path.join(tempfile.gettempdir(), f"farmer-shared-{settings.port}.db")
+        os.environ["SHARED_STORE_PATH"] = settings.shared_store_path
+    return settings.shared_store_path
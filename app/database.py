@@ -1,12 +1,37 @@
-from sqlalchemy import create_engine, MetaData
+import asyncio
+from sqlalchemy import create_engine, event, MetaData, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
 
 settings = get_settings()
 
+is_sqlite = settings.database_url.startswith("sqlite")
+
+# Connection pool settings per backend
+if is_sqlite:
+    engine_options = {"connect_args": {"check_same_thread": False, "timeout": 30}}
+else:
+    engine_options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": True,
+    }
+
 # Create database engine
-engine = create_engine(settings.database_url, echo=settings.debug)
+engine = create_engine(settings.database_url, echo=settings.db_echo, **engine_options)
+
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets readers proceed while the query log writer commits"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -25,4 +50,35 @@ def get_db():
 # Initialize database
 async def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    await asyncio.to_thread(create_tables)
+
+def create_tables():
+    """Create tables and seed categories (blocking)"""
+    from app.models import db_models
+    from app.models.schemas import QueryCategory
+    
+    Base.metadata.create_all(bind=engine)
+    
+    # Seed the category lookup table
+    db = SessionLocal()
+    try:
+        existing = {name for (name,) in db.query(db_models.Category.name)}
+        for category in QueryCategory:
+            if category.value not in existing:
+                db.add(db_models.Category(
+                    name=category.value,
+                    label=category.value.replace("_", " ").title()
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def check_connection() -> bool:
+    """Run SELECT 1 against the database (blocking, call from a thread)"""
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    finally:
+        db.close()
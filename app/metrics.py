@@ -0,0 +1,209 @@
+import math
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond handlers to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Text size buckets in characters
+SIZE_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+# Prompt size buckets in tokens
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter; label values are passed as a tuple"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        values = self._values
+        values[labels] = values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...] = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1):
+        values = self._values
+        values[labels] = values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: Tuple[str, ...] = ()):
+        self._values[labels] = value
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is one bisect and three list updates"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[str, ...] = ()):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: Tuple[str, ...] = ()) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(series[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._callbacks: List[Tuple[str, str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_callback(self, name: str, documentation: str, kind: str,
+                          collect: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]):
+        """
+        Metric computed at scrape time from existing state (e.g. cache stats).
+        collect() returns {((label, value), ...): sample}.
+        """
+        self._callbacks.append((name, documentation, kind, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, documentation, kind, collect in self._callbacks:
+            try:
+                samples = collect()
+            except Exception as e:
+                logger.error(f"Metrics callback {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples.items():
+                names = [label for label, _ in labels]
+                values = [label_value for _, label_value in labels]
+                lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Global registry and the metrics shared across the app
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+ERRORS = registry.counter("errors_total", "Errors by component and exception type", ("component", "exception"))
+
+QUERY_STAGE_LATENCY = registry.histogram(
+    "farmer_query_stage_duration_seconds", "Time spent in each stage of farmer query processing", ("stage",)
+)
+LLM_IN_FLIGHT = registry.gauge("llm_requests_in_flight", "LLM completions currently in flight")
+LLM_PROMPT_CHARS = registry.histogram(
+    "llm_prompt_chars", "Size of prompts sent to the LLM in characters", buckets=SIZE_BUCKETS
+)
+LLM_PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "Size of prompts sent to the LLM in tokens", buckets=TOKEN_BUCKETS
+)
+PROMPT_TRIMMED = registry.counter(
+    "llm_prompt_trimmed_total", "Prompt parts left out to fit the token budget", ("part",)
+)
+LLM_RESPONSE_CHARS = registry.histogram(
+    "llm_response_chars", "Size of LLM responses in characters", buckets=SIZE_BUCKETS
+)
+UPSTREAM_CALLS = registry.counter(
+    "upstream_calls_total", "Calls to external dependencies by outcome", ("dependency", "outcome")
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_call_duration_seconds", "Latency of successful dependency calls, retries included", ("dependency",)
+)
+UPSTREAM_RETRIES = registry.counter("upstream_retries_total", "Retried dependency calls", ("dependency",))
+UPSTREAM_HEDGES = registry.counter("upstream_hedged_requests_total", "Hedged dependency requests", ("dependency",))
+IMAGE_BATCH_SIZE = registry.histogram(
+    "image_inference_batch_size", "Images per classifier run", buckets=(1, 2, 4, 8, 16, 32)
+)
+IMAGE_CACHE = registry.counter("image_analysis_cache_total", "Image analysis cache lookups by result", ("result",))
+SPEECH_REAL_TIME_FACTOR = registry.histogram(
+    "speech_real_time_factor", "Transcription time divided by audio duration",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)
+)
+RATE_LIMITED = registry.counter("rate_limited_requests_total", "Requests refused by rate limiting", ("scope",))
+RESPONSE_BODY_BYTES = registry.counter(
+    "http_response_body_bytes_total", "Response body bytes sent, by content encoding", ("encoding",)
+)
+JOBS_FINISHED = registry.counter(
+    "jobs_total", "Background job attempts by kind and outcome", ("kind", "outcome")
+)
+JOB_QUEUE_WAIT = registry.histogram(
+    "job_queue_wait_seconds", "Time from job submission to its first attempt", ("kind",)
+)
+JOB_RUN_TIME = registry.histogram("job_run_duration_seconds", "Duration of job attempts", ("kind",))
+WEBHOOK_DELIVERIES = registry.counter("job_webhooks_total", "Job webhook deliveries by outcome", ("outcome",))
@@ -0,0 +1,156 @@
+import zlib
+import importlib
+import importlib.util
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from app.metrics import RESPONSE_BODY_BYTES
+
+# Content types worth compressing; photos, audio and already-compressed formats are sent as they are
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/msgpack", "application/cbor",
+    "application/javascript", "application/xml",
+)
+
+
+def _accepted_encodings(header: str) -> dict:
+    """Parse Accept-Encoding into {coding: q}"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class _Compressor:
+    """One response's gzip or brotli stream; flush() emits everything so far, so streamed events arrive promptly"""
+
+    __slots__ = ("encoding", "_stream")
+
+    def __init__(self, encoding: str, brotli, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._stream = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 31: gzip container around the deflate stream
+            self._stream = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def flush(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._stream.process(data) + self._stream.flush()
+        return self._stream.compress(data) + self._stream.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._stream.process(data) + self._stream.finish()
+        return self._stream.compress(data) + self._stream.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli (when installed) or gzip, as
+    negotiated by Accept-Encoding. Bodies under minimum_size are sent as
+    they are, since headers and framing would eat the saving. Streamed
+    responses (SSE, NDJSON) are compressed chunk by chunk with a flush
+    after each, so events are not held back waiting for a full block.
+    Plain ASGI, like the other middleware here.
+    """
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli = importlib.import_module("brotli") if importlib.util.find_spec("brotli") else None
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = _accepted_encodings(value.decode("latin-1"))
+                break
+        else:
+            return None
+        wildcard = accepted.get("*", 0.0)
+        gzip_q = accepted.get("gzip", wildcard)
+        br_q = accepted.get("br", wildcard) if self.brotli is not None else 0.0
+        if br_q > 0 and br_q >= gzip_q:
+            return "br"
+        if gzip_q > 0:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            async def send_counted(message):
+                if message["type"] == "http.response.body":
+                    RESPONSE_BODY_BYTES.inc(("identity",), len(message.get("body", b"")))
+                await send(message)
+
+            await self.app(scope, receive, send_counted)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compressing is worthwhile
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                if message["type"] == "http.response.body":
+                    RESPONSE_BODY_BYTES.inc(("identity",), len(message.get("body", b"")))
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = Headers(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                if ("content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    RESPONSE_BODY_BYTES.inc(("identity",), len(body))
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.brotli, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag is not None and etag.startswith('"'):
+                    # The compressed bytes differ from the identity body, so the validator can only be weak
+                    headers["ETag"] = f"W/{etag}"
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    RESPONSE_BODY_BYTES.inc((encoding,), len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            body = compressor.flush(body) if more_body else compressor.finish(body)
+            RESPONSE_BODY_BYTES.inc((encoding,), len(body))
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,39 @@
+from app.services.resilience import reset_deadline, set_deadline
+
+# Clients may ask for a shorter budget than the server default, never a longer one
+DEADLINE_HEADER = b"x-request-timeout"
+
+
+class DeadlineMiddleware:
+    """
+    Gives every request a time budget that all upstream calls made while
+    serving it share (see app.services.resilience). The budget is the
+    configured default, or the X-Request-Timeout header in seconds if that
+    is shorter.
+    """
+    
+    def __init__(self, app, default_seconds: float):
+        self.app = app
+        self.default_seconds = default_seconds
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        seconds = self.default_seconds
+        for name, value in scope["headers"]:
+            if name == DEADLINE_HEADER:
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0:
+                    seconds = min(seconds, requested)
+                break
+        
+        token = set_deadline(seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
@@ -0,0 +1,41 @@
+from time import perf_counter
+from app.metrics import ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+
+
+class MetricsMiddleware:
+    """
+    Records per-route latency, status counts, in-flight requests and
+    unhandled exceptions. Plain ASGI (no BaseHTTPMiddleware) to keep the
+    per-request overhead to a few microseconds.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = [500]
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+        
+        start = perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            ERRORS.inc(("http", type(e).__name__))
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template so path parameters do not explode cardinality
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            HTTP_LATENCY.observe(elapsed, labels)
+            HTTP_REQUESTS.inc(labels + (status[0],))
@@ -0,0 +1,59 @@
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, JSON, String, Text
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class Category(Base):
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(32), unique=True, nullable=False)
+    label = Column(String(64), nullable=False)
+
+class Farmer(Base):
+    __tablename__ = "farmers"
+    
+    id = Column(String(64), primary_key=True)
+    location = Column(String(128))
+    crop_type = Column(String(64))
+    language = Column(String(32))
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    last_seen_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    queries = relationship("Query", back_populates="farmer")
+
+class Query(Base):
+    __tablename__ = "queries"
+    
+    id = Column(Integer, primary_key=True)
+    farmer_id = Column(String(64), ForeignKey("farmers.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    text = Column(Text, nullable=False)
+    query_type = Column(String(16), nullable=False, default="text")
+    location = Column(String(128))
+    crop_type = Column(String(64))
+    language = Column(String(32))
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    farmer = relationship("Farmer", back_populates="queries")
+    category = relationship("Category")
+    answer = relationship("Answer", back_populates="query", uselist=False)
+    
+    __table_args__ = (
+        Index("ix_queries_farmer_created", "farmer_id", "created_at"),
+        Index("ix_queries_category_created", "category_id", "created_at"),
+    )
+
+class Answer(Base):
+    __tablename__ = "answers"
+    
+    id = Column(Integer, primary_key=True)
+    query_id = Column(Integer, ForeignKey("queries.id"), unique=True, nullable=False)
+    text = Column(Text, nullable=False)
+    confidence_score = Column(Float, nullable=False)
+    suggestions = Column(JSON, default=list)
+    sources = Column(JSON, default=list)
+    succeeded = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    
+    query = relationship("Query", back_populates="answer")
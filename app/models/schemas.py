@@ -26,6 +26,31 @@ class FarmerQueryRequest(BaseModel):
     location: Optional[str] = None
     crop_type: Optional[str] = None
     language: str = Field(default="english", description="Response language preference")
+    use_cache: bool = Field(default=True, description="Set to false to bypass the answer cache")
+
+class Dosage(BaseModel):
+    text: str = Field(..., description="The dose as written in the answer, e.g. 5 ml/liter")
+    amount: float
+    amount_max: Optional[float] = Field(None, description="Upper end of a range such as 2-4 tonnes/acre")
+    unit: str
+    per: str = Field(..., description="What the amount is per: acre, hectare, liter, kg of seed, plant")
+
+class TimeWindow(BaseModel):
+    text: str = Field(..., description="The timing as written in the answer, e.g. 30-45 days after sowing")
+    start: Optional[float] = Field(None, description="Number of units; empty for calendar windows")
+    end: Optional[float] = None
+    unit: str = Field(..., description="hours, days, weeks, months, years, or calendar for month names")
+    anchor: Optional[str] = Field(None, description="Crop event the timing counts from, e.g. after sowing")
+
+class ChemicalMention(BaseModel):
+    name: str
+    formulation: Optional[str] = Field(None, description="Formulation as written, e.g. 30 EC")
+    safety_flags: List[str] = Field(default=[], description="banned, highly_toxic, restricted, bee_toxic, fish_toxic")
+
+class AnswerExtras(BaseModel):
+    dosages: List[Dosage] = []
+    time_windows: List[TimeWindow] = []
+    chemicals: List[ChemicalMention] = []
 
 class FarmerQueryResponse(BaseModel):
     answer: str = Field(..., description="AI-generated response")
@@ -33,18 +58,53 @@ class FarmerQueryResponse(BaseModel):
     category: QueryCategory
     suggestions: List[str] = Field(default=[], description="Additional suggestions")
     sources: List[str] = Field(default=[], description="Information sources")
+    extras: AnswerExtras = Field(default_factory=AnswerExtras, description="Doses, timings and chemicals named in the answer")
     timestamp: datetime
 
+class BatchQueryRequest(BaseModel):
+    queries: List[FarmerQueryRequest] = Field(..., description="Farmer queries to answer")
+    max_concurrency: Optional[int] = Field(None, ge=1, description="Max queries processed at once")
+
+class BatchQueryItem(BaseModel):
+    index: int = Field(..., description="Position of the query in the request")
+    response: Optional[FarmerQueryResponse] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+    total: int
+    unique: int = Field(..., description="Queries left after removing duplicates")
+
 class VoiceQueryRequest(BaseModel):
-    audio_base64: str = Field(..., description="Base64 encoded audio")
+    audio_base64: str = Field(..., description="Base64 encoded audio (WAV, OGG/Opus, MP3, M4A or raw PCM)")
+    sample_rate: Optional[int] = Field(None, description="Set only for raw 16-bit mono PCM audio")
     farmer_id: Optional[str] = None
     location: Optional[str] = None
+    crop_type: Optional[str] = None
+    language: Optional[str] = Field(None, description="Spoken language; detected from the audio when omitted")
+
+class VoiceQueryResponse(FarmerQueryResponse):
+    transcript: str = Field(..., description="What the farmer said")
+    detected_language: Optional[str] = None
+    audio_seconds: float = Field(..., description="Length of the voice clip")
+    transcription_seconds: float = Field(..., description="Speech-to-text time after the audio was received")
 
 class ImageQueryRequest(BaseModel):
-    image_base64: str = Field(..., description="Base64 encoded image")
+    image_base64: str = Field(..., description="Base64 encoded image (a data: URL is also accepted)")
     query: Optional[str] = Field(None, description="Additional text query about the image")
     farmer_id: Optional[str] = None
     location: Optional[str] = None
+    crop_type: Optional[str] = None
+    language: str = Field(default="english", description="Response language preference")
+
+class ImagePrediction(BaseModel):
+    label: str = Field(..., description="Pest, disease or healthy class from the image model")
+    confidence: float = Field(..., description="Model probability for this label")
+
+class ImageQueryResponse(FarmerQueryResponse):
+    predictions: List[ImagePrediction] = Field(default=[], description="Top image model predictions")
+    image_hash: str = Field(..., description="Perceptual hash of the image")
+    cached_analysis: bool = Field(default=False, description="Predictions came from the image cache")
 
 class WeatherInfo(BaseModel):
     location: str
@@ -63,4 +123,40 @@ class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
     version: str
-    services: dict
\ No newline at end of file
+    services: dict
+    details: dict = Field(default={}, description="Per-component check time, latency and errors")
+
+class ResponseMode(str, Enum):
+    SYNC = "sync"
+    ASYNC = "async"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    DEAD = "dead"
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: JobStatus = JobStatus.QUEUED
+    status_url: str = Field(..., description="Poll this URL for the result")
+    poll_after_seconds: float = Field(..., description="Suggested wait before the first poll")
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str = Field(..., description="Endpoint the job was submitted to: ask, ask-image or ask-voice")
+    status: JobStatus
+    priority: int
+    attempts: int
+    max_attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[dict] = Field(None, description="The endpoint's response, once the job has succeeded")
+    error: Optional[str] = None
+    webhook_status: Optional[str] = Field(None, description="pending, delivered or failed when a callback_url was given")
+
+class JobListResponse(BaseModel):
+    jobs: List[JobStatusResponse]
+    counts: dict = Field(default={}, description="Jobs in the queue by status")
@@ -1,41 +1,142 @@
+import json
+import math
+import asyncio
 import logging
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
-from typing import Optional
+from datetime import date
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import Address
+from typing import Dict, List, Optional
+from app.config import get_settings
 from app.models.schemas import (
     FarmerQueryRequest, 
     FarmerQueryResponse,
+    BatchQueryRequest,
+    BatchQueryItem,
+    BatchQueryResponse,
     VoiceQueryRequest,
+    VoiceQueryResponse,
     ImageQueryRequest,
-    QueryCategory
+    ImageQueryResponse,
+    ImagePrediction,
+    JobAccepted,
+    QueryCategory,
+    QueryType,
+    ResponseMode
 )
 from app.services.gemini_service import gemini_service
+from app.services.response_cache import normalize_text
+from app.services.query_log import query_log_writer
+from app.services.jobs import job_queue, check_callback_url, POLL_AFTER_SECONDS
 from app.services.additional_services import weather_service, market_service
+from app.services.location_resolver import location_resolver
+from app.services.rate_limit import rate_limiter, RateLimitExceeded
+from app.services.image_analysis import image_analysis_service, ImageAnalysisUnavailableError
+from app.services.speech_to_text import speech_service, SpeechUnavailableError, Transcript
+from app.services.uploads import decode_base64, UploadRejectedError, UploadTooLargeError
+from app.wire_format import CompactRoute, NegotiatedResponse, StaticJSON
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=CompactRoute, default_response_class=NegotiatedResponse)
 
-@router.post("/ask", response_model=FarmerQueryResponse)
-async def ask_farmer_question(request: FarmerQueryRequest):
+def _farmer_context(location: Optional[str], crop_type: Optional[str], farmer_id: Optional[str]) -> dict:
+    """Context passed to the LLM; the location is resolved to its gazetteer name and district"""
+    return {
+        "location": location_resolver.canonical(location),
+        "crop_type": crop_type,
+        "farmer_id": farmer_id
+    }
+
+def _rate_limit_message(error: RateLimitExceeded) -> str:
+    return f"Too many questions. Please try again in {math.ceil(error.retry_after)} seconds."
+
+def _check_rate_limit(client: Optional[Address], farmer_id: Optional[str], cost: int = 1):
+    """Raise 429 with Retry-After when the farmer or the client IP is over its request budget"""
+    try:
+        rate_limiter.check(client.host if client else None, farmer_id, cost)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=_rate_limit_message(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+def _log_query(request: FarmerQueryRequest, response: FarmerQueryResponse):
+    """Queue the query and answer for the background database writer"""
+    query_log_writer.record(
+        query=request.query,
+        response=response,
+        farmer_id=request.farmer_id,
+        location=request.location,
+        crop_type=request.crop_type,
+        language=request.language,
+        query_type=request.query_type
+    )
+
+class JobOptions:
+    """Query parameters for answering in the background (?mode=async) instead of in the response"""
+    
+    def __init__(
+        self,
+        mode: ResponseMode = Query(ResponseMode.SYNC, description="async: return a job ID at once and answer in the background"),
+        callback_url: Optional[str] = Query(None, description="With mode=async, POST the finished job to this URL"),
+        priority: int = Query(5, ge=0, le=9, description="With mode=async, higher priority jobs run first")
+    ):
+        self.mode = mode
+        self.callback_url = callback_url
+        self.priority = priority
+
+# Documents the 202 answer of mode=async next to the normal response
+_ASYNC_RESPONSES = {202: {"model": JobAccepted, "description": "Accepted as a background job (mode=async)"}}
+
+async def _submit_job(kind: str, request, http_request: Request, options: JobOptions) -> NegotiatedResponse:
+    """Queue the request and answer 202 with where to poll for the result"""
+    if not job_queue.running:
+        raise HTTPException(
+            status_code=503,
+            detail="Background answers are not available right now. Please ask without mode=async."
+        )
+    if options.callback_url:
+        try:
+            check_callback_url(options.callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    job_id = await job_queue.submit(kind, request, options.priority, options.callback_url)
+    status_url = str(http_request.url_for("get_job", job_id=job_id))
+    logger.info(f"Queued {kind} job {job_id} (priority {options.priority})")
+    accepted = JobAccepted(job_id=job_id, status_url=status_url, poll_after_seconds=POLL_AFTER_SECONDS)
+    return NegotiatedResponse(jsonable_encoder(accepted), status_code=202, headers={"Location": status_url})
+
+@router.post("/ask", response_model=FarmerQueryResponse, responses=_ASYNC_RESPONSES)
+async def ask_farmer_question(request: FarmerQueryRequest, http_request: Request, job: JobOptions = Depends()):
     """
     Main endpoint for farmer text queries
     """
+    _check_rate_limit(http_request.client, request.farmer_id)
+    if job.mode == ResponseMode.ASYNC:
+        return await _submit_job("ask", request, http_request, job)
+    return await _answer_text(request)
+
+async def _answer_text(request: FarmerQueryRequest) -> FarmerQueryResponse:
     try:
         logger.info(f"Received farmer query: {request.query[:100]}...")
         
         # Prepare farmer context
-        farmer_context = {
-            "location": request.location,
-            "crop_type": request.crop_type,
-            "farmer_id": request.farmer_id
-        }
+        farmer_context = _farmer_context(request.location, request.crop_type, request.farmer_id)
         
         # Process query with Gemini
         response = await gemini_service.process_farmer_query(
             query=request.query,
             category=request.category,
-            farmer_context=farmer_context
+            farmer_context=farmer_context,
+            use_cache=request.use_cache,
+            language=request.language
         )
         
+        _log_query(request, response)
+        
         logger.info(f"Successfully processed query for farmer {request.farmer_id}")
         return response
         
@@ -46,29 +147,156 @@ async def ask_farmer_question(request: FarmerQueryRequest):
             detail="Failed to process your query. Please try again."
         )
 
+@router.post("/ask-stream")
+async def ask_farmer_question_stream(request: FarmerQueryRequest, http_request: Request):
+    """
+    Streaming variant of /ask using Server-Sent Events.
+    Sends "token" events as the answer is generated and a final "done" event
+    with confidence_score, suggestions, extras, category and sources.
+    """
+    _check_rate_limit(http_request.client, request.farmer_id)
+    logger.info(f"Received streaming farmer query: {request.query[:100]}...")
+    
+    farmer_context = _farmer_context(request.location, request.crop_type, request.farmer_id)
+    
+    async def event_stream():
+        async for event, payload in gemini_service.stream_farmer_query(
+            query=request.query,
+            category=request.category,
+            farmer_context=farmer_context,
+            use_cache=request.use_cache,
+            language=request.language
+        ):
+            if event == "done":
+                _log_query(request, payload)
+                data = payload.json(exclude={"answer"})
+            else:
+                data = json.dumps({"text": payload}, ensure_ascii=False)
+            yield f"event: {event}\ndata: {data}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _batch_key(request: FarmerQueryRequest) -> tuple:
+    """Key under which identical queries in a batch are answered once"""
+    return (
+        normalize_text(request.query),
+        request.category,
+        normalize_text(location_resolver.canonical(request.location)),
+        normalize_text(request.crop_type),
+        request.language.lower(),
+        request.use_cache
+    )
+
+@router.post("/ask-batch", response_model=BatchQueryResponse)
+async def ask_farmer_questions_batch(
+    request: BatchQueryRequest,
+    http_request: Request,
+    stream: bool = Query(False, description="Stream results as NDJSON as they complete")
+):
+    """
+    Answer a batch of farmer queries (extension officers, SMS gateway).
+    Identical queries are answered once and the rest run concurrently.
+    Results come back in request order with per-item errors, or as NDJSON
+    lines in completion order when stream=true.
+    """
+    settings = get_settings()
+    
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(request.queries) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {settings.batch_max_items} queries are allowed"
+        )
+    
+    # Group duplicate queries so each unique one is sent to Gemini once
+    groups: Dict[tuple, List[int]] = {}
+    for index, query in enumerate(request.queries):
+        groups.setdefault(_batch_key(query), []).append(index)
+    
+    logger.info(f"Received batch of {len(request.queries)} queries ({len(groups)} unique)")
+    # The caller pays per unique query; each farmer's own limit is applied per item below
+    _check_rate_limit(http_request.client, None, cost=len(groups))
+    
+    concurrency = min(request.max_concurrency or settings.batch_max_concurrency, settings.batch_max_concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(indices: List[int]):
+        query = request.queries[indices[0]]
+        try:
+            rate_limiter.check(None, query.farmer_id)
+        except RateLimitExceeded as e:
+            return indices, None, _rate_limit_message(e)
+        try:
+            async with semaphore:
+                response = await gemini_service.process_farmer_query(
+                    query=query.query,
+                    category=query.category,
+                    farmer_context=_farmer_context(query.location, query.crop_type, query.farmer_id),
+                    use_cache=query.use_cache,
+                    language=query.language
+                )
+            return indices, response, None
+        except Exception as e:
+            logger.error(f"Error processing batch query {indices[0]}: {e}")
+            return indices, None, "Failed to process this query. Please try again."
+    
+    tasks = [asyncio.create_task(answer(indices)) for indices in groups.values()]
+    
+    if stream:
+        async def ndjson_stream():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    indices, response, error = await next_done
+                    for index in indices:
+                        if response is not None:
+                            _log_query(request.queries[index], response)
+                        yield BatchQueryItem(index=index, response=response, error=error).json() + "\n"
+            finally:
+                # Client went away: stop the remaining work
+                for task in tasks:
+                    task.cancel()
+        
+        return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+    
+    results: List[Optional[BatchQueryItem]] = [None] * len(request.queries)
+    for indices, response, error in await asyncio.gather(*tasks):
+        for index in indices:
+            if response is not None:
+                _log_query(request.queries[index], response)
+            results[index] = BatchQueryItem(index=index, response=response, error=error)
+    
+    return BatchQueryResponse(results=results, total=len(request.queries), unique=len(groups))
+
 @router.get("/ask-simple")
 async def ask_simple_question(
+    http_request: Request,
     query: str = Query(..., description="Your farming question"),
     location: Optional[str] = Query(None, description="Your location"),
     crop: Optional[str] = Query(None, description="Crop type"),
-    category: Optional[QueryCategory] = Query(None, description="Query category")
+    category: Optional[QueryCategory] = Query(None, description="Query category"),
+    use_cache: bool = Query(True, description="Set to false to bypass the answer cache")
 ):
     """
     Simplified GET endpoint for basic queries (useful for testing)
     """
+    _check_rate_limit(http_request.client, None)
     try:
-        farmer_context = {
-            "location": location,
-            "crop_type": crop,
-            "farmer_id": None
-        }
+        farmer_context = _farmer_context(location, crop, None)
         
         response = await gemini_service.process_farmer_query(
             query=query,
             category=category,
-            farmer_context=farmer_context
+            farmer_context=farmer_context,
+            use_cache=use_cache
         )
         
+        query_log_writer.record(query=query, response=response, location=location, crop_type=crop)
+        
         return response
         
     except Exception as e:
@@ -78,39 +306,226 @@ async def ask_simple_question(
             detail="Failed to process your query. Please try again."
         )
 
-@router.post("/ask-voice")
-async def ask_voice_question(request: VoiceQueryRequest):
+@router.post("/ask-voice", response_model=VoiceQueryResponse, responses=_ASYNC_RESPONSES)
+async def ask_voice_question(request: VoiceQueryRequest, http_request: Request, job: JobOptions = Depends()):
     """
-    Endpoint for voice-based queries (Future implementation)
+    Endpoint for voice-based queries: the clip is transcribed offline and
+    the transcript answered like a text query. For live recording, use the
+    /ask-voice/stream WebSocket so transcription starts before the clip ends.
     """
-    # TODO: Implement voice processing using Whisper API
-    # 1. Decode base64 audio
-    # 2. Convert speech to text using Whisper
-    # 3. Process text query with Gemini
-    # 4. Convert response back to speech (optional)
+    _check_rate_limit(http_request.client, request.farmer_id)
+    if job.mode == ResponseMode.ASYNC:
+        return await _submit_job("ask-voice", request, http_request, job)
+    return await _answer_voice(request)
+
+async def _answer_voice(request: VoiceQueryRequest) -> VoiceQueryResponse:
+    try:
+        audio = decode_base64(request.audio_base64, get_settings().speech_max_bytes)
+        transcript = await speech_service.transcribe(audio, request.sample_rate, request.language)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SpeechUnavailableError as e:
+        logger.warning(f"Speech-to-text unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Voice queries are not available right now. Please type your question."
+        )
+    except Exception as e:
+        logger.error(f"Error transcribing voice query: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process the recording. Please try again.")
     
-    return {
-        "message": "Voice processing feature coming soon!",
-        "status": "not_implemented",
-        "suggestion": "Please use the text query endpoint for now"
-    }
+    if not transcript.text:
+        raise HTTPException(status_code=400, detail="No speech was detected in the recording.")
+    
+    return await _answer_voice_query(
+        transcript, request.farmer_id, request.location, request.crop_type, request.language
+    )
+
+async def _answer_voice_query(transcript: Transcript, farmer_id: Optional[str], location: Optional[str],
+                              crop_type: Optional[str], language: Optional[str]) -> VoiceQueryResponse:
+    """Answer a transcribed question in the language it was asked in"""
+    language = language or transcript.language_name or "english"
+    try:
+        response = await gemini_service.process_farmer_query(
+            query=transcript.text,
+            farmer_context=_farmer_context(location, crop_type, farmer_id),
+            language=language
+        )
+    except Exception as e:
+        logger.error(f"Error processing voice query: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to process your query. Please try again."
+        )
+    
+    query_log_writer.record(
+        query=transcript.text,
+        response=response,
+        farmer_id=farmer_id,
+        location=location,
+        crop_type=crop_type,
+        language=language,
+        query_type=QueryType.VOICE
+    )
+    
+    return VoiceQueryResponse(
+        **response.dict(),
+        transcript=transcript.text,
+        detected_language=transcript.language_name or transcript.language,
+        audio_seconds=round(transcript.audio_seconds, 2),
+        transcription_seconds=round(transcript.processing_seconds, 3)
+    )
 
-@router.post("/ask-image")
-async def ask_image_question(request: ImageQueryRequest):
+@router.websocket("/ask-voice/stream")
+async def ask_voice_question_stream(
+    websocket: WebSocket,
+    sample_rate: int = Query(16000, ge=8000, le=48000, description="Sample rate of the PCM frames"),
+    language: Optional[str] = Query(None, description="Spoken language; detected when omitted"),
+    location: Optional[str] = Query(None),
+    crop_type: Optional[str] = Query(None),
+    farmer_id: Optional[str] = Query(None)
+):
     """
-    Endpoint for image-based queries (pest/disease identification)
+    Streaming voice query. Send 16-bit little-endian mono PCM as binary
+    frames while recording, then the text frame "end". The server sends
+    JSON events: "partial" (text of each transcribed piece), "transcript",
+    "answer" (a VoiceQueryResponse), or "error" before closing.
     """
-    # TODO: Implement image processing
-    # 1. Decode base64 image
-    # 2. Use ResNet50 or similar for pest/disease identification
-    # 3. Combine image analysis with text query
-    # 4. Get treatment recommendations from Gemini
+    await websocket.accept()
+    try:
+        rate_limiter.check(websocket.client.host if websocket.client else None, farmer_id)
+    except RateLimitExceeded as e:
+        await websocket.send_json({"event": "error", "detail": _rate_limit_message(e)})
+        await websocket.close(code=1008)
+        return
+    try:
+        transcription = speech_service.stream(sample_rate, language)
+    except SpeechUnavailableError as e:
+        logger.warning(f"Speech-to-text unavailable: {e}")
+        await websocket.send_json({"event": "error", "detail": "Voice queries are not available right now."})
+        await websocket.close(code=1013)
+        return
     
-    return {
-        "message": "Image analysis feature coming soon!",
-        "status": "not_implemented",
-        "suggestion": "Please describe your pest/disease issue in text for now"
-    }
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                transcription.cancel()
+                return
+            if message.get("bytes"):
+                transcription.feed(message["bytes"])
+            elif (message.get("text") or "").strip().lower() == "end":
+                break
+            for piece in transcription.ready():
+                await websocket.send_json({"event": "partial", "text": piece.text})
+        
+        transcript = await transcription.finish()
+        await websocket.send_json({
+            "event": "transcript",
+            "text": transcript.text,
+            "language": transcript.language_name or transcript.language,
+            "audio_seconds": round(transcript.audio_seconds, 2),
+            "transcription_seconds": round(transcript.processing_seconds, 3)
+        })
+        if not transcript.text:
+            await websocket.send_json({"event": "error", "detail": "No speech was detected in the recording."})
+            await websocket.close(code=1008)
+            return
+        
+        response = await _answer_voice_query(transcript, farmer_id, location, crop_type, language)
+        await websocket.send_json({"event": "answer", **jsonable_encoder(response)})
+        await websocket.close()
+    except WebSocketDisconnect:
+        transcription.cancel()
+    except (UploadRejectedError, SpeechUnavailableError, HTTPException) as e:
+        transcription.cancel()
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await websocket.send_json({"event": "error", "detail": detail})
+        await websocket.close(code=1008 if isinstance(e, UploadRejectedError) else 1011)
+    except Exception as e:
+        transcription.cancel()
+        logger.error(f"Error in streaming voice query: {e}")
+        await websocket.send_json({
+            "event": "error",
+            "detail": "Failed to process the recording. Please try again."
+        })
+        await websocket.close(code=1011)
+
+@router.post("/ask-image", response_model=ImageQueryResponse, responses=_ASYNC_RESPONSES)
+async def ask_image_question(request: ImageQueryRequest, http_request: Request, job: JobOptions = Depends()):
+    """
+    Endpoint for image-based queries (pest/disease identification).
+    A local classifier labels the photo; its top predictions and the
+    farmer's question are answered by the LLM.
+    """
+    _check_rate_limit(http_request.client, request.farmer_id)
+    if job.mode == ResponseMode.ASYNC:
+        return await _submit_job("ask-image", request, http_request, job)
+    return await _answer_image(request)
+
+async def _answer_image(request: ImageQueryRequest) -> ImageQueryResponse:
+    try:
+        analysis = await image_analysis_service.analyze(request.image_base64)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageAnalysisUnavailableError as e:
+        logger.warning(f"Image analysis unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Image analysis is not available right now. Please describe the problem in text."
+        )
+    except Exception as e:
+        logger.error(f"Error analysing image: {e}")
+        raise HTTPException(status_code=500, detail="Failed to analyse the image. Please try again.")
+    
+    query = image_analysis_service.describe(analysis, request.query)
+    try:
+        response = await gemini_service.process_farmer_query(
+            query=query,
+            category=QueryCategory.PEST_DISEASE,
+            farmer_context=_farmer_context(request.location, request.crop_type, request.farmer_id),
+            language=request.language
+        )
+    except Exception as e:
+        logger.error(f"Error processing image query: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to process your query. Please try again."
+        )
+    
+    query_log_writer.record(
+        query=query,
+        response=response,
+        farmer_id=request.farmer_id,
+        location=request.location,
+        crop_type=request.crop_type,
+        language=request.language,
+        query_type=QueryType.IMAGE
+    )
+    
+    return ImageQueryResponse(
+        **response.dict(),
+        predictions=[ImagePrediction(label=label, confidence=confidence) for label, confidence in analysis.predictions],
+        image_hash=analysis.hash_hex,
+        cached_analysis=analysis.cached
+    )
+
+def _retry_fallback(answer):
+    """Job handler: a fallback answer (the LLM failed) is raised so the job is retried instead of stored"""
+    async def run(request):
+        response = await answer(request)
+        if response.confidence_score == 0.0:
+            raise RuntimeError("Fallback answer returned")
+        return response
+    return run
+
+job_queue.register("ask", FarmerQueryRequest, _retry_fallback(_answer_text))
+job_queue.register("ask-image", ImageQueryRequest, _retry_fallback(_answer_image))
+job_queue.register("ask-voice", VoiceQueryRequest, _retry_fallback(_answer_voice))
 
 @router.get("/weather")
 async def get_weather_info(location: str = Query(..., description="Location name")):
@@ -137,6 +552,38 @@ async def get_weather_info(location: str = Query(..., description="Location name
             detail="Failed to fetch weather information"
         )
 
+@router.get("/resolve-location")
+async def resolve_location(q: str = Query(..., description="Village, taluka, district or GPS \"lat,lon\"")):
+    """
+    Resolve a free-text location to a gazetteer place, its weather station and nearest mandis
+    """
+    match = location_resolver.resolve(q)
+    if match is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Could not resolve location {q}"
+        )
+    
+    station = location_resolver.nearest_station(match.latitude, match.longitude)
+    markets = []
+    if market_service.store is not None:
+        markets = [
+            {"market": market.name.title(), "district": market.district.title(), "distance_km": round(distance, 1)}
+            for market, distance in market_service.store.nearest_markets(
+                match.latitude, match.longitude, get_settings().market_nearby_limit
+            )
+        ]
+    return {
+        "query": q,
+        "matched": match.matched,
+        "score": match.score,
+        "latitude": match.latitude,
+        "longitude": match.longitude,
+        "place": match.place.to_dict(),
+        "weather_station": {"name": station[0].name, "distance_km": round(station[1], 1)} if station else None,
+        "nearest_markets": markets
+    }
+
 @router.get("/market-price")
 async def get_market_price(
     crop: str = Query(..., description="Crop name"),
@@ -156,23 +603,51 @@ async def get_market_price(
             detail="Failed to fetch market price information"
         )
 
+@router.get("/market-price/history")
+async def get_market_price_history(
+    crop: str = Query(..., description="Crop name"),
+    market: str = Query(..., description="Mandi (or district) name"),
+    start: Optional[date] = Query(None, description="First day (YYYY-MM-DD)"),
+    end: Optional[date] = Query(None, description="Last day (YYYY-MM-DD), defaults to the latest report")
+):
+    """
+    Daily mandi prices for a crop over a date range
+    """
+    try:
+        history = await market_service.get_price_history(crop, market, start, end)
+    except Exception as e:
+        logger.error(f"Error fetching market price history: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to fetch market price history"
+        )
+    
+    if history is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No price data for {crop} at {market}"
+        )
+    return history
+
+_categories = StaticJSON({
+    "categories": [
+        {"value": "crop_management", "label": "Crop Management"},
+        {"value": "pest_disease", "label": "Pest & Disease Control"},
+        {"value": "weather", "label": "Weather & Seasonal Advice"},
+        {"value": "market_price", "label": "Market Prices"},
+        {"value": "soil_health", "label": "Soil Health"},
+        {"value": "irrigation", "label": "Irrigation & Water Management"},
+        {"value": "fertilizer", "label": "Fertilizer & Nutrients"},
+        {"value": "general", "label": "General Farming"}
+    ]
+}, get_settings().static_cache_max_age_seconds)
+
 @router.get("/categories")
-async def get_query_categories():
+async def get_query_categories(request: Request):
     """
-    Get available query categories
+    Get available query categories (with an ETag, so app restarts revalidate for free)
     """
-    return {
-        "categories": [
-            {"value": "crop_management", "label": "Crop Management"},
-            {"value": "pest_disease", "label": "Pest & Disease Control"},
-            {"value": "weather", "label": "Weather & Seasonal Advice"},
-            {"value": "market_price", "label": "Market Prices"},
-            {"value": "soil_health", "label": "Soil Health"},
-            {"value": "irrigation", "label": "Irrigation & Water Management"},
-            {"value": "fertilizer", "label": "Fertilizer & Nutrients"},
-            {"value": "general", "label": "General Farming"}
-        ]
-    }
+    return _categories.response(request)
 
 @router.get("/test-gemini")
 async def test_gemini_connection():
@@ -180,7 +655,7 @@ async def test_gemini_connection():
     Test endpoint to check Gemini API connection
     """
     try:
-        is_connected = gemini_service.test_connection()
+        is_connected = await gemini_service.test_connection()
         
         if is_connected:
             return {
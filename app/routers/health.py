@@ -1,30 +1,183 @@
+import os
+import time
+import asyncio
+import logging
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+from app.config import get_settings
 from app.models.schemas import HealthResponse
 from app.services.gemini_service import gemini_service
+from app.services.additional_services import weather_service
+from app.services.conversation_memory import conversation_memory
+from app.services.jobs import job_queue
+from app.services.knowledge_base import knowledge_base
+from app.services.location_resolver import location_resolver
+from app.services.image_analysis import image_analysis_service
+from app.services.speech_to_text import speech_service
+from app.services.resilience import all_upstreams
+from app.services.shared_store import shared_store
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/health", response_model=HealthResponse)
-async def health_check():
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+NOT_CONFIGURED = "not_configured"
+UNKNOWN = "unknown"
+
+
+class HealthMonitor:
     """
-    Health check endpoint to monitor system status
+    Runs component checks in the background and caches their status,
+    so health endpoints answer from memory instead of calling upstreams.
+    A check returns True/False, or None when the component is not configured.
     """
-    # Check service statuses
-    services = {
-        "gemini_api": "healthy" if gemini_service.test_connection() else "unhealthy",
-        "database": "healthy",  # Add actual DB health check if needed
-        "weather_service": "healthy",
-        "market_service": "healthy"
-    }
     
-    overall_status = "healthy" if all(status == "healthy" for status in services.values()) else "degraded"
+    def __init__(self, refresh_interval: float, check_timeout: float):
+        self.refresh_interval = refresh_interval
+        self.check_timeout = check_timeout
+        self._checks: Dict[str, Callable[[], Awaitable[Optional[bool]]]] = {}
+        self._critical: Dict[str, bool] = {}
+        self.status: Dict[str, str] = {}
+        self.details: Dict[str, dict] = {}
+        self.last_refresh: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def register(self, name: str, check: Callable[[], Awaitable[Optional[bool]]], critical: bool = True):
+        """Add a component check; critical components gate readiness"""
+        self._checks[name] = check
+        self._critical[name] = critical
+        self.status[name] = UNKNOWN
+        self.details[name] = {}
+    
+    async def _run_check(self, name: str):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = await asyncio.wait_for(self._checks[name](), timeout=self.check_timeout)
+            status = NOT_CONFIGURED if result is None else (HEALTHY if result else UNHEALTHY)
+        except asyncio.TimeoutError:
+            status, error = UNHEALTHY, "timed out"
+        except Exception as e:
+            status, error = UNHEALTHY, str(e)
+        
+        if status == UNHEALTHY and self.status.get(name) != UNHEALTHY:
+            logger.warning(f"Health check for {name} failed: {error or 'unhealthy response'}")
+        self.status[name] = status
+        self.details[name] = {
+            "checked_at": datetime.now().isoformat(),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "critical": self._critical[name],
+            "error": error
+        }
+    
+    async def refresh(self):
+        """Run all checks concurrently and update the cached status"""
+        await asyncio.gather(*(self._run_check(name) for name in self._checks))
+        self.last_refresh = datetime.now()
+    
+    async def _refresh_loop(self, ready: Optional[Awaitable]):
+        if ready is not None:
+            try:
+                # Shielded so stopping the monitor does not cancel the startup work itself
+                await asyncio.shield(ready)
+            except Exception:
+                # Startup failures show up as unhealthy components below
+                pass
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+    
+    def start(self, ready: Optional[Awaitable] = None):
+        """Start background refreshes once `ready` (e.g. startup work) completes"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop(ready))
     
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    @property
+    def ready(self) -> bool:
+        # A critical component that is not configured (e.g. Gemini on a stub-only chain) does not block readiness
+        return all(
+            self.status[name] in (HEALTHY, NOT_CONFIGURED)
+            for name, critical in self._critical.items() if critical
+        )
+    
+    @property
+    def overall_status(self) -> str:
+        if self.last_refresh is None:
+            return "starting"
+        return HEALTHY if self.ready else "degraded"
+
+
+def _select_one() -> bool:
+    # Imported here so SQLAlchemy loads in the worker thread, not at import time
+    from app.database import check_connection
+    return check_connection()
+
+
+async def _check_database() -> bool:
+    return await asyncio.to_thread(_select_one)
+
+
+async def _check_market_service() -> bool:
+    return True
+
+
+settings = get_settings()
+health_monitor = HealthMonitor(
+    refresh_interval=settings.health_refresh_seconds,
+    check_timeout=settings.health_check_timeout_seconds
+)
+health_monitor.register("gemini_api", gemini_service.check_reachability)
+health_monitor.register("database", _check_database)
+health_monitor.register("weather_service", weather_service.check_upstream, critical=False)
+health_monitor.register("market_service", _check_market_service, critical=False)
+health_monitor.register("image_model", image_analysis_service.check, critical=False)
+health_monitor.register("speech_model", speech_service.check, critical=False)
+health_monitor.register("knowledge_base", knowledge_base.check, critical=False)
+health_monitor.register("job_queue", job_queue.check, critical=False)
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check():
+    """
+    Health check endpoint to monitor system status (served from cached checks)
+    """
     return HealthResponse(
-        status=overall_status,
+        status=health_monitor.overall_status,
         timestamp=datetime.now(),
         version="1.0.0",
-        services=services
+        services=dict(health_monitor.status),
+        details=dict(health_monitor.details)
+    )
+
+@router.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and serving requests
+    """
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: critical components passed their last background check
+    """
+    if health_monitor.ready:
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=503,
+        content={"status": "not_ready", "services": health_monitor.status}
     )
 
 @router.get("/ping")
@@ -32,4 +185,85 @@ async def ping():
     """
     Simple ping endpoint
     """
-    return {"message": "pong", "timestamp": datetime.now()}
\ No newline at end of file
+    return {"message": "pong", "timestamp": datetime.now()}
+
+@router.get("/cache-stats")
+async def cache_stats():
+    """
+    Answer cache hit/miss metrics for this worker, and the store shared by all workers
+    """
+    return {**gemini_service.cache.stats(), "shared_store": shared_store.stats(), "worker_pid": os.getpid()}
+
+
+@router.get("/llm-stats")
+async def llm_stats():
+    """
+    LLM backend chain: breaker state, timeout and recent p95 latency per backend
+    """
+    return {"backends": gemini_service.chain.stats()}
+
+
+@router.get("/upstream-stats")
+async def upstream_stats():
+    """
+    Adaptive timeout, breaker state and recent p95 latency per external dependency
+    """
+    return {"dependencies": [upstream.stats() for upstream in all_upstreams()]}
+
+
+@router.get("/location-stats")
+async def location_stats():
+    """
+    Gazetteer size and location resolution cache hits
+    """
+    return location_resolver.stats()
+
+
+@router.get("/image-stats")
+async def image_stats():
+    """
+    Image model availability, analysis cache hits and inference batch sizes
+    """
+    return image_analysis_service.stats()
+
+
+@router.get("/voice-stats")
+async def voice_stats():
+    """
+    Speech model availability, clips transcribed and real-time factor
+    """
+    return speech_service.stats()
+
+
+@router.get("/memory-stats")
+async def memory_stats():
+    """
+    Conversation memory size and history tokens saved versus full replay
+    """
+    return await asyncio.to_thread(conversation_memory.stats)
+
+
+@router.get("/knowledge-stats")
+async def knowledge_stats():
+    """
+    Agronomy index size, searches, and questions answered from the FAQ without an LLM call
+    """
+    return knowledge_base.stats()
+
+
+@router.get("/translation-stats")
+async def translation_stats():
+    """
+    Translations of English-only answers: cache hits, translator used and untranslated leftovers
+    """
+    if gemini_service.translation is None:
+        return {"enabled": False}
+    return gemini_service.translation.stats()
+
+
+@router.get("/job-stats")
+async def job_stats():
+    """
+    Background job workers, jobs by status (dead = dead-lettered) and webhooks in flight
+    """
+    return await asyncio.to_thread(job_queue.stats)
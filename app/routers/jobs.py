@@ -0,0 +1,55 @@
+import math
+import logging
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from app.models.schemas import JobListResponse, JobStatus, JobStatusResponse
+from app.services.jobs import job_queue, POLL_AFTER_SECONDS, FINISHED
+from app.wire_format import CompactRoute, NegotiatedResponse
+
+logger = logging.getLogger(__name__)
+router = APIRouter(route_class=CompactRoute, default_response_class=NegotiatedResponse)
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    Status of a background job (from /ask, /ask-image or /ask-voice with mode=async).
+    Once it has succeeded, result holds the endpoint's usual response. While it
+    is still queued or running, Retry-After says when to poll again.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    headers = None
+    if job.status not in FINISHED:
+        headers = {"Retry-After": str(math.ceil(POLL_AFTER_SECONDS))}
+    return NegotiatedResponse(jsonable_encoder(JobStatusResponse(**job.public())), headers=headers)
+
+@router.get("/jobs", response_model=JobListResponse)
+async def list_jobs(
+    status: JobStatus = Query(JobStatus.DEAD, description="Jobs with this status; dead = the dead-letter queue"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    Most recent jobs with a status, by default the dead-lettered ones
+    """
+    jobs = await job_queue.list(status.value, limit)
+    return JobListResponse(
+        jobs=[JobStatusResponse(**job.public()) for job in jobs],
+        counts=await job_queue.counts()
+    )
+
+@router.post("/jobs/{job_id}/retry", response_model=JobStatusResponse)
+async def retry_job(job_id: str):
+    """
+    Requeue a dead-lettered job with a fresh set of attempts
+    """
+    if not await job_queue.requeue(job_id):
+        job = await job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}; only dead jobs can be retried")
+
+    logger.info(f"Requeued dead job {job_id}")
+    job = await job_queue.get(job_id)
+    return JobStatusResponse(**job.public())
@@ -1,38 +1,116 @@
-import requests
+import os
+import asyncio
+import time
 import logging
-from typing import Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import httpx
 from app.config import get_settings
 from app.models.schemas import WeatherInfo
-from datetime import datetime
+from app.services.http_client import get_http_client
+from app.services.location_resolver import LocationResolver, location_resolver
+from app.services.market_store import MarketInfo, MarketPriceStore, PricePoint
+from app.services.resilience import DeadlineExceededError, UpstreamUnavailableError, build_upstream, remaining_budget
+from datetime import date, datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 class WeatherService:
     """Service for fetching weather information"""
     
-    def __init__(self):
+    def __init__(self, resolver: Optional[LocationResolver] = None):
         self.settings = get_settings()
-        self.base_url = "http://api.openweathermap.org/data/2.5/weather"
+        self.base_url = self.settings.weather_api_url
+        self.resolver = resolver or location_resolver
+        # Per-location TTL cache, least recently used entries evicted first
+        self._cache: "OrderedDict[str, Tuple[float, WeatherInfo]]" = OrderedDict()
+        # Upstream fetches currently running, shared by concurrent callers
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.upstream_calls = 0
+        # Weather lookups are idempotent GETs, so they may be retried and hedged
+        self.upstream = build_upstream(
+            "weather", self.settings.http_timeout_seconds, retry_on=(httpx.TransportError,)
+        )
+    
+    def _lookup(self, location: str) -> Tuple[str, dict]:
+        """
+        Cache key and upstream query for a location. Resolved places within
+        range of a weather station share that station's weather, so nearby
+        villages and different spellings hit one cache entry.
+        """
+        match = self.resolver.resolve(location)
+        if match is None:
+            return " ".join(location.lower().split()), {'q': location}
+        nearest = self.resolver.nearest_station(match.latitude, match.longitude)
+        if nearest is not None:
+            station = nearest[0]
+            return station.key, {'lat': station.latitude, 'lon': station.longitude}
+        # No station close by: share weather over a ~10 km grid cell
+        latitude, longitude = round(match.latitude, 1), round(match.longitude, 1)
+        return f"grid:{latitude},{longitude}", {'lat': latitude, 'lon': longitude}
     
     async def get_weather_info(self, location: str) -> Optional[WeatherInfo]:
         """Get weather information for a location"""
+        if not self.settings.weather_api_key:
+            logger.warning("Weather API key not configured")
+            return None
+        
+        key, query = self._lookup(location)
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires_at, weather = cached
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                return weather
+            del self._cache[key]
+        
+        # Single-flight: concurrent requests for one location share one upstream call
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, query))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        
+        # Shield so one cancelled caller does not cancel the fetch for the others
+        return await asyncio.shield(task)
+    
+    async def check_upstream(self) -> Optional[bool]:
+        """Cheap reachability check; None when the API is not configured"""
+        if not self.settings.weather_api_key:
+            return None
+        # Any non-5xx answer (even 400 for the missing location) proves the API is up
+        response = await get_http_client().get(self.base_url, params={'appid': self.settings.weather_api_key})
+        return response.status_code < 500
+    
+    @staticmethod
+    def _describe(query: dict) -> str:
+        return query.get("q") or f"{query.get('lat')},{query.get('lon')}"
+    
+    async def _fetch(self, key: str, query: dict) -> Optional[WeatherInfo]:
+        """Fetch weather from the upstream API and cache successful results"""
         try:
-            if not self.settings.weather_api_key:
-                logger.warning("Weather API key not configured")
-                return None
-            
             params = {
-                'q': location,
+                **query,
                 'appid': self.settings.weather_api_key,
                 'units': 'metric'
             }
             
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
+            async def request() -> httpx.Response:
+                self.upstream_calls += 1
+                response = await get_http_client().get(self.base_url, params=params)
+                if response.status_code >= 500 or response.status_code == 429:
+                    raise UpstreamUnavailableError(f"Weather API returned {response.status_code}")
+                return response
+            
+            response = await self.upstream.call(request)
+            if response.status_code != 200:
+                # Not raise_for_status(): its message holds the request URL, API key included
+                logger.error(f"Weather API returned {response.status_code} for {self._describe(query)}")
+                return None
             
             data = response.json()
             
-            return WeatherInfo(
+            weather = WeatherInfo(
                 location=data['name'],
                 temperature=data['main']['temp'],
                 humidity=data['main']['humidity'],
@@ -40,18 +118,173 @@ class WeatherService:
                 description=data['weather'][0]['description']
             )
             
+        except httpx.HTTPError as e:
+            # Only the type: httpx messages may carry the request URL with the API key
+            logger.error(f"Error fetching weather data for {self._describe(query)}: {type(e).__name__}")
+            return None
         except Exception as e:
-            logger.error(f"Error fetching weather data: {e}")
+            logger.error(f"Error fetching weather data for {self._describe(query)}: {e}")
             return None
+        
+        self._cache[key] = (time.monotonic() + self.settings.weather_cache_ttl_seconds, weather)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.settings.weather_cache_max_entries:
+            self._cache.popitem(last=False)
+        
+        return weather
 
 class MarketService:
     """Service for market price information"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[MarketPriceStore] = None, resolver: Optional[LocationResolver] = None):
         self.settings = get_settings()
+        self.resolver = resolver or location_resolver
+        self._store = store
+    
+    @property
+    def store(self) -> Optional[MarketPriceStore]:
+        """
+        Ingested mandi prices, opened read-only once an ingest has created the file
+        (which may be after startup); the mock below answers for crops the store does not have
+        """
+        if self._store is None and self.settings.market_db_path and os.path.exists(self.settings.market_db_path):
+            self._store = MarketPriceStore(self.settings.market_db_path, read_only=True)
+        return self._store
+    
+    @staticmethod
+    def _check_deadline():
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            raise DeadlineExceededError("No time left in the request budget for market prices")
     
     async def get_market_prices(self, crop: str, location: str = "india") -> dict:
-        """Get market prices for a crop (mock implementation)"""
+        """Get market prices for a crop"""
+        self._check_deadline()
+        # A local SQLite lookup: no retries or hedging, just kept off the event loop
+        return await asyncio.to_thread(self._fetch_prices, crop, location)
+    
+    def _fetch_prices(self, crop: str, location: str) -> dict:
+        if self.store is not None:
+            quote = self._quote_from_store(crop, location)
+            if quote is not None:
+                return quote
+        return self._mock_prices(crop, location)
+    
+    @staticmethod
+    def _price_fields(point: PricePoint) -> dict:
+        # Mandi prices are published per quintal (100 kg)
+        return {
+            "price_per_kg": round(point.modal_price / 100, 2),
+            "min_price_per_kg": round(point.min_price / 100, 2) if point.min_price is not None else None,
+            "max_price_per_kg": round(point.max_price / 100, 2) if point.max_price is not None else None,
+            "price_per_quintal": round(point.modal_price, 2),
+            "price_date": point.date.isoformat()
+        }
+    
+    def _pick_market(self, commodity_id: int, location: str) -> Tuple[Optional[MarketInfo], str]:
+        """Market to quote for the location, and how it was matched"""
+        store = self.store
+        matches = store.resolve_markets(location)
+        trading = [market for market in matches if store.has_prices(commodity_id, market.id)]
+        if trading:
+            return trading[0], "market" if trading[0] in matches[:1] else "district"
+        # The named mandi does not trade this crop, or the location is a village or
+        # taluka rather than a mandi: fall back to the nearest mandi that does
+        located = next((market for market in matches if market.has_location), None)
+        if located is not None:
+            latitude, longitude = located.latitude, located.longitude
+        else:
+            match = self.resolver.resolve(location)
+            if match is None or match.place.kind == "state":
+                return None, "all_india"
+            latitude, longitude = match.latitude, match.longitude
+        nearest = store.nearest_markets(latitude, longitude, 1, commodity_id)
+        if nearest:
+            return nearest[0][0], "nearest"
+        return None, "all_india"
+    
+    def _nearby(self, commodity_id: int, market: MarketInfo) -> List[dict]:
+        nearby = []
+        for other, distance in self.store.nearest_markets(
+            market.latitude, market.longitude, self.settings.market_nearby_limit, commodity_id, exclude=market.id
+        ):
+            point = self.store.latest_price(commodity_id, other.id)
+            if point is not None:
+                nearby.append({
+                    "market": other.name.title(),
+                    "district": other.district.title(),
+                    "state": other.state.title(),
+                    "distance_km": round(distance, 1),
+                    **self._price_fields(point)
+                })
+        return nearby
+    
+    def _quote_from_store(self, crop: str, location: str) -> Optional[dict]:
+        """Latest price, trend and nearby mandis from ingested data"""
+        store = self.store
+        commodity_id = store.resolve_commodity(crop)
+        if commodity_id is None:
+            return None
+        market, matched = self._pick_market(commodity_id, location)
+        point = store.latest_price(commodity_id, market.id if market else None)
+        if point is None:
+            return None
+        
+        quote = {
+            "crop": crop,
+            "location": location,
+            "commodity": store.commodity_name(commodity_id).title(),
+            "market": market.name.title() if market else "All India (average)",
+            "matched": matched,
+            **self._price_fields(point)
+        }
+        if market is not None:
+            trend, change = store.trend(commodity_id, market.id, self.settings.market_trend_window_days)
+            quote.update(
+                district=market.district.title(),
+                state=market.state.title(),
+                trend=trend,
+                change_percent=change,
+                nearby_markets=self._nearby(commodity_id, market) if market.has_location else []
+            )
+        quote.update(last_updated=datetime.now().isoformat(), source="AGMARKNET/eNAM mandi prices")
+        return quote
+    
+    async def get_price_history(self, crop: str, market: str, start: Optional[date] = None,
+                                end: Optional[date] = None) -> Optional[dict]:
+        """Daily prices for a crop at one mandi; defaults to the 30 days up to the latest report"""
+        self._check_deadline()
+        return await asyncio.to_thread(self._fetch_history, crop, market, start, end)
+    
+    def _fetch_history(self, crop: str, market: str, start: Optional[date],
+                             end: Optional[date]) -> Optional[dict]:
+        store = self.store
+        commodity_id = store.resolve_commodity(crop) if store is not None else None
+        if commodity_id is None:
+            return None
+        info = next(
+            (info for info in store.resolve_markets(market) if store.has_prices(commodity_id, info.id)), None
+        )
+        if info is None:
+            return None
+        if end is None:
+            end = store.latest_price(commodity_id, info.id).date
+        if start is None:
+            start = end - timedelta(days=29)
+        return {
+            "crop": crop,
+            "commodity": store.commodity_name(commodity_id).title(),
+            "market": info.name.title(),
+            "district": info.district.title(),
+            "state": info.state.title(),
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "prices": [self._price_fields(point) for point in store.history(commodity_id, info.id, start, end)],
+            "source": "AGMARKNET/eNAM mandi prices"
+        }
+    
+    def _mock_prices(self, crop: str, location: str) -> dict:
+        """Price lookup for crops without ingested data (mock implementation)"""
         # This is a mock implementation
         # In production, integrate with actual market APIs like:
         # - eNAM (National Agriculture Market)
@@ -0,0 +1,254 @@
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.models.schemas import QueryCategory
+
+logger = logging.getLogger(__name__)
+
+# Keyword tables per category. English entries match whole words with an
+# optional plural suffix ("-s", "-es", "-y" -> "-ies") or an inflection
+# ("-ing", "-ed", "-y", "-en"; see _inflections); Hindi and Marathi entries
+# cover both Devanagari script and common Latin transliterations used when
+# typing on phones.
+CATEGORY_KEYWORDS: Dict[str, Dict[QueryCategory, List[str]]] = {
+    "english": {
+        QueryCategory.PEST_DISEASE: [
+            'pest', 'disease', 'insect', 'fungus', 'fungal', 'virus', 'infection', 'spots',
+            'worm', 'aphid', 'blight', 'mildew', 'rot', 'wilt', 'borer', 'caterpillar', 'mite',
+            'whitefly', 'locust', 'bollworm', 'armyworm', 'termite', 'thrips', 'jassid', 'weevil',
+            'larva', 'larvae', 'nematode', 'rust', 'leaf curl', 'weed', 'pesticide', 'insecticide',
+            'fungicide', 'herbicide', 'weedicide'
+        ],
+        QueryCategory.CROP_MANAGEMENT: [
+            'planting', 'harvesting', 'harvest', 'cultivation', 'growing', 'yield', 'variety',
+            'varieties', 'seed', 'sowing', 'sow', 'transplanting', 'pruning', 'weeding'
+        ],
+        QueryCategory.WEATHER: [
+            'weather', 'rain', 'rainfall', 'temperature', 'season', 'monsoon', 'drought',
+            'flood', 'frost', 'heatwave', 'forecast', 'hailstorm'
+        ],
+        QueryCategory.SOIL_HEALTH: [
+            'soil', 'nutrients', 'ph', 'organic matter', 'testing', 'fertility', 'salinity',
+            'erosion', 'soil test'
+        ],
+        QueryCategory.IRRIGATION: [
+            'water', 'irrigation', 'irrigate', 'watering', 'drip', 'sprinkler', 'drought',
+            'borewell', 'canal'
+        ],
+        QueryCategory.FERTILIZER: [
+            'fertilizer', 'fertiliser', 'fertilize', 'fertilise', 'nutrients', 'nitrogen', 'phosphorus', 'potassium',
+            'manure', 'urea', 'dap', 'npk', 'compost', 'vermicompost', 'potash'
+        ],
+        QueryCategory.MARKET_PRICE: [
+            'price', 'market', 'selling', 'sell', 'cost', 'profit', 'revenue', 'mandi', 'msp',
+            'rate'
+        ],
+    },
+    "hindi": {
+        QueryCategory.PEST_DISEASE: [
+            'कीट', 'कीड़े', 'रोग', 'बीमारी', 'फफूंद', 'इल्ली', 'माहू',
+            'keet', 'keeda', 'keede', 'rog', 'bimari', 'beemari', 'phaphund', 'illi', 'mahu'
+        ],
+        QueryCategory.CROP_MANAGEMENT: [
+            'बुवाई', 'बीज', 'कटाई', 'फसल', 'उपज', 'किस्म',
+            'buvai', 'buwai', 'beej', 'katai', 'fasal', 'upaj', 'kism'
+        ],
+        QueryCategory.WEATHER: [
+            'मौसम', 'बारिश', 'वर्षा', 'तापमान', 'सूखा', 'बाढ़', 'पाला',
+            'mausam', 'barish', 'baarish', 'varsha', 'tapman', 'sukha', 'sookha', 'badh', 'pala'
+        ],
+        QueryCategory.SOIL_HEALTH: [
+            'मिट्टी', 'मृदा', 'उर्वरता',
+            'mitti', 'mrida', 'urvarta'
+        ],
+        QueryCategory.IRRIGATION: [
+            'पानी', 'सिंचाई', 'टपक',
+            'pani', 'paani', 'sinchai', 'tapak'
+        ],
+        QueryCategory.FERTILIZER: [
+            'खाद', 'उर्वरक', 'गोबर', 'यूरिया',
+            'khad', 'khaad', 'urvarak', 'gobar', 'yuriya'
+        ],
+        QueryCategory.MARKET_PRICE: [
+            'भाव', 'दाम', 'कीमत', 'मंडी', 'बाजार',
+            'bhav', 'bhaav', 'daam', 'keemat', 'kimat', 'bazar', 'bajar'
+        ],
+    },
+    "marathi": {
+        QueryCategory.PEST_DISEASE: [
+            'कीड', 'किडी', 'रोग', 'बुरशी', 'अळी', 'मावा',
+            'kidi', 'burshi', 'mava'
+        ],
+        QueryCategory.CROP_MANAGEMENT: [
+            'पेरणी', 'बियाणे', 'काढणी', 'पीक', 'उत्पादन', 'वाण',
+            'perni', 'biyane', 'kadhni', 'pik', 'peek', 'utpadan'
+        ],
+        QueryCategory.WEATHER: [
+            'हवामान', 'पाऊस', 'तापमान', 'दुष्काळ', 'पूर', 'गारपीट',
+            'havaman', 'paus', 'paaus', 'dushkal', 'garpit'
+        ],
+        QueryCategory.SOIL_HEALTH: [
+            'माती', 'जमीन', 'सुपीकता',
+            'mati', 'maati', 'jamin', 'zamin', 'supikta'
+        ],
+        QueryCategory.IRRIGATION: [
+            'पाणी', 'सिंचन', 'ठिबक', 'तुषार',
+            'pani', 'paani', 'sinchan', 'thibak', 'tushar'
+        ],
+        QueryCategory.FERTILIZER: [
+            'खत', 'शेणखत', 'युरिया',
+            'khat', 'shenkhat', 'yuriya'
+        ],
+        QueryCategory.MARKET_PRICE: [
+            'बाजारभाव', 'भाव', 'दर', 'बाजार',
+            'bajarbhav', 'bhav', 'bajar'
+        ],
+    },
+}
+
+# Category order used to break score ties, matching the original keyword scan
+_CATEGORY_PRIORITY = [
+    QueryCategory.PEST_DISEASE,
+    QueryCategory.CROP_MANAGEMENT,
+    QueryCategory.WEATHER,
+    QueryCategory.SOIL_HEALTH,
+    QueryCategory.IRRIGATION,
+    QueryCategory.FERTILIZER,
+    QueryCategory.MARKET_PRICE,
+]
+
+# Word characters including Devanagari vowel signs, which \b does not treat as letters
+_WORD_CHARS = r"\w\u0900-\u097F"
+
+_VOWELS = "aeiou"
+
+
+def _plurals(word: str) -> List[str]:
+    forms = [word, word + "s", word + "es"]
+    if word.endswith("y") and word[-2:-1] not in _VOWELS:
+        forms.append(word[:-1] + "ies")
+    return forms
+
+
+def _inflections(word: str) -> List[str]:
+    """
+    -ing, -ed, -y and -en forms of an English word or of a phrase's last word:
+    "wilt" -> "wilting", "irrigate" -> "irrigating", "rot" -> "rotting"/"rotten",
+    "rain" -> "rainy". Over-generating is harmless; the forms only feed a lookup table.
+    """
+    head, _, last = word.rpartition(" ")
+    stems = [last]
+    if last.endswith("e") and not last.endswith("ee"):
+        stems.append(last[:-1])  # e-drop: irrigate -> irrigat-ing
+    if len(last) >= 3 and last[-1] not in _VOWELS + "wxy" and last[-2] in _VOWELS and last[-3] not in _VOWELS:
+        stems.append(last + last[-1])  # doubled consonant: rot -> rott-ing
+    if last.endswith("y") and last[-2:-1] not in _VOWELS:
+        stems.append(last[:-1] + "i")  # dry -> dri-ed
+    forms = {stem + suffix for stem in stems for suffix in ("ing", "ed", "y", "en")}
+    forms.add(last + "ing")  # dry -> drying
+    forms.discard(last)
+    return [f"{head} {form}" if head else form for form in sorted(forms)]
+
+
+class QueryCategorizer:
+    """
+    Keyword categorizer built once into a token lookup table.
+
+    A query is tokenized in one regex pass and each token (or two-word
+    phrase) is looked up in a precomputed dict that already contains plural
+    and inflected forms, so matching is whole-word: "ph" does not fire inside "phosphorus".
+    Every category is scored; a keyword shared by several categories (e.g.
+    "nutrients", "drought") splits its weight between them. Tables for all
+    languages are always used because farmers mix scripts, but the table for
+    the requested language gets extra weight.
+    """
+
+    def __init__(self, keyword_tables: Dict[str, Dict[QueryCategory, List[str]]] = CATEGORY_KEYWORDS,
+                 native_language_weight: float = 1.5):
+        self.native_language_weight = native_language_weight
+        self._token_pattern = re.compile(rf"[{_WORD_CHARS}]+")
+        self._priority = {category: index for index, category in enumerate(_CATEGORY_PRIORITY)}
+
+        # keyword form -> list of (category, language)
+        keyword_index: Dict[str, List[Tuple[QueryCategory, str]]] = {}
+        inflected: Dict[str, List[Tuple[QueryCategory, str]]] = {}
+        for language, table in keyword_tables.items():
+            for category, words in table.items():
+                for word in words:
+                    word = " ".join(self._token_pattern.findall(word.lower()))
+                    forms = _plurals(word) if word.isascii() else [word]
+                    for form in forms:
+                        entries = keyword_index.setdefault(form, [])
+                        if (category, language) not in entries:
+                            entries.append((category, language))
+                    for form in _inflections(word) if word.isascii() else []:
+                        entries = inflected.setdefault(form, [])
+                        if (category, language) not in entries:
+                            entries.append((category, language))
+        # A listed keyword keeps its own categories ("weeding" is crop management, not "weed" + -ing)
+        for form, entries in inflected.items():
+            keyword_index.setdefault(form, entries)
+
+        # Two-word phrases indexed by their first token
+        self._phrases: Dict[str, List[Tuple[str, str]]] = {}
+        for keyword in keyword_index:
+            if " " in keyword:
+                first, rest = keyword.split(" ", 1)
+                self._phrases.setdefault(first, []).append((rest, keyword))
+
+        # Precompute per-language weights so scoring is only dict lookups and additions
+        self._weights: Dict[Optional[str], Dict[str, List[Tuple[QueryCategory, float]]]] = {
+            language: self._build_weights(keyword_index, language)
+            for language in list(keyword_tables) + [None]
+        }
+
+    def _build_weights(self, keyword_index: Dict[str, List[Tuple[QueryCategory, str]]],
+                       language: Optional[str]) -> Dict[str, List[Tuple[QueryCategory, float]]]:
+        weights = {}
+        for keyword, entries in keyword_index.items():
+            # One keyword counts once per category even if listed in several languages
+            per_category: Dict[QueryCategory, float] = {}
+            for category, keyword_language in entries:
+                weight = self.native_language_weight if keyword_language == language else 1.0
+                per_category[category] = max(per_category.get(category, 0.0), weight)
+            share = 1.0 / len(per_category)
+            weights[keyword] = [(category, weight * share) for category, weight in per_category.items()]
+        return weights
+
+    def rank(self, query: str, language: Optional[str] = None) -> List[Tuple[QueryCategory, float]]:
+        """Return matching categories ranked by score, highest first"""
+        weights = self._weights.get((language or "english").lower()) or self._weights[None]
+        tokens = self._token_pattern.findall(query.lower())
+        phrases = self._phrases
+        scores: Dict[QueryCategory, float] = {}
+
+        i, count = 0, len(tokens)
+        while i < count:
+            keyword = tokens[i]
+            i += 1
+            if keyword in phrases and i < count:
+                for rest, phrase in phrases[keyword]:
+                    if tokens[i] == rest:
+                        keyword = phrase
+                        i += 1
+                        break
+            matches = weights.get(keyword)
+            if matches:
+                for category, weight in matches:
+                    scores[category] = scores.get(category, 0.0) + weight
+
+        if not scores:
+            return []
+        return sorted(
+            scores.items(),
+            key=lambda item: (-item[1], self._priority.get(item[0], len(self._priority)))
+        )
+
+    def categorize(self, query: str, language: Optional[str] = None) -> QueryCategory:
+        """Return the best matching category, or GENERAL if nothing matches"""
+        ranked = self.rank(query, language)
+        return ranked[0][0] if ranked else QueryCategory.GENERAL
+
+
+# Global instance
+query_categorizer = QueryCategorizer()
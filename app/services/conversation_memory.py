@@ -0,0 +1,225 @@
+import re
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+from app.config import get_settings, worker_count
+from app.services.prompts import prompt_builder
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-swap retries when workers save turns for one farmer at the same time
+_SAVE_ATTEMPTS = 5
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    sentence = _SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + "..."
+
+
+class ConversationSession:
+    """Rolling window of recent turns plus a bounded summary of older ones"""
+
+    def __init__(self, farmer_id: str, window_turns: int, turns: Optional[List[Tuple[str, str]]] = None,
+                 summary: str = "", total_turns: int = 0, history_tokens: int = 0, version: int = 0):
+        self.farmer_id = farmer_id
+        self.turns: Deque[Tuple[str, str]] = deque(turns or [], maxlen=window_turns)
+        self.summary = summary
+        self.total_turns = total_turns
+        # Tokens a naive full-history replay would send with the next question
+        self.history_tokens = history_tokens
+        # Stored version this session was loaded at; 0 when not stored yet
+        self.version = version
+
+
+class SQLiteMemoryStore:
+    """
+    Optional persistent backend so sessions survive restarts. Saves are
+    compare-and-swap on a version column, so when several workers share
+    the file a turn saved by one is never silently overwritten by another.
+    """
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS conversation_sessions (
+                    farmer_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    turns TEXT NOT NULL,
+                    total_turns INTEGER NOT NULL,
+                    history_tokens INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1
+                )"""
+            )
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(conversation_sessions)")}
+            if "version" not in columns:
+                # Files written before saves were versioned
+                self._connection.execute(
+                    "ALTER TABLE conversation_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+                )
+            self._connection.commit()
+
+    def load(self, farmer_id: str, window_turns: int) -> Optional[ConversationSession]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT summary, turns, total_turns, history_tokens, version FROM conversation_sessions "
+                "WHERE farmer_id = ?",
+                (farmer_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        summary, turns, total_turns, history_tokens, version = row
+        return ConversationSession(
+            farmer_id, window_turns, [tuple(turn) for turn in json.loads(turns)],
+            summary, total_turns, history_tokens, version
+        )
+
+    def save(self, session: ConversationSession) -> bool:
+        """Store the session unless someone else saved it since it was loaded; True if stored"""
+        values = (session.summary, json.dumps(list(session.turns)), session.total_turns,
+                  session.history_tokens, time.time())
+        with self._lock:
+            if session.version == 0:
+                cursor = self._connection.execute(
+                    "INSERT INTO conversation_sessions "
+                    "(farmer_id, summary, turns, total_turns, history_tokens, updated_at, version) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT (farmer_id) DO NOTHING",
+                    (session.farmer_id, *values)
+                )
+            else:
+                cursor = self._connection.execute(
+                    "UPDATE conversation_sessions SET summary = ?, turns = ?, total_turns = ?, history_tokens = ?, "
+                    "updated_at = ?, version = version + 1 WHERE farmer_id = ? AND version = ?",
+                    (*values, session.farmer_id, session.version)
+                )
+            self._connection.commit()
+            stored = cursor.rowcount == 1
+            if stored:
+                session.version += 1
+        return stored
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM conversation_sessions").fetchone()[0]
+
+
+class ConversationMemory:
+    """
+    Per-farmer conversation memory keyed by farmer_id.
+
+    The last window_turns question/answer pairs are replayed verbatim. Older
+    turns are folded into an extractive summary (first sentence of each
+    question and answer) capped at summary_max_chars, so the prompt stays
+    the same size however long the conversation runs. Sessions live in an
+    in-process LRU, optionally backed by SQLite. When the store is shared by
+    several worker processes (shared=True) sessions are always read from it,
+    since another worker may have answered the farmer's last question.
+    """
+
+    def __init__(self, max_sessions: int = 10000, window_turns: int = 4, summary_max_chars: int = 600,
+                 store: Optional[SQLiteMemoryStore] = None, shared: bool = False):
+        self.max_sessions = max_sessions
+        self.window_turns = window_turns
+        self.summary_max_chars = summary_max_chars
+        self.store = store
+        self.shared = shared and store is not None
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self.tokens_sent = 0
+        self.tokens_naive = 0
+
+    async def get(self, farmer_id: str) -> ConversationSession:
+        """Return the farmer's session, loading it from the store on an LRU miss (always, when shared)"""
+        if not self.shared:
+            session = self._sessions.get(farmer_id)
+            if session is not None:
+                self._sessions.move_to_end(farmer_id)
+                return session
+
+        session = None
+        if self.store is not None:
+            session = await asyncio.to_thread(self.store.load, farmer_id, self.window_turns)
+        if session is None:
+            session = ConversationSession(farmer_id, self.window_turns)
+        if self.shared:
+            return session
+
+        self._sessions[farmer_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def record_usage(self, session: ConversationSession, sent: int):
+        """Account the history tokens sent (summary and replayed turns) against a naive full-history replay"""
+        self.tokens_sent += sent
+        self.tokens_naive += session.history_tokens
+
+    async def add_turn(self, session: ConversationSession, question: str, answer: str):
+        """Append a turn, summarizing the one that falls out of the window"""
+        self._append(session, question, answer)
+        if self.store is None:
+            return
+        farmer_id = session.farmer_id
+        for _ in range(_SAVE_ATTEMPTS):
+            if await asyncio.to_thread(self.store.save, session):
+                return
+            # Another worker saved a turn for this farmer since we loaded the session:
+            # add ours on top of theirs instead of overwriting it
+            session = await asyncio.to_thread(self.store.load, farmer_id, self.window_turns)
+            session = session or ConversationSession(farmer_id, self.window_turns)
+            self._append(session, question, answer)
+            if not self.shared:
+                self._sessions[farmer_id] = session
+        logger.warning(f"Conversation turn for {farmer_id} not saved: concurrent updates")
+
+    def _append(self, session: ConversationSession, question: str, answer: str):
+        if len(session.turns) == session.turns.maxlen:
+            old_question, old_answer = session.turns[0]
+            line = f"Farmer asked: {_first_sentence(old_question, 120)} Advice: {_first_sentence(old_answer, 160)}"
+            summary = f"{session.summary}\n{line}" if session.summary else line
+            # Keep the most recent lines within the budget
+            while len(summary) > self.summary_max_chars and "\n" in summary:
+                summary = summary.split("\n", 1)[1]
+            session.summary = summary[-self.summary_max_chars:]
+
+        session.turns.append((question, answer))
+        session.total_turns += 1
+        session.history_tokens += prompt_builder.turn_tokens((question, answer))
+
+    def stats(self) -> dict:
+        """Blocking in shared mode (sessions are counted in the store); call from a thread"""
+        return {
+            "sessions": self.store.count() if self.shared else len(self._sessions),
+            "window_turns": self.window_turns,
+            "history_tokens_sent": self.tokens_sent,
+            "history_tokens_full_replay": self.tokens_naive,
+            "history_tokens_saved": self.tokens_naive - self.tokens_sent,
+            "persistent": self.store is not None,
+            "shared": self.shared
+        }
+
+
+settings = get_settings()
+# With several workers a farmer's follow-ups can land on any of them, so sessions
+# go to MEMORY_SQLITE_PATH or else the file the workers already share (set for
+# WORKERS > 1, or explicitly when uvicorn --workers is run directly)
+multi_worker = worker_count(settings) > 1 or bool(settings.shared_store_path)
+memory_path = settings.memory_sqlite_path or (settings.shared_store_path if multi_worker else "")
+
+# Global instance
+conversation_memory = ConversationMemory(
+    max_sessions=settings.memory_max_sessions,
+    window_turns=settings.memory_window_turns,
+    summary_max_chars=settings.memory_summary_max_chars,
+    store=SQLiteMemoryStore(memory_path) if memory_path else None,
+    shared=multi_worker
+)
@@ -1,183 +1,388 @@
 import os
+import asyncio
 import logging
 import json
-from typing import List, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import HumanMessage, SystemMessage
+from typing import AsyncIterator, List, Optional, Tuple, Union
 from app.config import get_settings
 from app.models.schemas import QueryCategory, FarmerQueryResponse
+from app.services.response_cache import ResponseCache
+from app.services.shared_store import shared_store
+from app.services.categorizer import query_categorizer
+from app.services.http_client import get_http_client
+from app.services.conversation_memory import ConversationSession, conversation_memory
+from app.services.knowledge_base import FaqAnswer, Passage, Retrieval, knowledge_base
+from app.services.prompts import Prompt, prompt_builder
+from app.services.postprocess import AnswerPostProcessor, analyze_answer
+from app.services.llm_backends import GeminiBackend, LLMBackend, LLMChain, LangChainBackend, build_chain
+from app.services.translation import Translation, build_translation_service, resolve_language
+from app.metrics import (
+    registry, ERRORS, LLM_IN_FLIGHT, LLM_PROMPT_CHARS, LLM_PROMPT_TOKENS, LLM_RESPONSE_CHARS, PROMPT_TRIMMED,
+    QUERY_STAGE_LATENCY
+)
 from datetime import datetime
+from time import perf_counter
 
 logger = logging.getLogger(__name__)
 
 class GeminiService:
     """Service class for handling Gemini API interactions"""
     
-    def __init__(self):
+    def __init__(self, llm=None, chain: Optional[LLMChain] = None):
         self.settings = get_settings()
-        self.llm = None
-        self._initialize_llm()
+        # Primary model, secondary model and offline stub, built from LLM_BACKENDS.
+        # Passing a LangChain chat model as llm makes it the only backend.
+        if chain is None:
+            chain = LLMChain([LangChainBackend("injected", self.settings.llm_timeout_seconds, model=llm)]) \
+                if llm is not None else build_chain(self.settings)
+        self.chain = chain
+        # Bounds the number of LLM completions in flight at once
+        self._llm_semaphore = asyncio.Semaphore(self.settings.llm_max_concurrency)
+        self.cache = ResponseCache(
+            max_entries=self.settings.response_cache_max_entries,
+            ttl_seconds=self.settings.response_cache_ttl_seconds,
+            similarity_threshold=self.settings.response_cache_similarity,
+            # Only worth a round trip when other workers write to it too
+            shared=shared_store if shared_store.shared else None
+        )
+        self.memory = conversation_memory if self.settings.memory_enabled else None
+        self.knowledge = knowledge_base if self.settings.knowledge_enabled else None
+        self.prompts = prompt_builder
+        # Translates English-only answers (FAQ, offline rules); LLM answers are prompted in the farmer's language
+        self.translation = build_translation_service(
+            self.chain, shared_store if shared_store.shared else None, self._llm_semaphore
+        ) if self.settings.translation_enabled else None
     
-    def _initialize_llm(self):
-        """Initialize the Gemini LLM"""
+    def warm_up(self):
+        """Import LangChain and build the LLM clients (blocking, call from a thread)"""
+        self.chain.warm_up()
+    
+    def _determine_category(self, query: str, language: Optional[str] = None) -> QueryCategory:
+        """Determine query category based on keywords"""
+        return query_categorizer.categorize(query, language)
+    
+    def _build_prompt(self, query: str, category: QueryCategory, farmer_context: Optional[dict] = None,
+                      session: Optional[ConversationSession] = None, passages: Optional[List[Passage]] = None,
+                      language: Optional[str] = None) -> Prompt:
+        """Assemble the LLM messages within the prompt token budget"""
+        start = perf_counter()
+        prompt = self.prompts.build(
+            query, category, language, farmer_context, passages or (),
+            session.summary if session is not None else "",
+            session.turns if session is not None else ()
+        )
+        if session is not None:
+            self.memory.record_usage(session, prompt.history_tokens)
+        QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("prompt_build",))
+        LLM_PROMPT_CHARS.observe(sum(len(content) for _, content in prompt.messages))
+        LLM_PROMPT_TOKENS.observe(prompt.tokens)
+        for part, count in prompt.trimmed.items():
+            PROMPT_TRIMMED.inc((part,), count)
+        return prompt
+    
+    async def _get_session(self, farmer_context: Optional[dict]) -> Optional[ConversationSession]:
+        """Conversation memory for the farmer, if enabled and the farmer is known"""
+        farmer_id = (farmer_context or {}).get("farmer_id")
+        if self.memory is None or not farmer_id:
+            return None
+        return await self.memory.get(farmer_id)
+    
+    def _retrieve(self, query: str, language: str, allow_faq: bool = True) -> Retrieval:
+        """Advisory passages for the prompt, or a curated FAQ answer that makes the LLM call unnecessary"""
+        if self.knowledge is None:
+            return Retrieval()
+        start = perf_counter()
+        if language != "english" and self.translation is not None:
+            # The index is English: search with the glossary terms found in the question
+            query = self.translation.to_english(query, language) or query
+        # FAQ answers are written in English, so other languages need them translated
+        allow_faq = allow_faq and (language == "english" or self.translation is not None)
+        retrieval = self.knowledge.search(query, allow_faq=allow_faq)
+        QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("retrieval",))
+        return retrieval
+    
+    async def _translate(self, text: str, language: str) -> Translation:
+        start = perf_counter()
         try:
-            if not self.settings.gemini_api_key or self.settings.gemini_api_key == "your_gemini_api_key_here":
-                raise ValueError("Gemini API key not configured. Please set GEMINI_API_KEY in .env file")
-            
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-pro",
-                google_api_key=self.settings.gemini_api_key,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            logger.info("✅ Gemini LLM initialized successfully")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Gemini LLM: {e}")
-            raise
+            return await self.translation.translate(text, language)
+        finally:
+            QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("translate",))
     
-    def _create_system_prompt(self, category: Optional[QueryCategory] = None) -> str:
-        """Create system prompt based on query category"""
-        base_prompt = """You are an expert agricultural advisor AI assistant designed to help farmers in India. 
-        You provide practical, actionable advice based on scientific farming practices and local conditions.
-
-        Guidelines:
-        1. Give specific, actionable advice
-        2. Consider Indian farming conditions and practices
-        3. Mention relevant crops, seasons, and regional factors
-        4. Include cost-effective solutions
-        5. Provide safety warnings when discussing pesticides/chemicals
-        6. Suggest organic/sustainable alternatives when possible
-        7. Keep responses concise but comprehensive
-        8. If unsure, recommend consulting local agricultural extension officers"""
-        
-        category_specific = {
-            QueryCategory.CROP_MANAGEMENT: "\nFocus on: Crop cultivation, planting techniques, harvesting, yield improvement.",
-            QueryCategory.PEST_DISEASE: "\nFocus on: Pest identification, disease management, organic treatments, IPM strategies.",
-            QueryCategory.WEATHER: "\nFocus on: Weather-related farming advice, seasonal planning, climate adaptation.",
-            QueryCategory.MARKET_PRICE: "\nFocus on: Market trends, price forecasting, best selling practices.",
-            QueryCategory.SOIL_HEALTH: "\nFocus on: Soil testing, nutrient management, soil conservation.",
-            QueryCategory.IRRIGATION: "\nFocus on: Water management, irrigation methods, water conservation.",
-            QueryCategory.FERTILIZER: "\nFocus on: Nutrient management, fertilizer application, organic alternatives."
-        }
-        
-        if category and category in category_specific:
-            base_prompt += category_specific[category]
-        
-        return base_prompt
+    async def _faq_response(self, faq: FaqAnswer, category: QueryCategory,
+                            language: str) -> Optional[FarmerQueryResponse]:
+        """The FAQ answer in the farmer's language; None when it cannot be translated in full"""
+        answer = faq.answer
+        if language != "english":
+            translation = await self._translate(answer, language)
+            if not translation.complete:
+                return None
+            answer = translation.text
+        analysis = analyze_answer(answer)
+        return FarmerQueryResponse(
+            answer=answer,
+            confidence_score=round(0.7 + 0.25 * faq.match, 2),
+            category=category,
+            suggestions=analysis.suggestions,
+            sources=[faq.source],
+            extras=analysis.extras,
+            timestamp=datetime.now()
+        )
     
-    def _determine_category(self, query: str) -> QueryCategory:
-        """Determine query category based on keywords"""
-        query_lower = query.lower()
-        
-        # Keywords for each category
-        keywords = {
-            QueryCategory.PEST_DISEASE: ['pest', 'disease', 'insect', 'fungus', 'virus', 'infection', 'spots', 'worm', 'aphid'],
-            QueryCategory.CROP_MANAGEMENT: ['planting', 'harvesting', 'cultivation', 'growing', 'yield', 'variety', 'seed'],
-            QueryCategory.WEATHER: ['weather', 'rain', 'temperature', 'season', 'monsoon', 'drought', 'flood'],
-            QueryCategory.SOIL_HEALTH: ['soil', 'nutrients', 'ph', 'organic matter', 'testing', 'fertility'],
-            QueryCategory.IRRIGATION: ['water', 'irrigation', 'watering', 'drip', 'sprinkler', 'drought'],
-            QueryCategory.FERTILIZER: ['fertilizer', 'nutrients', 'nitrogen', 'phosphorus', 'potassium', 'manure'],
-            QueryCategory.MARKET_PRICE: ['price', 'market', 'selling', 'cost', 'profit', 'revenue']
-        }
-        
-        for category, words in keywords.items():
-            if any(word in query_lower for word in words):
-                return category
-        
-        return QueryCategory.GENERAL
+    def _needs_translation(self, backend: LLMBackend, language: str) -> bool:
+        """Answers from English-only backends (the offline rules) are translated for other languages"""
+        return language != "english" and not backend.multilingual and self.translation is not None
     
-    def _calculate_confidence(self, response: str, query: str) -> float:
-        """Calculate confidence score based on response quality"""
-        # Simple confidence calculation based on response length and specificity
-        confidence = 0.7  # Base confidence
-        
-        if len(response) > 100:
-            confidence += 0.1
-        if any(word in response.lower() for word in ['recommend', 'suggest', 'should', 'can']):
-            confidence += 0.1
-        if any(word in response.lower() for word in ['kg/acre', 'ml/liter', 'days', 'weeks']):
-            confidence += 0.1
-            
-        return min(confidence, 1.0)
+    async def _localize(self, result: FarmerQueryResponse, language: str) -> FarmerQueryResponse:
+        """Translate an English answer; sentences the translators do not cover stay in English"""
+        translation = await self._translate(result.answer, language)
+        # Extras keep the doses and chemical names found in the English answer
+        return result.copy(update={
+            "answer": translation.text,
+            "suggestions": analyze_answer(translation.text).suggestions
+        })
     
-    def _extract_suggestions(self, response: str) -> List[str]:
-        """Extract additional suggestions from response"""
-        suggestions = []
-        
-        # Look for numbered points or bullet points
-        lines = response.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith(('•', '-', '*')) or (line and line[0].isdigit() and '.' in line):
-                suggestion = line.lstrip('•-*0123456789. ')
-                if suggestion and len(suggestion) > 10:
-                    suggestions.append(suggestion)
+    def _build_response(self, answer: str, category: QueryCategory, backend: LLMBackend,
+                        sources: Optional[List[str]] = None,
+                        processor: Optional[AnswerPostProcessor] = None) -> FarmerQueryResponse:
+        """Score the answer and wrap it in a response"""
+        # Confidence, suggestions and extras in one pass; a streamed answer was fed to its processor chunk by chunk
+        start = perf_counter()
+        if processor is None:
+            processor = AnswerPostProcessor()
+            processor.feed(answer)
+        analysis = processor.finish()
+        QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("postprocess",))
         
-        return suggestions[:3]  # Return top 3 suggestions
+        return FarmerQueryResponse(
+            answer=answer,
+            confidence_score=min(analysis.confidence, backend.max_confidence),
+            category=category,
+            suggestions=analysis.suggestions,
+            sources=[backend.source, *(sources or [])],
+            extras=analysis.extras,
+            timestamp=datetime.now()
+        )
+    
+    def _error_response(self) -> FarmerQueryResponse:
+        return FarmerQueryResponse(
+            answer="I apologize, but I'm experiencing technical difficulties. Please try again or consult your local agricultural extension officer.",
+            confidence_score=0.0,
+            category=QueryCategory.GENERAL,
+            suggestions=["Try rephrasing your question", "Contact local agricultural extension office"],
+            sources=[],
+            timestamp=datetime.now()
+        )
+    
+    def _lookup_cache(self, query: str, category: QueryCategory, farmer_context: Optional[dict],
+                      use_cache: bool, language: str) -> Optional[FarmerQueryResponse]:
+        """Serve repeated and near-duplicate questions from the cache"""
+        if not use_cache:
+            self.cache.record_bypass()
+            return None
+        return self.cache.get(query, category, farmer_context, language)
     
     async def process_farmer_query(
         self, 
         query: str, 
         category: Optional[QueryCategory] = None,
-        farmer_context: Optional[dict] = None
+        farmer_context: Optional[dict] = None,
+        use_cache: bool = True,
+        language: Optional[str] = None
     ) -> FarmerQueryResponse:
         """Process farmer query using Gemini API"""
         try:
             # Determine category if not provided
+            start = perf_counter()
+            language = resolve_language(language, query)
             if not category:
-                category = self._determine_category(query)
+                category = self._determine_category(query, language)
+            stage_end = perf_counter()
+            QUERY_STAGE_LATENCY.observe(stage_end - start, ("categorize",))
             
-            # Create system prompt
-            system_prompt = self._create_system_prompt(category)
+            # Answers that depend on earlier turns must not be shared through the cache
+            start = stage_end
+            session = await self._get_session(farmer_context)
+            use_cache = use_cache and self.settings.response_cache_enabled and not (session and session.total_turns)
+            cached = self._lookup_cache(query, category, farmer_context, use_cache, language)
+            stage_end = perf_counter()
+            QUERY_STAGE_LATENCY.observe(stage_end - start, ("cache_lookup",))
+            if cached is not None:
+                if session is not None:
+                    await self.memory.add_turn(session, query, cached.answer)
+                return cached
             
-            # Add farmer context if available
-            if farmer_context:
-                context_info = f"\nFarmer Context: Location: {farmer_context.get('location', 'Not specified')}, Crop: {farmer_context.get('crop_type', 'Not specified')}"
-                system_prompt += context_info
+            retrieval = self._retrieve(query, language)
+            if retrieval.faq is not None:
+                result = await self._faq_response(retrieval.faq, category, language)
+                if result is not None:
+                    if session is not None:
+                        await self.memory.add_turn(session, query, result.answer)
+                    return result
+                # No full translation of the FAQ answer: the LLM answers in the farmer's language instead
+                retrieval = self._retrieve(query, language, allow_faq=False)
             
-            # Create messages
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=f"Farmer's question: {query}")
-            ]
+            prompt = self._build_prompt(query, category, farmer_context, session, retrieval.passages, language)
             
-            # Get response from Gemini
-            logger.info(f"Processing query: {query[:50]}...")
-            response = self.llm.invoke(messages)
-            answer = response.content
+            # Get response from the first backend in the chain that answers
+            logger.info(f"Processing query: {query[:50]}... ({prompt.describe()})")
+            async with self._llm_semaphore:
+                start = perf_counter()
+                LLM_IN_FLIGHT.inc()
+                try:
+                    answer, backend = await self.chain.complete(prompt.messages)
+                finally:
+                    LLM_IN_FLIGHT.dec()
+                    QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("llm_call",))
+            LLM_RESPONSE_CHARS.observe(len(answer))
             
-            # Calculate confidence and extract suggestions
-            confidence = self._calculate_confidence(answer, query)
-            suggestions = self._extract_suggestions(answer)
+            result = self._build_response(answer, category, backend, retrieval.sources)
+            if self._needs_translation(backend, language):
+                result = await self._localize(result, language)
+            if use_cache and backend.cacheable:
+                self.cache.set(query, category, farmer_context, result, language)
+            if session is not None:
+                await self.memory.add_turn(session, query, result.answer)
             
-            return FarmerQueryResponse(
-                answer=answer,
-                confidence_score=confidence,
-                category=category,
-                suggestions=suggestions,
-                sources=["Gemini AI", "Agricultural Knowledge Base"],
-                timestamp=datetime.now()
-            )
+            return result
             
         except Exception as e:
             logger.error(f"Error processing query: {e}")
-            return FarmerQueryResponse(
-                answer="I apologize, but I'm experiencing technical difficulties. Please try again or consult your local agricultural extension officer.",
-                confidence_score=0.0,
-                category=QueryCategory.GENERAL,
-                suggestions=["Try rephrasing your question", "Contact local agricultural extension office"],
-                sources=[],
-                timestamp=datetime.now()
-            )
-    
-    def test_connection(self) -> bool:
-        """Test Gemini API connection"""
+            ERRORS.inc(("gemini_service", type(e).__name__))
+            return self._error_response()
+    
+    async def stream_farmer_query(
+        self,
+        query: str,
+        category: Optional[QueryCategory] = None,
+        farmer_context: Optional[dict] = None,
+        use_cache: bool = True,
+        language: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Union[str, FarmerQueryResponse]]]:
+        """
+        Stream a farmer query answer as it is generated.
+        Yields ("token", text) for each chunk and finishes with ("done", response)
+        carrying the scored answer. Failures yield ("error", message) before "done".
+        """
+        streamed = False
+        try:
+            language = resolve_language(language, query)
+            if not category:
+                category = self._determine_category(query, language)
+            
+            session = await self._get_session(farmer_context)
+            use_cache = use_cache and self.settings.response_cache_enabled and not (session and session.total_turns)
+            cached = self._lookup_cache(query, category, farmer_context, use_cache, language)
+            if cached is not None:
+                if session is not None:
+                    await self.memory.add_turn(session, query, cached.answer)
+                yield "token", cached.answer
+                yield "done", cached
+                return
+            
+            retrieval = self._retrieve(query, language)
+            if retrieval.faq is not None:
+                result = await self._faq_response(retrieval.faq, category, language)
+                if result is not None:
+                    if session is not None:
+                        await self.memory.add_turn(session, query, result.answer)
+                    yield "token", result.answer
+                    yield "done", result
+                    return
+                retrieval = self._retrieve(query, language, allow_faq=False)
+            
+            prompt = self._build_prompt(query, category, farmer_context, session, retrieval.passages, language)
+            
+            logger.info(f"Streaming query: {query[:50]}... ({prompt.describe()})")
+            chunks = []
+            processor = AnswerPostProcessor()
+            backend = None
+            async with self._llm_semaphore:
+                start = perf_counter()
+                LLM_IN_FLIGHT.inc()
+                try:
+                    async for chunk, backend in self.chain.stream(prompt.messages):
+                        if not chunks:
+                            QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("llm_first_token",))
+                        chunks.append(chunk)
+                        processor.feed(chunk)
+                        # English-only answers are sent once translated, at the end
+                        if not self._needs_translation(backend, language):
+                            streamed = True
+                            yield "token", chunk
+                finally:
+                    LLM_IN_FLIGHT.dec()
+                    QUERY_STAGE_LATENCY.observe(perf_counter() - start, ("llm_call",))
+            
+            answer = "".join(chunks)
+            LLM_RESPONSE_CHARS.observe(len(answer))
+            result = self._build_response(answer, category, backend, retrieval.sources, processor)
+            if self._needs_translation(backend, language):
+                result = await self._localize(result, language)
+                yield "token", result.answer
+            if use_cache and backend.cacheable:
+                self.cache.set(query, category, farmer_context, result, language)
+            if session is not None:
+                await self.memory.add_turn(session, query, result.answer)
+            
+            yield "done", result
+            
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            ERRORS.inc(("gemini_service", type(e).__name__))
+            error_response = self._error_response()
+            yield "error", "Answer interrupted" if streamed else error_response.answer
+            yield "done", error_response
+    
+    async def check_reachability(self) -> Optional[bool]:
+        """
+        Cheap Gemini availability check for health probes.
+        Lists models instead of requesting a completion, so it is not billed.
+        Returns None when no Gemini backend is configured (e.g. stub-only chains).
+        """
+        gemini = next((backend for backend in self.chain.backends
+                       if isinstance(backend, GeminiBackend) and backend.configured), None)
+        if gemini is None:
+            return None
+        # Key in a header, not the query string: httpx logs request URLs
+        response = await get_http_client().get(
+            self.settings.gemini_models_url,
+            params={"pageSize": 1},
+            headers={"x-goog-api-key": gemini.api_key}
+        )
+        return response.status_code == 200
+    
+    async def test_connection(self) -> bool:
+        """Test the primary LLM backend directly, without falling back"""
         try:
-            test_response = self.llm.invoke([HumanMessage(content="Hello, test connection")])
-            return bool(test_response.content)
+            primary = self.chain.primary
+            if primary is None or not primary.configured:
+                raise ValueError("Primary LLM backend not configured. Please set GEMINI_API_KEY in .env file")
+            async with self._llm_semaphore:
+                test_response = await primary.complete([("human", "Hello, test connection")])
+            return bool(test_response)
         except Exception as e:
             logger.error(f"Gemini API connection test failed: {e}")
             return False
 
 # Global instance
-gemini_service = GeminiService()
\ No newline at end of file
+gemini_service = GeminiService()
+
+registry.register_callback(
+    "translation_lookups_total", "Translations of English-only answers by result", "counter",
+    lambda: {
+        (("result", "hit"),): gemini_service.translation.hits,
+        (("result", "shared_hit"),): gemini_service.translation.hits_shared,
+        (("result", "miss"),): gemini_service.translation.misses,
+        (("result", "incomplete"),): gemini_service.translation.incomplete,
+    } if gemini_service.translation is not None else {}
+)
+
+registry.register_callback(
+    "response_cache_lookups_total", "Answer cache lookups by result", "counter",
+    lambda: {
+        (("result", "exact_hit"),): gemini_service.cache.hits_exact,
+        (("result", "near_hit"),): gemini_service.cache.hits_near,
+        (("result", "shared_hit"),): gemini_service.cache.hits_shared,
+        (("result", "miss"),): gemini_service.cache.misses,
+        (("result", "bypass"),): gemini_service.cache.bypasses,
+    }
+)
\ No newline at end of file
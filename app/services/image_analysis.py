@@ -0,0 +1,331 @@
+"""
+Pest and disease identification from farmer photos.
+
+Pipeline: base64 decode (size-checked before decoding) -> decode, downscale
+and crop in a worker process pool -> perceptual-hash cache -> micro-batched
+inference with a quantized ONNX classifier in a worker thread (onnxruntime
+releases the GIL). Pillow, numpy and onnxruntime are optional: without them,
+or without the model file, the service reports itself unavailable.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+from app.config import get_settings
+from app.metrics import IMAGE_BATCH_SIZE, IMAGE_CACHE, QUERY_STAGE_LATENCY
+from app.services.image_preprocess import preprocess
+from app.services.uploads import decode_base64
+
+logger = logging.getLogger(__name__)
+
+Prediction = Tuple[str, float]  # (label, probability)
+
+# ImageNet statistics, used by ResNet-style models
+_MEAN = (0.485, 0.456, 0.406)
+_STD = (0.229, 0.224, 0.225)
+
+
+class ImageAnalysisUnavailableError(RuntimeError):
+    """Optional dependencies or the model file are missing"""
+
+
+class OnnxClassifier:
+    """
+    ResNet-style ONNX image classifier (int8-quantized for CPU).
+    Takes size x size RGB crops, normalized with ImageNet statistics, in
+    NCHW or NHWC layout depending on the model's input.
+    """
+
+    def __init__(self, model_path: str, labels_path: str, input_size: int = 224, threads: int = 2):
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.input_size = input_size
+        self.threads = threads
+        self._session = None
+        self._input_name = ""
+        self._channels_first = True
+        self._fixed_batch = False
+        self.labels: List[str] = []
+
+    @property
+    def unavailable_reason(self) -> Optional[str]:
+        for module in ("PIL", "numpy", "onnxruntime"):
+            if importlib.util.find_spec(module) is None:
+                return f"{module} is not installed"
+        if not os.path.exists(self.model_path):
+            return f"model file {self.model_path} not found"
+        return None
+
+    def load(self):
+        """Create the inference session (slow; call from a worker thread)"""
+        if self._session is not None:
+            return
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        model_input = session.get_inputs()[0]
+        shape = model_input.shape
+        self._input_name = model_input.name
+        self._channels_first = len(shape) == 4 and shape[1] == 3
+        # Models exported with a fixed batch of 1 are run image by image
+        self._fixed_batch = shape[0] == 1
+        with open(self.labels_path, encoding="utf-8") as handle:
+            self.labels = [line.strip() for line in handle if line.strip()]
+        self._session = session
+        logger.info(f"✅ Image classifier loaded: {os.path.basename(self.model_path)}, {len(self.labels)} classes")
+
+    def classify(self, images: List[bytes], top_k: int = 3) -> List[List[Prediction]]:
+        """Top-k labels for a batch of size x size RGB crops (runs in a worker thread)"""
+        import numpy as np
+
+        self.load()
+        size = self.input_size
+        batch = np.frombuffer(b"".join(images), dtype=np.uint8).reshape(len(images), size, size, 3)
+        inputs = (batch.astype(np.float32) / 255.0 - np.array(_MEAN, np.float32)) / np.array(_STD, np.float32)
+        if self._channels_first:
+            inputs = np.ascontiguousarray(inputs.transpose(0, 3, 1, 2))
+        if self._fixed_batch:
+            logits = np.concatenate([
+                self._session.run(None, {self._input_name: inputs[i:i + 1]})[0] for i in range(len(images))
+            ])
+        else:
+            logits = self._session.run(None, {self._input_name: inputs})[0]
+
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        top = np.argsort(-probabilities, axis=1)[:, :top_k]
+        return [
+            [(self._label(index), round(float(row[index]), 4)) for index in indices]
+            for row, indices in zip(probabilities, top)
+        ]
+
+    def _label(self, index: int) -> str:
+        return self.labels[index] if index < len(self.labels) else f"class {index}"
+
+
+class InferenceBatcher:
+    """
+    Groups concurrent classification requests into one model call: up to
+    max_batch images, waiting at most max_wait_ms after the first arrives.
+    A batch of 8 costs far less than 8 single-image runs on CPU.
+    """
+
+    def __init__(self, classify: Callable[[List[bytes]], List[List[Prediction]]],
+                 max_batch: int = 8, max_wait_ms: int = 10):
+        self.classify = classify
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.images = 0
+
+    async def submit(self, pixels: bytes) -> List[Prediction]:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((pixels, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Callers that gave up while queued do not need a slot in the batch
+            batch = [(pixels, future) for pixels, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            IMAGE_BATCH_SIZE.observe(len(batch))
+            try:
+                results = await asyncio.to_thread(self.classify, [pixels for pixels, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), predictions in zip(batch, results):
+                if not future.done():
+                    future.set_result(predictions)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "images": self.images,
+            "average_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0
+        }
+
+
+class ImageAnalysis:
+    """Classifier output for one image"""
+
+    __slots__ = ("predictions", "image_hash", "cached")
+
+    def __init__(self, predictions: List[Prediction], image_hash: int, cached: bool):
+        self.predictions = predictions
+        self.image_hash = image_hash
+        self.cached = cached
+
+    @property
+    def hash_hex(self) -> str:
+        return f"{self.image_hash:016x}"
+
+
+class ImageAnalysisService:
+    """
+    Runs the pipeline and caches predictions by perceptual hash, so the
+    same photo sent again (even re-compressed or resized by a messaging
+    app) skips inference.
+    """
+
+    def __init__(self, classifier: Optional[OnnxClassifier] = None):
+        self.settings = get_settings()
+        self.classifier = classifier or OnnxClassifier(
+            self.settings.image_model_path,
+            self.settings.image_labels_path,
+            self.settings.image_input_size,
+            self.settings.image_inference_threads
+        )
+        self.batcher = InferenceBatcher(
+            lambda images: self.classifier.classify(images, self.settings.image_top_k),
+            self.settings.image_max_batch,
+            self.settings.image_batch_wait_ms
+        )
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # dHash -> predictions, least recently used evicted first
+        self._cache: "OrderedDict[int, List[Prediction]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def unavailable_reason(self) -> Optional[str]:
+        return self.classifier.unavailable_reason
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the server process runs threads that must not be forked mid-operation
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.settings.image_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _cached(self, image_hash: int) -> Optional[List[Prediction]]:
+        predictions = self._cache.get(image_hash)
+        if predictions is None and self.settings.image_hash_max_distance:
+            # Near-duplicates: a few differing bits are the same photo, re-encoded
+            limit = self.settings.image_hash_max_distance
+            for key, value in self._cache.items():
+                if (key ^ image_hash).bit_count() <= limit:
+                    image_hash, predictions = key, value
+                    break
+        if predictions is not None:
+            self._cache.move_to_end(image_hash)
+        return predictions
+
+    async def analyze(self, image_base64: str) -> ImageAnalysis:
+        """Classify a base64 image; raises UploadRejectedError or ImageAnalysisUnavailableError"""
+        reason = self.unavailable_reason
+        if reason is not None:
+            raise ImageAnalysisUnavailableError(reason)
+
+        start = perf_counter()
+        data = decode_base64(image_base64, self.settings.image_max_bytes)
+        decoded = perf_counter()
+        QUERY_STAGE_LATENCY.observe(decoded - start, ("image_decode",))
+
+        loop = asyncio.get_running_loop()
+        try:
+            pixels, image_hash = await loop.run_in_executor(
+                self._get_pool(), preprocess, data, self.settings.image_input_size, self.settings.image_max_pixels
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            self._pool = None
+            raise
+        del data
+        preprocessed = perf_counter()
+        QUERY_STAGE_LATENCY.observe(preprocessed - decoded, ("image_preprocess",))
+
+        predictions = self._cached(image_hash)
+        if predictions is not None:
+            self.hits += 1
+            IMAGE_CACHE.inc(("hit",))
+            return ImageAnalysis(predictions, image_hash, cached=True)
+
+        self.misses += 1
+        IMAGE_CACHE.inc(("miss",))
+        predictions = await self.batcher.submit(pixels)
+        QUERY_STAGE_LATENCY.observe(perf_counter() - preprocessed, ("image_inference",))
+
+        self._cache[image_hash] = predictions
+        while len(self._cache) > self.settings.image_cache_size:
+            self._cache.popitem(last=False)
+        return ImageAnalysis(predictions, image_hash, cached=False)
+
+    @staticmethod
+    def describe(analysis: ImageAnalysis, query: Optional[str] = None) -> str:
+        """Farmer question with the classifier's findings, as sent to the LLM"""
+        findings = ", ".join(f"{label} ({probability:.0%})" for label, probability in analysis.predictions)
+        question = query or "What is wrong with my crop in this photo and how do I treat it?"
+        return (
+            f"{question}\n"
+            f"A photo analysis model (may be wrong) suggests: {findings}. "
+            f"If the top finding is a disease or pest, explain how to confirm it in the field and treat it."
+        )
+
+    async def check(self) -> Optional[bool]:
+        """Health check; None when image analysis is not configured"""
+        return None if self.unavailable_reason is not None else True
+
+    async def close(self):
+        await self.batcher.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "available": self.unavailable_reason is None,
+            "unavailable_reason": self.unavailable_reason,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            **self.batcher.stats()
+        }
+
+
+# Global instance
+image_analysis_service = ImageAnalysisService()
@@ -0,0 +1,58 @@
+"""
+Image preprocessing, run in worker processes.
+
+Kept free of app imports (apart from the dependency-free uploads module)
+so spawned workers start quickly: only Pillow is loaded. Arguments and results are plain bytes and ints, which pickle
+cheaply across the process boundary.
+"""
+
+import io
+from typing import Tuple
+from app.services.uploads import UploadRejectedError
+
+
+class ImageRejectedError(UploadRejectedError):
+    """The upload is not a usable image (bad encoding, unsupported format, too large)"""
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair of a tiny
+    grayscale thumbnail. Re-encoded, resized or slightly recompressed copies
+    of a photo land within a few bits of each other.
+    """
+    from PIL import Image
+
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(offset, offset + hash_size):
+            value = (value << 1) | (pixels[column] > pixels[column + 1])
+    return value
+
+
+def preprocess(data: bytes, size: int, max_pixels: int) -> Tuple[bytes, int]:
+    """Decode, downscale and centre-crop to size x size RGB; returns (pixels, dhash)"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        if width * height > max_pixels:
+            raise ImageRejectedError(f"Image is {width}x{height}, over the {max_pixels:,} pixel limit")
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale straight from the DCT data, which is
+        # far cheaper than decoding a phone photo at full size and shrinking it afterwards
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+    except UnidentifiedImageError:
+        raise ImageRejectedError("Unsupported or corrupt image; send a JPEG or PNG photo")
+    except Image.DecompressionBombError as e:
+        raise ImageRejectedError(str(e))
+    except OSError as e:
+        raise ImageRejectedError(f"Could not decode image: {e}")
+
+    image_hash = dhash(image)
+    image = ImageOps.fit(image, (size, size), Image.BILINEAR)
+    return image.tobytes(), image_hash
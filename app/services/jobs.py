@@ -0,0 +1,489 @@
+"""
+Background jobs for slow queries.
+
+/ask, /ask-image and /ask-voice accept ?mode=async: the request is stored
+as a job and answered with its ID straight away, and clients poll
+/jobs/{id} or get the result POSTed to a callback URL. This way a weak
+mobile connection never has to stay open for transcription, image
+analysis and the LLM.
+
+Jobs live in one SQLite file (WAL), so no broker is needed; every worker
+process runs a few job workers that claim jobs atomically, highest
+priority first. A claimed job is leased: if its process dies the job is
+picked up again when the lease runs out. Failed attempts are retried with
+exponential backoff; a job that fails every attempt is dead-lettered
+(status "dead"), keeping its request so it can be requeued. Requests the
+handler rejects outright (HTTP 4xx) fail at once without retries.
+"""
+
+import hmac
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Type
+from pydantic import BaseModel
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from app.config import get_settings
+from app.metrics import registry, JOBS_FINISHED, JOB_QUEUE_WAIT, JOB_RUN_TIME, WEBHOOK_DELIVERIES
+from app.services.http_client import get_http_client
+from app.services.resilience import deadline
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+DEAD = "dead"
+FINISHED = (SUCCEEDED, FAILED, DEAD)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    callback_url TEXT,
+    webhook_status TEXT,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, available_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+"""
+
+_COLUMNS = ("id, kind, priority, status, payload, result, error, attempts, max_attempts, callback_url, "
+            "webhook_status, available_at, lease_until, created_at, started_at, finished_at")
+
+# Highest priority ready job, or a running one whose worker stopped renewing its lease; one statement,
+# so two workers (or processes) never claim the same job
+_CLAIM = f"""
+UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = :lease_until,
+    started_at = COALESCE(started_at, :now)
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE (status = 'queued' AND available_at <= :now) OR (status = 'running' AND lease_until < :now)
+    ORDER BY priority DESC, available_at
+    LIMIT 1
+)
+RETURNING {_COLUMNS}
+"""
+
+# Finished jobs are swept after this many claims
+_PURGE_EVERY = 200
+
+# Suggested wait before polling a job; most answers take a few seconds
+POLL_AFTER_SECONDS = 3.0
+
+
+def check_callback_url(url: str):
+    """
+    Raise ValueError unless url is an http(s) URL on an allowed host (JOB_WEBHOOK_ALLOWED_HOSTS).
+    Webhooks are off until hosts are listed, so anonymous clients cannot make the
+    server POST to internal addresses.
+    """
+    allowed = {host.strip().lower() for host in get_settings().job_webhook_allowed_hosts.split(",") if host.strip()}
+    if not allowed:
+        raise ValueError("callback_url is not enabled on this server; poll the job's status_url instead")
+    parsed = urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an http or https URL")
+    if parsed.hostname.lower() not in allowed:
+        raise ValueError(f"callback_url host {parsed.hostname} is not allowed")
+
+
+def _datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+
+class Job:
+    """One row of the jobs table"""
+
+    __slots__ = _COLUMNS.split(", ")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def public(self) -> dict:
+        """The job as served by /jobs/{id} and sent to webhooks"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "created_at": _datetime(self.created_at),
+            "started_at": _datetime(self.started_at),
+            "finished_at": _datetime(self.finished_at),
+            "result": json.loads(self.result) if self.result else None,
+            "error": self.error,
+            "webhook_status": self.webhook_status,
+        }
+
+
+class JobStore:
+    """
+    SQLite persistence for jobs, shared by all worker processes. Calls are
+    synchronous single statements; the queue runs them in threads.
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                         timeout=self.busy_timeout_ms / 1000)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Jobs must survive a process crash, not necessarily a power cut
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connect().execute(sql, parameters)
+
+    def insert(self, kind: str, payload: str, priority: int, max_attempts: int,
+               callback_url: Optional[str]) -> str:
+        job_id = secrets.token_urlsafe(16)
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, priority, status, payload, max_attempts, callback_url, webhook_status, "
+            "available_at, created_at) VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, priority, payload, max_attempts, callback_url,
+             "pending" if callback_url else None, now, now)
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(*row) if row else None
+
+    def list(self, status: str, limit: int = 100) -> List[Job]:
+        rows = self._execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+        ).fetchall()
+        return [Job(*row) for row in rows]
+
+    def claim(self, lease_seconds: float) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(_CLAIM, {"now": now, "lease_until": now + lease_seconds}).fetchone()
+        return Job(*row) if row else None
+
+    def succeed(self, job_id: str, result: str):
+        # The request (a photo or recording) is not needed once answered
+        self._execute(
+            "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, payload = NULL, lease_until = NULL, "
+            "finished_at = ? WHERE id = ?", (result, time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str, status: str):
+        """Finish as failed (rejected) or dead (out of attempts); the request is kept for requeueing"""
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, finished_at = ? WHERE id = ?",
+            (status, error, time.time(), job_id)
+        )
+
+    def retry_later(self, job_id: str, error: str, delay_seconds: float):
+        self._execute(
+            "UPDATE jobs SET status = 'queued', error = ?, lease_until = NULL, available_at = ? WHERE id = ?",
+            (error, time.time() + delay_seconds, job_id)
+        )
+
+    def release(self, job_id: str):
+        """Hand an interrupted job back without counting the attempt (shutdown)"""
+        self._execute(
+            "UPDATE jobs SET status = 'queued', attempts = MAX(0, attempts - 1), lease_until = NULL "
+            "WHERE id = ? AND status = 'running'", (job_id,)
+        )
+
+    def requeue(self, job_id: str, max_attempts: int) -> bool:
+        """Give a dead-lettered job a fresh set of attempts"""
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, max_attempts = ?, error = NULL, finished_at = NULL, "
+            "available_at = ?, webhook_status = CASE WHEN callback_url IS NULL THEN NULL ELSE 'pending' END "
+            "WHERE id = ? AND status = 'dead'", (max_attempts, time.time(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    def set_webhook_status(self, job_id: str, status: str):
+        self._execute("UPDATE jobs SET webhook_status = ? WHERE id = ?", (status, job_id))
+
+    def purge(self, older_than_seconds: float) -> int:
+        cursor = self._execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class JobHandler:
+    """How a job kind is run: its request model and the coroutine that answers it"""
+
+    __slots__ = ("model", "answer")
+
+    def __init__(self, model: Type[BaseModel], answer: Callable[[BaseModel], Awaitable[BaseModel]]):
+        self.model = model
+        self.answer = answer
+
+
+class JobQueue:
+    """
+    Submits jobs and runs them on `workers` asyncio tasks in this process.
+    Workers are woken as soon as a job is submitted here, and otherwise poll
+    every poll_seconds for jobs submitted by other processes or due for retry.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, max_attempts: int = 3, timeout_seconds: float = 120.0,
+                 retry_base_seconds: float = 2.0, poll_seconds: float = 1.0, retention_seconds: float = 604800,
+                 webhook_attempts: int = 3, webhook_secret: str = ""):
+        self.store = store
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.timeout_seconds = timeout_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.webhook_attempts = webhook_attempts
+        self.webhook_secret = webhook_secret
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._deliveries: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._ready: Optional[Awaitable] = None
+        self._claims = 0
+        self.submitted = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def register(self, kind: str, model: Type[BaseModel], answer: Callable[[BaseModel], Awaitable[BaseModel]]):
+        """Run jobs of this kind by parsing the stored request into model and awaiting answer(request)"""
+        self._handlers[kind] = JobHandler(model, answer)
+
+    async def submit(self, kind: str, request: BaseModel, priority: int = 5,
+                     callback_url: Optional[str] = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = await asyncio.to_thread(
+            self.store.insert, kind, request.json(), priority, self.max_attempts, callback_url
+        )
+        self.submitted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def list(self, status: str, limit: int = 100) -> List[Job]:
+        return await asyncio.to_thread(self.store.list, status, limit)
+
+    async def counts(self) -> Dict[str, int]:
+        return await asyncio.to_thread(self.store.counts)
+
+    async def requeue(self, job_id: str) -> bool:
+        requeued = await asyncio.to_thread(self.store.requeue, job_id, self.max_attempts)
+        if requeued and self._wakeup is not None:
+            self._wakeup.set()
+        return requeued
+
+    def start(self, ready: Optional[Awaitable] = None):
+        """Start the workers; they wait for `ready` (e.g. the models loading) before the first claim"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._ready = ready
+        self._tasks = [asyncio.create_task(self._worker(), name=f"job_worker_{i}") for i in range(self.workers)]
+        logger.info(f"⚙️ {self.workers} job workers started ({self.store.path})")
+
+    async def stop(self):
+        """Stop the workers; jobs they were running go back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._deliveries:
+            # Give in-flight webhooks a moment; undelivered ones stay "pending" and the result can still be polled
+            await asyncio.wait(self._deliveries, timeout=5)
+        self.store.close()
+
+    async def _worker(self):
+        if self._ready is not None:
+            try:
+                await asyncio.shield(self._ready)
+            except Exception:
+                pass
+        while True:
+            # Cleared before claiming, so a submit that lands after an empty claim still wakes us
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim, self.timeout_seconds + 30)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._claims += 1
+            if self._claims % _PURGE_EVERY == 0:
+                await asyncio.to_thread(self.store.purge, self.retention_seconds)
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        handler = self._handlers.get(job.kind)
+        if job.attempts > job.max_attempts or handler is None:
+            # A lease that ran out on the last attempt (the process died), or a kind this version does not know
+            error = "Worker stopped during the last attempt" if handler else f"Unknown job kind: {job.kind}"
+            await self._finish(job, DEAD, error=error)
+            return
+
+        if job.attempts == 1:
+            JOB_QUEUE_WAIT.observe(job.started_at - job.created_at, (job.kind,))
+        start = time.perf_counter()
+        try:
+            request = handler.model.parse_raw(job.payload)
+            with deadline(self.timeout_seconds):
+                response = await asyncio.wait_for(handler.answer(request), self.timeout_seconds)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.release, job.id))
+            raise
+        except HTTPException as e:
+            if e.status_code < 500:
+                # The request itself was refused (bad upload, no speech); another attempt would be refused too
+                await self._finish(job, FAILED, error=str(e.detail))
+            else:
+                await self._retry_or_dead(job, str(e.detail))
+            return
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed: {e}")
+            await self._retry_or_dead(job, "Failed to process your query. Please try again.")
+            return
+        finally:
+            JOB_RUN_TIME.observe(time.perf_counter() - start, (job.kind,))
+
+        result = json.dumps(jsonable_encoder(response), ensure_ascii=False)
+        await self._finish(job, SUCCEEDED, result=result)
+
+    async def _retry_or_dead(self, job: Job, error: str):
+        if job.attempts >= job.max_attempts:
+            logger.warning(f"Job {job.id} ({job.kind}) dead-lettered after {job.attempts} attempts")
+            await self._finish(job, DEAD, error=error)
+            return
+        # Exponential backoff with jitter, so jobs failing together do not retry together
+        delay = self.retry_base_seconds * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+        await asyncio.to_thread(self.store.retry_later, job.id, error, delay)
+        JOBS_FINISHED.inc((job.kind, "retried"))
+
+    async def _finish(self, job: Job, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        if status == SUCCEEDED:
+            await asyncio.to_thread(self.store.succeed, job.id, result)
+        else:
+            await asyncio.to_thread(self.store.fail, job.id, error, status)
+        JOBS_FINISHED.inc((job.kind, status))
+        if job.callback_url:
+            finished = await asyncio.to_thread(self.store.get, job.id)
+            if finished is not None:
+                delivery = asyncio.create_task(self._deliver(finished))
+                self._deliveries.add(delivery)
+                delivery.add_done_callback(self._deliveries.discard)
+
+    def signature(self, body: bytes) -> str:
+        return "sha256=" + hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+
+    async def _deliver(self, job: Job):
+        """POST the finished job to its callback URL, retrying with backoff"""
+        body = json.dumps(jsonable_encoder(job.public()), ensure_ascii=False).encode()
+        headers = {"Content-Type": "application/json", "X-Job-Id": job.id}
+        if self.webhook_secret:
+            headers["X-Webhook-Signature"] = self.signature(body)
+        for attempt in range(1, self.webhook_attempts + 1):
+            try:
+                response = await get_http_client().post(job.callback_url, content=body, headers=headers)
+                if response.status_code < 300:
+                    await asyncio.to_thread(self.store.set_webhook_status, job.id, "delivered")
+                    WEBHOOK_DELIVERIES.inc(("delivered",))
+                    return
+                error = f"HTTP {response.status_code}"
+            except Exception as e:
+                error = repr(e)
+            if attempt < self.webhook_attempts:
+                await asyncio.sleep(self.retry_base_seconds * 2 ** (attempt - 1))
+        logger.warning(f"Webhook for job {job.id} not delivered after {self.webhook_attempts} attempts: {error}")
+        await asyncio.to_thread(self.store.set_webhook_status, job.id, "failed")
+        WEBHOOK_DELIVERIES.inc(("failed",))
+
+    async def check(self) -> Optional[bool]:
+        """Health check: the jobs database answers and this process has workers"""
+        if not self.running:
+            return None
+        await asyncio.to_thread(self.store.counts)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "path": self.store.path,
+            "workers": len(self._tasks),
+            "submitted": self.submitted,
+            "jobs": self.store.counts() if self.running else {},
+            "webhooks_in_flight": len(self._deliveries),
+        }
+
+
+def _build_job_queue() -> JobQueue:
+    settings = get_settings()
+    return JobQueue(
+        JobStore(settings.job_queue_path),
+        workers=settings.job_workers,
+        max_attempts=settings.job_max_attempts,
+        timeout_seconds=settings.job_timeout_seconds,
+        retry_base_seconds=settings.job_retry_base_seconds,
+        poll_seconds=settings.job_poll_seconds,
+        retention_seconds=settings.job_retention_seconds,
+        webhook_attempts=settings.job_webhook_attempts,
+        webhook_secret=settings.job_webhook_secret,
+    )
+
+
+# Global instance; the farmer query router registers the job kinds
+job_queue = _build_job_queue()
+
+registry.register_callback(
+    "jobs", "Jobs in the queue database by status", "gauge",
+    lambda: {(("status", status),): count for status, count in job_queue.store.counts().items()}
+    if job_queue.running else {}
+)
@@ -0,0 +1,378 @@
+"""
+Local agronomy knowledge base.
+
+Bundled package-of-practices guides and pest advisories are split into
+passages at section headings and indexed with SQLite FTS5, whose bm25()
+ranking makes top-k retrieval an inverted-index lookup of well under a
+millisecond. Retrieved passages go into the LLM prompt and their
+documents are cited in the answer's sources. Curated FAQ answers are
+served directly, without an LLM call, when a question matches one
+closely. The index is rebuilt whenever the documents change.
+
+Documents (*.md): "# Title", a "Source: ..." line, then "## Section" blocks
+FAQ CSV:          Question,Answer,Source
+
+CLI:
+    python -m app.services.knowledge_base build
+    python -m app.services.knowledge_base search "aphids on mustard"
+"""
+
+import os
+import re
+import csv
+import glob
+import hashlib
+import sqlite3
+import logging
+import threading
+from time import perf_counter
+from typing import Iterator, List, Optional, Tuple
+from app.config import get_settings
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE passages USING fts5(title, section, text, source UNINDEXED, tokenize = 'porter unicode61');
+CREATE VIRTUAL TABLE faqs USING fts5(question, answer UNINDEXED, source UNINDEXED, tokenize = 'porter unicode61');
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# Title and section headings count for more than body text
+_PASSAGE_QUERY = """
+SELECT title, section, text, source FROM passages WHERE passages MATCH ?
+ORDER BY bm25(passages, 3.0, 2.0, 1.0) LIMIT ?
+"""
+_FAQ_QUERY = "SELECT question, answer, source FROM faqs WHERE faqs MATCH ? ORDER BY bm25(faqs) LIMIT 3"
+
+# Candidates fetched per requested passage before the coverage filter
+_CANDIDATES_PER_PASSAGE = 3
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_SUFFIXES = ("ing", "es", "ed", "s")
+_STOPWORDS = frozenset("""
+a an the and or but if of to in on at by for with from into about as is are was were be been being am do does did
+can could should would will shall may might must i me my we our you your he she it its they them their this that
+these those what which who whom whose when where why how there here than then so too very not no yes any some all
+much many more most such only own same just also get got give tell please kindly sir ji best good use using per
+""".split())
+
+
+def terms(text: str) -> List[str]:
+    """Content words of a question or passage, with plural and verb endings trimmed"""
+    result = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS or len(word) < 2:
+            continue
+        for suffix in _SUFFIXES:
+            if len(word) > len(suffix) + 3 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        result.append(word)
+    return result
+
+
+def _match_expression(query_terms: List[str]) -> str:
+    # Quoted terms cannot be read as FTS5 operators; the index tokenizer still stems them
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(query_terms))
+
+
+class Passage:
+    """A retrieved section of an agronomy document"""
+
+    __slots__ = ("title", "section", "text", "source")
+
+    def __init__(self, title: str, section: str, text: str, source: str):
+        self.title = title
+        self.section = section
+        self.text = text
+        self.source = source
+
+
+class FaqAnswer:
+    """A curated answer whose question matched the farmer's"""
+
+    __slots__ = ("question", "answer", "source", "match")
+
+    def __init__(self, question: str, answer: str, source: str, match: float):
+        self.question = question
+        self.answer = answer
+        self.source = source
+        self.match = match
+
+
+class Retrieval:
+    """Passages for the prompt, and a FAQ answer when one matches closely enough to skip the LLM"""
+
+    __slots__ = ("passages", "faq")
+
+    def __init__(self, passages: Optional[List[Passage]] = None, faq: Optional[FaqAnswer] = None):
+        self.passages = passages or []
+        self.faq = faq
+
+    @property
+    def sources(self) -> List[str]:
+        return list(dict.fromkeys(passage.source for passage in self.passages))
+
+
+def read_document(path: str, chunk_words: int) -> Iterator[Tuple[str, str, str, str]]:
+    """(title, section, text, source) passages of one document, long sections split at sentences"""
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    title = os.path.splitext(os.path.basename(path))[0].replace("_", " ").title()
+    source, section, body = title, "", []
+
+    def passages():
+        sentences = _SENTENCE_END.split(" ".join(body).strip())
+        chunk, words = [], 0
+        for sentence in sentences:
+            if chunk and words + len(sentence.split()) > chunk_words:
+                yield title, section, " ".join(chunk), source
+                # Overlap by one sentence so an instruction split across chunks stays findable
+                chunk, words = chunk[-1:], len(chunk[-1].split())
+            chunk.append(sentence)
+            words += len(sentence.split())
+        if chunk and chunk != [""]:
+            yield title, section, " ".join(chunk), source
+
+    for line in lines:
+        if line.startswith("# "):
+            title = line[2:].strip()
+            source = title
+        elif line.startswith("Source:"):
+            source = line.split(":", 1)[1].strip()
+        elif line.startswith("## "):
+            yield from passages()
+            section, body = line[3:].strip(), []
+        elif line.strip():
+            body.append(line.strip())
+    yield from passages()
+
+
+class KnowledgeBase:
+    """
+    FTS5 index over the bundled agronomy documents and FAQ. load() opens the
+    index, building it first if it is missing or older than the documents;
+    search() is synchronous and takes a fraction of a millisecond.
+    """
+
+    def __init__(self, docs_dir: str, index_path: str, top_k: int = 3, min_coverage: float = 0.55,
+                 faq_threshold: float = 0.75, chunk_words: int = 120):
+        self.docs_dir = docs_dir
+        self.index_path = index_path
+        self.top_k = top_k
+        self.min_coverage = min_coverage
+        self.faq_threshold = faq_threshold
+        self.chunk_words = chunk_words
+        self._connection: Optional[sqlite3.Connection] = None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.searches = 0
+        self.faq_answers = 0
+        self.passage_hits = 0
+
+    def _documents(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.docs_dir, "*.md")))
+
+    def _faq_path(self) -> str:
+        return os.path.join(self.docs_dir, "faq.csv")
+
+    def _fingerprint(self) -> str:
+        """Changes whenever a document or the FAQ is added, removed or edited"""
+        digest = hashlib.blake2b(str(self.chunk_words).encode(), digest_size=16)
+        for path in self._documents() + [self._faq_path()]:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    def build(self) -> dict:
+        """Chunk the documents, index them and the FAQ, and swap the new index in atomically"""
+        start = perf_counter()
+        temporary = f"{self.index_path}.{os.getpid()}.tmp"
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        connection = sqlite3.connect(temporary)
+        try:
+            connection.executescript(_SCHEMA)
+            documents = self._documents()
+            for path in documents:
+                connection.executemany(
+                    "INSERT INTO passages (title, section, text, source) VALUES (?, ?, ?, ?)",
+                    read_document(path, self.chunk_words)
+                )
+            if os.path.exists(self._faq_path()):
+                with open(self._faq_path(), encoding="utf-8", newline="") as f:
+                    connection.executemany(
+                        "INSERT INTO faqs (question, answer, source) VALUES (?, ?, ?)",
+                        ((row["Question"], row["Answer"], row["Source"]) for row in csv.DictReader(f))
+                    )
+            connection.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (self._fingerprint(),))
+            # Compact the full-text index into one segment for the fastest lookups
+            connection.execute("INSERT INTO passages (passages) VALUES ('optimize')")
+            connection.execute("INSERT INTO faqs (faqs) VALUES ('optimize')")
+            connection.commit()
+            passages = connection.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+            faqs = connection.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
+        finally:
+            connection.close()
+        os.replace(temporary, self.index_path)
+        report = {"documents": len(documents), "passages": passages, "faqs": faqs,
+                  "seconds": round(perf_counter() - start, 3)}
+        logger.info(f"📚 Knowledge index built: {report}")
+        return report
+
+    def load(self) -> bool:
+        """Open the index, rebuilding it if the documents changed (blocking). False if there are no documents."""
+        with self._load_lock:
+            if self._loaded:
+                return self._connection is not None
+            if not self._documents() and not os.path.exists(self._faq_path()):
+                logger.warning(f"No agronomy documents in {self.docs_dir}; answers will not cite local sources")
+                self._loaded = True
+                return False
+            if self._stored_fingerprint() != self._fingerprint():
+                self.build()
+            connection = sqlite3.connect(self.index_path, check_same_thread=False)
+            with self._lock:
+                self._connection = connection
+            self._loaded = True
+            return True
+
+    def _stored_fingerprint(self) -> Optional[str]:
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            connection = sqlite3.connect(self.index_path)
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    @property
+    def ready(self) -> bool:
+        return self._connection is not None
+
+    def search(self, query: str, top_k: Optional[int] = None, allow_faq: bool = True) -> Retrieval:
+        """Top passages covering enough of the question's terms, and a closely matching FAQ answer if any"""
+        if not self._loaded:
+            self.load()
+        query_terms = terms(query)
+        if self._connection is None or not query_terms:
+            return Retrieval()
+        top_k = self.top_k if top_k is None else top_k
+        expression = _match_expression(query_terms)
+        wanted = set(query_terms)
+        with self._lock:
+            faq_rows = self._connection.execute(_FAQ_QUERY, (expression,)).fetchall() if allow_faq else []
+            passage_rows = self._connection.execute(
+                _PASSAGE_QUERY, (expression, top_k * _CANDIDATES_PER_PASSAGE)
+            ).fetchall()
+        self.searches += 1
+
+        faq = None
+        for question, answer, source in faq_rows:
+            question_terms = set(terms(question))
+            match = len(wanted & question_terms) / len(wanted | question_terms)
+            if match >= self.faq_threshold and (faq is None or match > faq.match):
+                faq = FaqAnswer(question, answer, source, match)
+        if faq is not None:
+            self.faq_answers += 1
+            return Retrieval(faq=faq)
+
+        passages = []
+        for title, section, text, source in passage_rows:
+            covered = wanted & set(terms(f"{title} {section} {text}"))
+            if len(covered) / len(wanted) >= self.min_coverage:
+                passages.append(Passage(title, section, text, source))
+                if len(passages) == top_k:
+                    break
+        if passages:
+            self.passage_hits += 1
+        return Retrieval(passages)
+
+    async def check(self) -> Optional[bool]:
+        """Health check: None when there are no documents to index"""
+        if not self._loaded:
+            return None
+        return self.ready
+
+    def stats(self) -> dict:
+        counts = {"passages": None, "faqs": None}
+        if self._connection is not None:
+            with self._lock:
+                counts["passages"] = self._connection.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+                counts["faqs"] = self._connection.execute("SELECT COUNT(*) FROM faqs").fetchone()[0]
+        return {
+            "ready": self.ready,
+            "documents": len(self._documents()),
+            **counts,
+            "searches": self.searches,
+            "faq_answers": self.faq_answers,
+            "passage_hits": self.passage_hits,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._loaded = False
+
+
+def _build_knowledge_base() -> KnowledgeBase:
+    settings = get_settings()
+    return KnowledgeBase(
+        settings.knowledge_docs_dir,
+        settings.knowledge_index_path,
+        top_k=settings.knowledge_top_k,
+        min_coverage=settings.knowledge_min_coverage,
+        faq_threshold=settings.knowledge_faq_threshold,
+        chunk_words=settings.knowledge_chunk_words,
+    )
+
+
+# Global instance
+knowledge_base = _build_knowledge_base()
+
+registry.register_callback(
+    "knowledge_lookups_total", "Knowledge base searches by result", "counter",
+    lambda: {
+        (("result", "faq_answer"),): knowledge_base.faq_answers,
+        (("result", "passages"),): knowledge_base.passage_hits,
+        (("result", "none"),): knowledge_base.searches - knowledge_base.faq_answers - knowledge_base.passage_hits,
+    }
+)
+
+
+def _main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local agronomy knowledge base")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="Chunk the documents and write the index (KNOWLEDGE_INDEX_PATH)")
+    search = commands.add_parser("search", help="Show what a question retrieves")
+    search.add_argument("question")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(knowledge_base.build())
+        return
+    start = perf_counter()
+    retrieval = knowledge_base.search(args.question)
+    elapsed = (perf_counter() - start) * 1000
+    if retrieval.faq is not None:
+        print(f"FAQ answer (match {retrieval.faq.match:.2f}): {retrieval.faq.question}\n{retrieval.faq.answer}")
+    for passage in retrieval.passages:
+        print(f"- {passage.title} / {passage.section} [{passage.source}]\n  {passage.text[:200]}...")
+    print(f"({elapsed:.2f} ms including index load)")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,461 @@
+import re
+import math
+import random
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+from time import perf_counter
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from app.models.schemas import QueryCategory
+from app.services.categorizer import query_categorizer
+from app.services.resilience import (
+    CircuitBreaker, DeadlineExceededError, LatencyTracker, Upstream, build_upstream
+)
+from app.metrics import UPSTREAM_CALLS, UPSTREAM_HEDGES
+
+logger = logging.getLogger(__name__)
+
+# Chat messages are passed around as (role, content) pairs; role is "system", "human" or "ai"
+Message = Tuple[str, str]
+
+
+@lru_cache(maxsize=None)
+def _message_classes():
+    """LangChain message types, imported on first use because langchain is slow to import"""
+    from langchain.schema import AIMessage, HumanMessage, SystemMessage
+    return {"system": SystemMessage, "human": HumanMessage, "ai": AIMessage}
+
+
+class LLMUnavailableError(Exception):
+    """Raised when every backend in the chain failed, timed out or was rejected by its breaker"""
+
+
+class LLMBackend:
+    """
+    One model endpoint. Its Upstream provides the adaptive timeout, the
+    request deadline, the circuit breaker and the latency window.
+    Subclasses implement _complete() and optionally _stream().
+    """
+
+    source = "LLM"
+    # Upper bound on the confidence score of answers from this backend
+    max_confidence = 1.0
+    # Whether the backend answers in (and translates to) the farmer's language; otherwise answers are English
+    multilingual = True
+
+    def __init__(self, name: str, timeout: float, upstream: Optional[Upstream] = None,
+                 cacheable: bool = True, hedgeable: bool = True):
+        self.name = name
+        # The chain fails over to the next backend, so a backend does not retry itself. Any
+        # error (quota, 5xx, auth) counts against the backend's breaker, as in stream()
+        self.upstream = upstream or Upstream(f"llm:{name}", timeout, max_attempts=1, retry_on=(Exception,))
+        self.breaker = self.upstream.breaker
+        self.latency = self.upstream.latency
+        # Whether answers from this backend may be stored in the answer cache
+        self.cacheable = cacheable
+        # Whether the chain may fire this backend as a hedge for a slow one
+        self.hedgeable = hedgeable
+
+    @property
+    def timeout(self) -> float:
+        return self.upstream.max_timeout
+
+    @property
+    def configured(self) -> bool:
+        """False when the backend can never succeed (e.g. missing API key)"""
+        return True
+
+    def warm_up(self):
+        """Blocking one-time setup (imports, client construction); call from a thread"""
+
+    async def _complete(self, messages: List[Message]) -> str:
+        raise NotImplementedError
+
+    async def _stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        yield await self._complete(messages)
+
+    async def complete(self, messages: List[Message]) -> str:
+        """Full completion within the adaptive timeout and the request deadline"""
+        return await self.upstream.call(lambda: self._complete(messages))
+
+    async def stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        """Streamed completion; each chunk must arrive within the adaptive timeout and the request deadline"""
+        self.upstream.acquire()
+        start = perf_counter()
+        chunks = self._stream(messages).__aiter__()
+        outcome = None
+        capped = False
+        try:
+            while True:
+                timeout, capped = self.upstream.attempt_timeout()
+                if timeout <= 0:
+                    raise DeadlineExceededError(f"No time left in the request budget for {self.name}")
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            outcome = "success"
+        except (TimeoutError, asyncio.TimeoutError):
+            # Running out of request budget is not the backend's fault
+            outcome = "deadline" if capped else "timeout"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            if outcome == "success":
+                self.upstream.record_success(perf_counter() - start)
+            elif outcome is None or outcome == "deadline":
+                self.upstream.release(outcome or "cancelled")
+            else:
+                self.upstream.record_failure(outcome)
+            await chunks.aclose()
+
+
+class LangChainBackend(LLMBackend):
+    """Wraps any LangChain chat model exposing ainvoke() and astream()"""
+
+    source = "Gemini AI"
+
+    def __init__(self, name: str, timeout: float, model=None, factory: Optional[Callable[[], object]] = None,
+                 **kwargs):
+        super().__init__(name, timeout, **kwargs)
+        self._model = model
+        self._factory = factory
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Import LangChain and build the client"""
+        _message_classes()
+        with self._lock:
+            if self._model is None:
+                self._model = self._factory()
+                logger.info(f"✅ LLM backend {self.name} initialized")
+        return self._model
+
+    async def _ensure_model(self):
+        # Built off the event loop on first use
+        if self._model is None:
+            await asyncio.to_thread(self.warm_up)
+        return self._model
+
+    @staticmethod
+    def _to_langchain(messages: List[Message]) -> list:
+        classes = _message_classes()
+        return [classes[role](content=content) for role, content in messages]
+
+    async def _complete(self, messages: List[Message]) -> str:
+        model = await self._ensure_model()
+        response = await model.ainvoke(self._to_langchain(messages))
+        return response.content
+
+    async def _stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        model = await self._ensure_model()
+        async for chunk in model.astream(self._to_langchain(messages)):
+            if chunk.content:
+                yield chunk.content
+
+
+class GeminiBackend(LangChainBackend):
+    """Gemini chat model through langchain-google-genai"""
+
+    def __init__(self, model_name: str, api_key: str, timeout: float, **kwargs):
+        super().__init__(f"gemini:{model_name}", timeout, factory=self._build, **kwargs)
+        self.model_name = model_name
+        self.api_key = api_key
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key) and self.api_key != "your_gemini_api_key_here"
+
+    def _build(self):
+        if not self.configured:
+            raise ValueError("Gemini API key not configured. Please set GEMINI_API_KEY in .env file")
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=self.model_name,
+            google_api_key=self.api_key,
+            temperature=0.7,
+            max_tokens=1000
+        )
+
+
+_FARMER_CONTEXT = re.compile(r"Farmer Context: Location: (?P<location>[^\n]*?), Crop: (?P<crop>[^\n]*)")
+# First advisory passage the knowledge base put in the system prompt
+_REFERENCE = re.compile(r"^\[1\] (?P<heading>[^\n]*? - [^:\n]*): (?P<text>[^\n]*)", re.MULTILINE)
+
+_STUB_ADVICE = {
+    QueryCategory.CROP_MANAGEMENT: [
+        "Use certified seed of a variety recommended for your district and sow at the recommended spacing.",
+        "Keep the field weed-free during the first 30-45 days, when the crop is most sensitive to competition.",
+        "Harvest at physiological maturity and dry the produce well before storage to avoid losses.",
+    ],
+    QueryCategory.PEST_DISEASE: [
+        "Scout the field twice a week and check the underside of leaves for insects, eggs and spots.",
+        "Remove and destroy badly affected plants, and try neem oil at 5 ml/liter as a first organic spray.",
+        "Use chemical pesticides only at the recommended dose, wear gloves and a mask, and observe the waiting period before harvest.",
+    ],
+    QueryCategory.WEATHER: [
+        "Check the local forecast before irrigating, spraying or applying fertilizer, and postpone them if rain is expected within 24 hours.",
+        "Keep drainage channels open before heavy rain to avoid waterlogging.",
+        "During heat waves irrigate in the evening and use mulch to conserve soil moisture.",
+    ],
+    QueryCategory.MARKET_PRICE: [
+        "Compare prices at two or three nearby mandis and on the eNAM portal before selling.",
+        "Clean, grade and dry your produce; graded produce fetches a better price.",
+        "If prices are low at harvest and storage is available, consider warehouse storage with a pledge loan.",
+    ],
+    QueryCategory.SOIL_HEALTH: [
+        "Get your soil tested every 2-3 years through the Soil Health Card scheme.",
+        "Add farmyard manure or compost at 2-4 tonnes/acre to improve soil organic matter.",
+        "Follow crop rotation with legumes to restore soil fertility.",
+    ],
+    QueryCategory.IRRIGATION: [
+        "Irrigate at critical growth stages such as flowering and grain filling rather than on a fixed schedule.",
+        "Drip or sprinkler irrigation can save 30-50% water compared to flood irrigation.",
+        "Irrigate in the early morning or evening to reduce evaporation losses.",
+    ],
+    QueryCategory.FERTILIZER: [
+        "Apply fertilizer based on your soil test report to avoid overuse.",
+        "Split nitrogen into two or three doses instead of a single application.",
+        "Combine chemical fertilizers with compost or vermicompost for better nutrient uptake.",
+    ],
+    QueryCategory.GENERAL: [
+        "Follow the package of practices recommended by your state agricultural university.",
+        "Keep records of inputs, costs and yields for each season to plan better.",
+        "Check eligibility for schemes such as PM-KISAN and PMFBY crop insurance.",
+    ],
+}
+
+
+class StubBackend(LLMBackend):
+    """
+    Local rule-based responder that needs no network or API key.
+    Answers are deterministic for a given question and farmer context, which
+    makes it the last-resort fallback and a stand-in LLM for offline load tests.
+    """
+
+    source = "Offline Advisory Rules"
+    max_confidence = 0.5
+    multilingual = False
+
+    def __init__(self, name: str = "stub", timeout: float = 5.0, latency_ms: float = 0.0,
+                 latency_p99_ms: float = 0.0, **kwargs):
+        kwargs.setdefault("cacheable", False)
+        kwargs.setdefault("hedgeable", False)
+        super().__init__(name, timeout, **kwargs)
+        self.latency_seconds = latency_ms / 1000
+        # With a p99 above the median, latency is lognormal: most answers near latency_ms, a long slow tail
+        self.latency_sigma = math.log(latency_p99_ms / latency_ms) / 2.326 if latency_p99_ms > latency_ms > 0 else 0.0
+
+    def sample_latency(self) -> float:
+        """Seconds the next answer takes"""
+        if self.latency_sigma:
+            return random.lognormvariate(math.log(self.latency_seconds), self.latency_sigma)
+        return self.latency_seconds
+
+    def respond(self, messages: List[Message]) -> str:
+        """Build the templated answer for the last farmer question"""
+        system = next((content for role, content in messages if role == "system"), "")
+        question = next((content for role, content in reversed(messages) if role == "human"), "")
+        question = question.replace("Farmer's question:", "", 1).strip()
+
+        category = query_categorizer.categorize(question)
+        context = _FARMER_CONTEXT.search(system)
+        crop = location = None
+        if context:
+            crop = context.group("crop").strip()
+            location = context.group("location").strip()
+        subject = " for your " + crop + " crop" if crop and crop != "Not specified" else ""
+        place = " in " + location if location and location != "Not specified" else ""
+
+        lines = [f"Our AI advisor is unavailable, so here is general guidance{subject}{place}:"]
+        reference = _REFERENCE.search(system)
+        if reference:
+            lines.append(f"From {reference.group('heading')}: {reference.group('text')}")
+        lines.extend(f"{number}. {tip}" for number, tip in enumerate(_STUB_ADVICE[category], start=1))
+        lines.append("For advice specific to your field, consult your local Krishi Vigyan Kendra "
+                     "or agricultural extension officer.")
+        return "\n".join(lines)
+
+    async def _complete(self, messages: List[Message]) -> str:
+        latency = self.sample_latency()
+        if latency:
+            await asyncio.sleep(latency)
+        return self.respond(messages)
+
+    async def _stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        latency = self.sample_latency()
+        if latency:
+            await asyncio.sleep(latency)
+        for line in self.respond(messages).splitlines(keepends=True):
+            yield line
+
+
+class LLMChain:
+    """
+    Ordered fallback chain of LLM backends.
+
+    A backend is skipped while its circuit is open. When a backend fails or
+    times out the next one is tried. When hedging is enabled and a backend
+    has not answered by its own p95 latency, the next hedgeable backend is
+    fired as well and the first successful answer wins.
+    """
+
+    def __init__(self, backends: List[LLMBackend], hedge: bool = True, hedge_percentile: float = 0.95):
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        for backend in backends:
+            if not backend.configured:
+                logger.warning(f"LLM backend {backend.name} is not configured and will be skipped")
+
+    @property
+    def primary(self) -> Optional[LLMBackend]:
+        return self.backends[0] if self.backends else None
+
+    def warm_up(self):
+        """Build every configured backend's client (blocking, call from a thread)"""
+        for backend in self.backends:
+            if backend.configured:
+                backend.warm_up()
+
+    def _next_backend(self, tried: set, hedge: bool = False) -> Optional[LLMBackend]:
+        """First untried backend whose circuit lets calls through, marking it tried"""
+        for index, backend in enumerate(self.backends):
+            if index in tried or not backend.configured or (hedge and not backend.hedgeable):
+                continue
+            tried.add(index)
+            if backend.upstream.available:
+                return backend
+            UPSTREAM_CALLS.inc((backend.upstream.name, "rejected"))
+        return None
+
+    def _hedge_delay(self, backend: LLMBackend, tried: set) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if not any(
+            other.hedgeable and other.configured
+            for index, other in enumerate(self.backends) if index not in tried
+        ):
+            return None
+        return backend.latency.percentile(self.hedge_percentile)
+
+    async def complete(self, messages: List[Message]) -> Tuple[str, LLMBackend]:
+        """Answer from the first backend that succeeds, returned with that backend"""
+        pending = {}
+        errors = []
+        tried = set()
+        hedge_at: Optional[float] = None
+
+        def launch(hedge: bool = False) -> bool:
+            nonlocal hedge_at
+            # Hedges only fire real models, never the last-resort fallback
+            backend = self._next_backend(tried, hedge)
+            if backend is None:
+                hedge_at = None
+                return False
+            if hedge:
+                UPSTREAM_HEDGES.inc((backend.upstream.name,))
+            pending[asyncio.create_task(backend.complete(messages))] = backend
+            delay = self._hedge_delay(backend, tried)
+            hedge_at = perf_counter() + delay if delay is not None else None
+            return True
+
+        try:
+            launch()
+            while pending:
+                timeout = max(0.0, hedge_at - perf_counter()) if hedge_at is not None else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedge=True)
+                    continue
+                winner = None
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.cancelled():
+                        continue
+                    # Read every finished task's exception, so a backend that failed alongside
+                    # the winner is not logged as "Task exception was never retrieved"
+                    error = task.exception()
+                    if error is None:
+                        winner = winner or (task.result(), backend)
+                        continue
+                    errors.append(f"{backend.name}: {error!r}")
+                    logger.warning(f"LLM backend {backend.name} failed: {error!r}")
+                if winner is not None:
+                    return winner
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Losing hedges must not keep running past the request
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        raise LLMUnavailableError("; ".join(errors) or "No LLM backend available")
+
+    async def stream(self, messages: List[Message]) -> AsyncIterator[Tuple[str, LLMBackend]]:
+        """
+        Stream from the first backend that produces output, yielding (chunk, backend).
+        A backend failing before its first chunk falls through to the next one;
+        once text has been sent the failure is raised. Streams are not hedged.
+        """
+        errors = []
+        tried = set()
+        while True:
+            backend = self._next_backend(tried)
+            if backend is None:
+                raise LLMUnavailableError("; ".join(errors) or "No LLM backend available")
+            streamed = False
+            try:
+                async for chunk in backend.stream(messages):
+                    streamed = True
+                    yield chunk, backend
+                return
+            except Exception as e:
+                if streamed:
+                    raise
+                errors.append(f"{backend.name}: {e!r}")
+                logger.warning(f"LLM backend {backend.name} failed before streaming: {e!r}")
+
+    def stats(self) -> List[dict]:
+        return [
+            {**backend.upstream.stats(), "name": backend.name, "configured": backend.configured}
+            for backend in self.backends
+        ]
+
+
+def build_chain(settings) -> LLMChain:
+    """
+    Build the chain from LLM_BACKENDS, a comma-separated list of
+    "gemini:<model>[@timeout]" and "stub[@timeout]" entries.
+    """
+    backends: List[LLMBackend] = []
+    specs = [spec.strip() for spec in settings.llm_backends.split(",") if spec.strip()]
+    for spec in specs:
+        kind, _, timeout = spec.partition("@")
+        timeout = float(timeout) if timeout else settings.llm_timeout_seconds
+        # Failover and hedging happen in the chain, so the backend itself neither retries nor hedges;
+        # every backend error is an upstream failure, there is no "bad request" from the chain's point of view
+        upstream = build_upstream(
+            f"llm:{kind}", timeout, min_timeout=settings.llm_min_timeout_seconds, max_attempts=1, hedge=False,
+            retry_on=(Exception,),
+            breaker=CircuitBreaker(f"llm:{kind}", settings.llm_breaker_failures, settings.llm_breaker_reset_seconds),
+            latency=LatencyTracker(min_samples=settings.llm_hedge_min_samples)
+        )
+        if kind == "stub":
+            # On its own the stub stands in for the LLM (offline load tests), so its answers may be cached
+            backends.append(StubBackend(
+                timeout=timeout, latency_ms=settings.llm_stub_latency_ms,
+                latency_p99_ms=settings.llm_stub_latency_p99_ms, upstream=upstream,
+                cacheable=len(specs) == 1
+            ))
+        elif kind.startswith("gemini:"):
+            backends.append(GeminiBackend(kind.split(":", 1)[1], settings.gemini_api_key, timeout, upstream=upstream))
+        else:
+            raise ValueError(f"Unknown LLM backend '{spec}' in LLM_BACKENDS")
+    return LLMChain(backends, hedge=settings.llm_hedge_enabled, hedge_percentile=settings.llm_hedge_percentile)
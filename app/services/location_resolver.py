@@ -0,0 +1,399 @@
+"""
+Location resolution.
+
+Farmers type locations as free text ("Niphad, Nashik", "nasik", "near
+Lasalgaon mandi", or GPS "20.15,74.23"). The resolver maps them to a
+canonical gazetteer place (village, taluka, district or state) with
+coordinates, so weather, market prices and prompts all agree on where the
+farmer is. Exact and transliteration-insensitive names are dictionary
+lookups; misspellings fall back to trigram candidates scored with difflib.
+Results are cached per input string.
+
+Gazetteer CSV:        Name,Kind,Taluka,District,State,Latitude,Longitude,Aliases (aliases "|"-separated)
+Weather stations CSV: Station,State,Latitude,Longitude
+"""
+
+import re
+import csv
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, List, Optional, Set, Tuple
+from app.config import get_settings
+from app.services.market_store import normalize_name
+from app.services.spatial_index import KDTree
+
+logger = logging.getLogger(__name__)
+
+# Lower ranks win when a bare name matches several places ("Nashik" the district over the taluka)
+_KIND_RANK = {"state": 0, "district": 1, "city": 2, "taluka": 2, "village": 3, "station": 4}
+_NOISE_WORDS = frozenset({
+    "near", "at", "post", "po", "village", "vill", "taluka", "tal", "tq", "tehsil", "block", "mandal",
+    "district", "dist", "dt", "state", "city", "town", "market", "mandi", "apmc", "india",
+})
+_SEPARATORS = re.compile(r"[,;/|]+")
+_COORDINATES = re.compile(r"^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,\s]\s*(-?\d{1,3}(?:\.\d+)?)\s*$")
+_ASPIRATED = re.compile(r"([bcdgjklmnprstv])h")
+_REPEATED = re.compile(r"(.)\1+")
+_MAX_SPAN_WORDS = 6
+_FUZZY_CANDIDATES = 20
+_MISSING = object()
+
+
+def phonetic_key(name: str) -> str:
+    """Collapse common transliteration variants: Nasik/Nashik, Nagpoor/Nagpur, Kolapur/Kolhapur"""
+    key = name.replace("ph", "f").replace("w", "v").replace("z", "j").replace("q", "k")
+    key = _ASPIRATED.sub(r"\1", key)
+    key = key.replace("ee", "i").replace("oo", "u")
+    return _REPEATED.sub(r"\1", key).replace(" ", "")
+
+
+@lru_cache(maxsize=65536)
+def _context_keys(taluka: str, district: str, state: str) -> frozenset:
+    """Keys a qualifier like "Nashik" or "Maharashtra" can match when disambiguating"""
+    return frozenset(
+        key for part in (taluka, district, state) if part
+        for key in (normalize_name(part), phonetic_key(normalize_name(part)))
+    )
+
+
+def _trigrams(name: str) -> Set[str]:
+    padded = f" {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _open_csv(path: str):
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+class Place:
+    """A gazetteer entry (or weather station) with coordinates"""
+
+    __slots__ = ("name", "kind", "taluka", "district", "state", "latitude", "longitude", "context")
+
+    def __init__(self, name: str, kind: str, taluka: str, district: str, state: str,
+                 latitude: float, longitude: float):
+        self.name = name
+        self.kind = kind
+        self.taluka = taluka
+        self.district = district
+        self.state = state
+        self.latitude = latitude
+        self.longitude = longitude
+        self.context = _context_keys(taluka, district, state)
+
+    @property
+    def label(self) -> str:
+        """Human-readable name with its taluka, district and state, used in prompts"""
+        if self.kind == "state":
+            return self.name
+        parts = [self.name if self.kind != "taluka" else f"{self.name} taluka"]
+        if self.kind == "district":
+            parts[0] = f"{self.name} district"
+        else:
+            if self.taluka and self.kind not in ("taluka", "station") and self.taluka != self.name:
+                parts.append(f"{self.taluka} taluka")
+            if self.district:
+                parts.append(f"{self.district} district")
+        parts.append(self.state)
+        return ", ".join(parts)
+
+    @property
+    def key(self) -> str:
+        """Canonical identifier, stable across spellings of the same place"""
+        return f"{self.kind}:" + "/".join(
+            normalize_name(part) for part in (self.state, self.district, self.taluka, self.name)
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "taluka": self.taluka or None,
+            "district": self.district or None,
+            "state": self.state,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "label": self.label
+        }
+
+
+class LocationMatch:
+    """A resolved location: the place, how it matched and the coordinates to use"""
+
+    __slots__ = ("place", "matched", "score", "latitude", "longitude")
+
+    def __init__(self, place: Place, matched: str, score: float,
+                 latitude: Optional[float] = None, longitude: Optional[float] = None):
+        self.place = place
+        self.matched = matched
+        self.score = score
+        self.latitude = place.latitude if latitude is None else latitude
+        self.longitude = place.longitude if longitude is None else longitude
+
+    @property
+    def label(self) -> str:
+        return self.place.label
+
+    @property
+    def key(self) -> str:
+        return self.place.key
+
+
+class LocationResolver:
+    """
+    Resolves free-text locations against an offline gazetteer and answers
+    nearest-place and nearest-weather-station queries from k-d trees.
+    The files are loaded on first use (or by load() at startup).
+    """
+
+    def __init__(self, gazetteer_path: str, stations_path: Optional[str] = None,
+                 fuzzy_cutoff: float = 0.8, cache_size: int = 10000, station_max_km: float = 50.0):
+        self.gazetteer_path = gazetteer_path
+        self.stations_path = stations_path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.cache_size = cache_size
+        self.station_max_km = station_max_km
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._places: List[Place] = []
+        self._names: Dict[str, List[Place]] = {}
+        self._phonetic: Dict[str, List[Place]] = {}
+        # Distinct normalized names, and trigram -> positions in that list, for fuzzy matching
+        self._fuzzy_names: List[str] = []
+        self._trigram_index: Dict[str, List[int]] = {}
+        self._place_tree: KDTree[Place] = KDTree([])
+        self._station_tree: KDTree[Place] = KDTree([])
+        # Input string -> match (or None), least recently used evicted first
+        self._cache: "OrderedDict[str, Optional[LocationMatch]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Loading
+
+    def load(self):
+        """Read the gazetteer and station files and build the indexes (safe to call repeatedly)"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            places = self._read_places(self.gazetteer_path)
+            stations = self._read_stations(self.stations_path) if self.stations_path else []
+            self._index(places, stations)
+            self._loaded = True
+        logger.info(f"📍 Gazetteer loaded: {len(places)} places, {len(stations)} weather stations")
+
+    @staticmethod
+    def _read_places(path: str) -> List[Tuple[Place, List[str]]]:
+        places = []
+        if not os.path.exists(path):
+            logger.warning(f"Gazetteer {path} not found; locations will not be resolved")
+            return places
+        with _open_csv(path) as handle:
+            for row in csv.DictReader(handle):
+                try:
+                    place = Place(
+                        row["Name"].strip(), (row.get("Kind") or "village").strip().lower(),
+                        (row.get("Taluka") or "").strip(), (row.get("District") or "").strip(),
+                        row["State"].strip(), float(row["Latitude"]), float(row["Longitude"])
+                    )
+                except (KeyError, TypeError, ValueError):
+                    continue
+                aliases = [alias.strip() for alias in (row.get("Aliases") or "").split("|") if alias.strip()]
+                places.append((place, aliases))
+        return places
+
+    @staticmethod
+    def _read_stations(path: str) -> List[Place]:
+        stations = []
+        if not os.path.exists(path):
+            logger.warning(f"Weather station list {path} not found")
+            return stations
+        with _open_csv(path) as handle:
+            for row in csv.DictReader(handle):
+                try:
+                    stations.append(Place(
+                        row["Station"].strip(), "station", "", "", row["State"].strip(),
+                        float(row["Latitude"]), float(row["Longitude"])
+                    ))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return stations
+
+    def _index(self, places: List[Tuple[Place, List[str]]], stations: List[Place]):
+        names: Dict[str, List[Place]] = {}
+        phonetic: Dict[str, List[Place]] = {}
+        for place, aliases in places:
+            for name in {normalize_name(place.name), *(normalize_name(alias) for alias in aliases)}:
+                if name:
+                    names.setdefault(name, []).append(place)
+                    phonetic.setdefault(phonetic_key(name), []).append(place)
+        fuzzy_names = list(names)
+        trigram_index: Dict[str, List[int]] = {}
+        for position, name in enumerate(fuzzy_names):
+            for gram in _trigrams(name):
+                trigram_index.setdefault(gram, []).append(position)
+
+        self._places = [place for place, _ in places]
+        self._names = names
+        self._phonetic = phonetic
+        self._fuzzy_names = fuzzy_names
+        self._trigram_index = trigram_index
+        self._place_tree = KDTree((place.latitude, place.longitude, place) for place in self._places)
+        self._station_tree = KDTree((station.latitude, station.longitude, station) for station in stations)
+        self._cache.clear()
+
+    # Resolution
+
+    def resolve(self, text: Optional[str]) -> Optional[LocationMatch]:
+        """Best gazetteer match for a free-text location, or None"""
+        if not text:
+            return None
+        cached = self._cache.get(text, _MISSING)
+        if cached is not _MISSING:
+            self.hits += 1
+            self._cache.move_to_end(text)
+            return cached
+        self.misses += 1
+        self.load()
+        match = self._resolve(text)
+        self._cache[text] = match
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return match
+
+    def canonical(self, text: Optional[str]) -> Optional[str]:
+        """Label of the resolved place, or the text as given when it does not resolve"""
+        match = self.resolve(text)
+        return match.label if match is not None else text
+
+    def _resolve(self, text: str) -> Optional[LocationMatch]:
+        # Fast path: the whole text is a gazetteer name
+        candidates = self._names.get(normalize_name(text))
+        if candidates is not None:
+            return LocationMatch(self._pick(candidates, []), "exact", 1.0)
+
+        coordinates = _COORDINATES.match(text)
+        if coordinates:
+            latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                return None
+            nearest = self._place_tree.nearest(latitude, longitude)
+            if not nearest:
+                return None
+            return LocationMatch(nearest[0][0], "coordinates", 1.0, latitude, longitude)
+
+        parts = []
+        for part in _SEPARATORS.split(text):
+            words = [word for word in normalize_name(part).split() if word not in _NOISE_WORDS]
+            if words:
+                parts.append(" ".join(words))
+        if not parts:
+            return None
+
+        # Each comma-separated part in turn, the others narrowing down ambiguous names
+        for index, name in enumerate(parts):
+            context = parts[:index] + parts[index + 1:]
+            match = self._match(name, context, fuzzy=True)
+            if match is not None:
+                return match
+
+        # Names buried in a phrase ("lasalgaon onion rates"): longest word spans first, no fuzzy
+        for index, name in enumerate(parts):
+            words = name.split()[:_MAX_SPAN_WORDS]
+            context = parts[:index] + parts[index + 1:]
+            for size in range(len(words) - 1, 0, -1):
+                for start in range(len(words) - size + 1):
+                    match = self._match(" ".join(words[start:start + size]), context, fuzzy=False)
+                    if match is not None:
+                        return match
+        return None
+
+    def _match(self, name: str, context: List[str], fuzzy: bool) -> Optional[LocationMatch]:
+        candidates = self._names.get(name)
+        matched, score = "exact", 1.0
+        if candidates is None:
+            candidates = self._phonetic.get(phonetic_key(name))
+            matched = "phonetic"
+        if candidates is None and fuzzy:
+            candidates, score = self._fuzzy(name)
+            matched = "fuzzy"
+        if not candidates:
+            return None
+        return LocationMatch(self._pick(candidates, context), matched, score)
+
+    @staticmethod
+    def _pick(candidates: List[Place], context: List[str]) -> Place:
+        if len(candidates) > 1 and context:
+            keys = {key for part in context for key in (part, phonetic_key(part))}
+            qualified = [place for place in candidates if place.context & keys]
+            if qualified:
+                candidates = qualified
+        return min(candidates, key=lambda place: _KIND_RANK.get(place.kind, len(_KIND_RANK)))
+
+    def _fuzzy(self, name: str) -> Tuple[Optional[List[Place]], float]:
+        """Closest gazetteer name by difflib ratio among names sharing the most trigrams"""
+        if len(name) < 4:
+            return None, 0.0
+        index = self._trigram_index
+        postings = [index[gram] for gram in _trigrams(name) if gram in index]
+        # Trigrams found in a large share of names ("pur", "gao") barely narrow the
+        # candidates and dominate the counting cost; leave them out when there are enough others
+        common = max(100, len(self._fuzzy_names) // 50)
+        selective = [posting for posting in postings if len(posting) <= common]
+        shared = Counter(chain.from_iterable(selective if len(selective) >= 3 else postings))
+        if not shared:
+            return None, 0.0
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(name)
+        best_name, best_score = None, self.fuzzy_cutoff
+        for position, _ in shared.most_common(_FUZZY_CANDIDATES):
+            candidate = self._fuzzy_names[position]
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                continue
+            score = matcher.ratio()
+            if score >= best_score:
+                best_name, best_score = candidate, score
+        if best_name is None:
+            return None, 0.0
+        return self._names[best_name], round(best_score, 3)
+
+    # Spatial queries
+
+    def nearest_places(self, latitude: float, longitude: float, limit: int = 1) -> List[Tuple[Place, float]]:
+        self.load()
+        return self._place_tree.nearest(latitude, longitude, limit)
+
+    def nearest_station(self, latitude: float, longitude: float) -> Optional[Tuple[Place, float]]:
+        """Closest weather station within station_max_km, with km"""
+        self.load()
+        nearest = self._station_tree.nearest(latitude, longitude, 1, max_km=self.station_max_km)
+        return nearest[0] if nearest else None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "places": len(self._places),
+            "names": len(self._names),
+            "weather_stations": len(self._station_tree),
+            "cache_entries": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+settings = get_settings()
+location_resolver = LocationResolver(
+    gazetteer_path=settings.gazetteer_path,
+    stations_path=settings.weather_stations_path,
+    fuzzy_cutoff=settings.location_fuzzy_cutoff,
+    cache_size=settings.location_cache_size,
+    station_max_km=settings.weather_station_max_km
+)
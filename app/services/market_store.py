@@ -0,0 +1,546 @@
+"""
+Local mandi price store.
+
+AGMARKNET / eNAM CSV dumps are streamed row by row into SQLite, keyed by
+(commodity, market, variety, day) in a clustered WITHOUT ROWID table, so
+price lookups by crop, market and date range are index seeks. Prices are
+kept as published, in rupees per quintal.
+
+CLI:
+    python -m app.services.market_store ingest data/market/fixtures/*.csv --coordinates data/market/mandis.csv
+    python -m app.services.market_store query onion Lasalgaon
+"""
+
+import re
+import csv
+import gzip
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from app.services.spatial_index import KDTree
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS commodities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS varieties (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS markets (
+    id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    district TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    UNIQUE (state, name)
+);
+CREATE TABLE IF NOT EXISTS prices (
+    commodity_id INTEGER NOT NULL,
+    market_id INTEGER NOT NULL,
+    variety_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    min_price REAL,
+    max_price REAL,
+    modal_price REAL NOT NULL,
+    PRIMARY KEY (commodity_id, market_id, day, variety_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_prices_commodity_day ON prices (commodity_id, day);
+"""
+
+# Normalized CSV header -> field; AGMARKNET, data.gov.in and eNAM exports name columns differently
+_COLUMN_PREFIXES = (
+    ("statename", "state"), ("state", "state"),
+    ("districtname", "district"), ("district", "district"),
+    ("marketname", "market"), ("market", "market"), ("apmc", "market"), ("mandi", "market"),
+    ("commodityname", "commodity"), ("commodity", "commodity"),
+    ("variety", "variety"),
+    ("arrivaldate", "date"), ("pricedate", "date"), ("reporteddate", "date"), ("date", "date"),
+    ("minprice", "min_price"), ("minimumprice", "min_price"),
+    ("maxprice", "max_price"), ("maximumprice", "max_price"),
+    ("modalprice", "modal_price"),
+    ("latitude", "latitude"), ("longitude", "longitude"),
+)
+_DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d-%b-%Y", "%d %b %Y")
+_REQUIRED = ("state", "market", "commodity", "date", "modal_price")
+
+# How often a store looks for commits by other processes (an ingest) before reloading names
+_RELOAD_CHECK_SECONDS = 1.0
+
+# Common farmer spellings -> AGMARKNET commodity names
+_COMMODITY_ALIASES = {
+    "paddy": "rice", "chilli": "dry chillies", "chillies": "dry chillies", "chili": "dry chillies",
+    "soybean": "soyabean", "soya": "soyabean", "kapas": "cotton", "aloo": "potato", "pyaz": "onion",
+    "kanda": "onion", "tamatar": "tomato", "gehun": "wheat",
+}
+
+
+def normalize_name(text: str) -> str:
+    """Case, punctuation and whitespace insensitive key for names"""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+def _normalize_header(header: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", header.lower().replace("_x0020_", ""))
+
+
+def _map_columns(headers: Iterable[str]) -> Dict[str, int]:
+    columns: Dict[str, int] = {}
+    for index, header in enumerate(headers):
+        key = _normalize_header(header)
+        for prefix, field in _COLUMN_PREFIXES:
+            if key.startswith(prefix):
+                columns.setdefault(field, index)
+                break
+    return columns
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8-sig")
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+class MarketInfo:
+    """A mandi and its coordinates, when known"""
+
+    __slots__ = ("id", "state", "district", "name", "latitude", "longitude")
+
+    def __init__(self, id: int, state: str, district: str, name: str,
+                 latitude: Optional[float], longitude: Optional[float]):
+        self.id = id
+        self.state = state
+        self.district = district
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+
+    @property
+    def has_location(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+
+class PricePoint:
+    """Prices for one day in rupees per quintal, averaged over varieties (and markets for all-India)"""
+
+    __slots__ = ("day", "min_price", "max_price", "modal_price")
+
+    def __init__(self, day: int, min_price: Optional[float], max_price: Optional[float], modal_price: float):
+        self.day = day
+        self.min_price = min_price
+        self.max_price = max_price
+        self.modal_price = modal_price
+
+    @property
+    def date(self) -> date:
+        return date.fromordinal(self.day)
+
+
+class IngestReport:
+    __slots__ = ("path", "rows", "skipped", "seconds")
+
+    def __init__(self, path: str, rows: int, skipped: int, seconds: float):
+        self.path = path
+        self.rows = rows
+        self.skipped = skipped
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        rate = self.rows / self.seconds if self.seconds else 0
+        return f"{self.path}: {self.rows} rows ({self.skipped} skipped) in {self.seconds:.2f}s, {rate:,.0f} rows/s"
+
+
+class MarketPriceStore:
+    """
+    Indexed SQLite store of mandi prices.
+
+    Names of commodities and markets are held in memory, so a query is a
+    dictionary lookup plus one index seek on the prices table (tens of
+    microseconds; the first query also loads the names). Ingestion uses its
+    own connection, so lookups keep working during a load. A read-only store
+    never creates or writes the file, which must already exist; it reloads
+    the names when another process commits an ingest (PRAGMA data_version
+    changes), checked at most once per _RELOAD_CHECK_SECONDS.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._commodities: Dict[str, int] = {}
+        self._commodity_names: Dict[int, str] = {}
+        self._markets: Dict[int, MarketInfo] = {}
+        # Normalized market and district names -> market ids
+        self._market_index: Dict[str, List[int]] = {}
+        self._commodity_markets: Dict[int, Set[int]] = {}
+        # Mandis with coordinates, for nearest-market queries
+        self._locations: KDTree[MarketInfo] = KDTree([])
+        self._data_version: Optional[int] = None
+        self._next_check = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def _connect_read_only(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    connection = self._connect_read_only() if self.read_only else self._connect()
+                    try:
+                        self._load_names(connection)
+                    except sqlite3.Error:
+                        # e.g. an ingest has created the file but not its tables yet; try again next query
+                        connection.close()
+                        raise
+                    self._connection = connection
+                    self._next_check = monotonic() + _RELOAD_CHECK_SECONDS
+        elif monotonic() >= self._next_check:
+            self._reload_if_changed()
+        return self._connection
+
+    def _reload_if_changed(self):
+        """Reload the names if another connection has committed since they were loaded"""
+        with self._lock:
+            self._next_check = monotonic() + _RELOAD_CHECK_SECONDS
+            if self._connection.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+                self._load_names(self._connection)
+
+    def _load_names(self, connection: sqlite3.Connection):
+        """(Re)build the in-memory name indexes (caller holds the lock)"""
+        self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        commodities = {name: id for id, name in connection.execute("SELECT id, name FROM commodities")}
+        markets = {
+            row[0]: MarketInfo(*row)
+            for row in connection.execute("SELECT id, state, district, name, latitude, longitude FROM markets")
+        }
+        index: Dict[str, List[int]] = {}
+        for market in markets.values():
+            for key in {normalize_name(market.name), normalize_name(market.district)}:
+                if key:
+                    index.setdefault(key, []).append(market.id)
+        commodity_markets: Dict[int, Set[int]] = {}
+        for commodity_id, market_id in connection.execute(
+            "SELECT DISTINCT commodity_id, market_id FROM prices"
+        ):
+            commodity_markets.setdefault(commodity_id, set()).add(market_id)
+
+        # Queries read these without the lock: ids found in the name lookups
+        # (assigned last) are always present in the maps assigned first
+        self._commodity_names = {id: name for name, id in commodities.items()}
+        self._markets = markets
+        self._commodity_markets = commodity_markets
+        self._locations = KDTree(
+            (market.latitude, market.longitude, market)
+            for market in markets.values() if market.has_location
+        )
+        self._commodities = commodities
+        self._market_index = index
+
+    def refresh(self):
+        """Pick up markets and commodities added by an ingest"""
+        connection = self.connection
+        with self._lock:
+            self._load_names(connection)
+
+    # Ingestion
+
+    def ingest_csv(self, path: str, batch_size: int = 5000) -> IngestReport:
+        """
+        Stream one CSV (optionally .gz) into the store. Re-ingesting a file
+        replaces the rows it contains, so loads are idempotent.
+        """
+        start = perf_counter()
+        connection = self._connect()
+        rows = skipped = 0
+        try:
+            commodities = {name: id for id, name in connection.execute("SELECT id, name FROM commodities")}
+            varieties = {name: id for id, name in connection.execute("SELECT id, name FROM varieties")}
+            markets = {
+                (state, name): (id, district)
+                for id, state, district, name in connection.execute("SELECT id, state, district, name FROM markets")
+            }
+            dates: Dict[str, Optional[int]] = {}
+
+            def lookup(table: Dict, key, insert_sql: str, params: tuple) -> int:
+                id = table.get(key)
+                if id is None:
+                    id = table[key] = connection.execute(insert_sql, params).lastrowid
+                return id
+
+            with _open_text(path) as handle:
+                reader = csv.reader(handle)
+                columns = _map_columns(next(reader, []))
+                missing = [field for field in _REQUIRED if field not in columns]
+                if missing:
+                    raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+                state_col, market_col = columns["state"], columns["market"]
+                commodity_col, date_col, modal_col = columns["commodity"], columns["date"], columns["modal_price"]
+                district_col = columns.get("district")
+                variety_col = columns.get("variety")
+                min_col, max_col = columns.get("min_price"), columns.get("max_price")
+                width = max(columns.values()) + 1
+
+                batch = []
+                for record in reader:
+                    if len(record) < width:
+                        skipped += 1
+                        continue
+                    try:
+                        modal = float(record[modal_col])
+                        raw_date = record[date_col]
+                        day = dates.get(raw_date, -1)
+                        if day == -1:
+                            day = dates[raw_date] = self._parse_day(raw_date)
+                        if day is None or modal <= 0:
+                            raise ValueError(raw_date)
+                        min_price = float(record[min_col]) if min_col is not None and record[min_col] else None
+                        max_price = float(record[max_col]) if max_col is not None and record[max_col] else None
+                    except ValueError:
+                        skipped += 1
+                        continue
+
+                    state = normalize_name(record[state_col])
+                    market = normalize_name(record[market_col])
+                    district = normalize_name(record[district_col]) if district_col is not None else ""
+                    market_entry = markets.get((state, market))
+                    if market_entry is None:
+                        market_id = connection.execute(
+                            "INSERT INTO markets (state, district, name) VALUES (?, ?, ?)",
+                            (state, district, market)
+                        ).lastrowid
+                        markets[(state, market)] = (market_id, district)
+                    else:
+                        market_id, known_district = market_entry
+                        if district and not known_district:
+                            # eNAM exports have no district; AGMARKNET rows fill it in
+                            connection.execute("UPDATE markets SET district = ? WHERE id = ?", (district, market_id))
+                            markets[(state, market)] = (market_id, district)
+
+                    commodity = normalize_name(record[commodity_col])
+                    variety = normalize_name(record[variety_col]) if variety_col is not None else ""
+                    batch.append((
+                        lookup(commodities, commodity, "INSERT INTO commodities (name) VALUES (?)", (commodity,)),
+                        market_id,
+                        lookup(varieties, variety, "INSERT INTO varieties (name) VALUES (?)", (variety,)),
+                        day, min_price, max_price, modal
+                    ))
+                    if len(batch) >= batch_size:
+                        self._write_prices(connection, batch)
+                        rows += len(batch)
+                        batch = []
+                if batch:
+                    self._write_prices(connection, batch)
+                    rows += len(batch)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        self.refresh()
+        return IngestReport(path, rows, skipped, perf_counter() - start)
+
+    @staticmethod
+    def _write_prices(connection: sqlite3.Connection, batch: List[tuple]):
+        connection.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+
+    @staticmethod
+    def _parse_day(text: str) -> Optional[int]:
+        text = text.strip()
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).toordinal()
+            except ValueError:
+                continue
+        return None
+
+    def load_coordinates(self, path: str) -> int:
+        """Set mandi coordinates from a State,District,Market,Latitude,Longitude CSV"""
+        connection = self._connect()
+        updated = 0
+        try:
+            with _open_text(path) as handle:
+                reader = csv.reader(handle)
+                columns = _map_columns(next(reader, []))
+                for record in reader:
+                    state = normalize_name(record[columns["state"]])
+                    market = normalize_name(record[columns["market"]])
+                    district = normalize_name(record[columns["district"]]) if "district" in columns else ""
+                    latitude, longitude = float(record[columns["latitude"]]), float(record[columns["longitude"]])
+                    connection.execute(
+                        "INSERT INTO markets (state, district, name, latitude, longitude) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (state, name) DO UPDATE SET latitude = excluded.latitude, "
+                        "longitude = excluded.longitude, district = COALESCE(NULLIF(markets.district, ''), excluded.district)",
+                        (state, district, market, latitude, longitude)
+                    )
+                    updated += 1
+            connection.commit()
+        finally:
+            connection.close()
+        self.refresh()
+        return updated
+
+    # Queries
+
+    def resolve_commodity(self, crop: str) -> Optional[int]:
+        self.connection
+        key = normalize_name(crop)
+        key = _COMMODITY_ALIASES.get(key, key)
+        commodity_id = self._commodities.get(key)
+        if commodity_id is None and key.endswith("s"):
+            commodity_id = self._commodities.get(key[:-1])
+        return commodity_id
+
+    def commodity_name(self, commodity_id: int) -> str:
+        return self._commodity_names[commodity_id]
+
+    def market(self, market_id: int) -> MarketInfo:
+        return self._markets[market_id]
+
+    def resolve_markets(self, location: str) -> List[MarketInfo]:
+        """Markets whose name (preferred) or district matches the location"""
+        self.connection
+        key = normalize_name(location)
+        ids = self._market_index.get(key, [])
+        markets = [self._markets[id] for id in ids]
+        markets.sort(key=lambda market: normalize_name(market.name) != key)
+        return markets
+
+    def has_prices(self, commodity_id: int, market_id: int) -> bool:
+        return market_id in self._commodity_markets.get(commodity_id, ())
+
+    def latest_price(self, commodity_id: int, market_id: Optional[int] = None) -> Optional[PricePoint]:
+        """Most recent day's prices at a market, or averaged over all markets"""
+        connection = self.connection
+        with self._lock:
+            if market_id is None:
+                row = connection.execute(
+                    "SELECT day, AVG(min_price), AVG(max_price), AVG(modal_price) FROM prices "
+                    "WHERE commodity_id = ? AND day = (SELECT MAX(day) FROM prices WHERE commodity_id = ?)",
+                    (commodity_id, commodity_id)
+                ).fetchone()
+            else:
+                row = connection.execute(
+                    "SELECT day, AVG(min_price), AVG(max_price), AVG(modal_price) FROM prices "
+                    "WHERE commodity_id = ? AND market_id = ? AND day = "
+                    "(SELECT MAX(day) FROM prices WHERE commodity_id = ? AND market_id = ?)",
+                    (commodity_id, market_id, commodity_id, market_id)
+                ).fetchone()
+        return PricePoint(*row) if row and row[0] is not None else None
+
+    def history(self, commodity_id: int, market_id: int, start: date, end: date) -> List[PricePoint]:
+        """Daily prices at a market between start and end, inclusive"""
+        connection = self.connection
+        with self._lock:
+            rows = connection.execute(
+                "SELECT day, AVG(min_price), AVG(max_price), AVG(modal_price) FROM prices "
+                "WHERE commodity_id = ? AND market_id = ? AND day BETWEEN ? AND ? GROUP BY day ORDER BY day",
+                (commodity_id, market_id, start.toordinal(), end.toordinal())
+            ).fetchall()
+        return [PricePoint(*row) for row in rows]
+
+    def trend(self, commodity_id: int, market_id: int, window_days: int = 7,
+              threshold_percent: float = 2.0) -> Tuple[str, Optional[float]]:
+        """
+        Compare the mean modal price of the last window_days (up to the latest
+        report) with the window before it. Returns (trend, change percent).
+        """
+        connection = self.connection
+        with self._lock:
+            latest = connection.execute(
+                "SELECT MAX(day) FROM prices WHERE commodity_id = ? AND market_id = ?", (commodity_id, market_id)
+            ).fetchone()[0]
+            if latest is None:
+                return "unknown", None
+            rows = connection.execute(
+                "SELECT day, AVG(modal_price) FROM prices "
+                "WHERE commodity_id = ? AND market_id = ? AND day > ? GROUP BY day",
+                (commodity_id, market_id, latest - 2 * window_days)
+            ).fetchall()
+        recent = [price for day, price in rows if day > latest - window_days]
+        previous = [price for day, price in rows if day <= latest - window_days]
+        if not recent or not previous:
+            return "unknown", None
+        before = sum(previous) / len(previous)
+        change = (sum(recent) / len(recent) - before) / before * 100
+        if change > threshold_percent:
+            label = "increasing"
+        elif change < -threshold_percent:
+            label = "decreasing"
+        else:
+            label = "stable"
+        return label, round(change, 1)
+
+    def nearest_markets(self, latitude: float, longitude: float, limit: int = 3,
+                        commodity_id: Optional[int] = None,
+                        exclude: Optional[int] = None) -> List[Tuple[MarketInfo, float]]:
+        """Closest mandis with coordinates (optionally only those trading the commodity), with km"""
+        self.connection
+        ids = self._commodity_markets.get(commodity_id, ()) if commodity_id is not None else None
+        if ids is None and exclude is None:
+            return self._locations.nearest(latitude, longitude, limit)
+        return self._locations.nearest(
+            latitude, longitude, limit,
+            lambda market: market.id != exclude and (ids is None or market.id in ids)
+        )
+
+    def stats(self) -> dict:
+        connection = self.connection
+        with self._lock:
+            rows = connection.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+        return {"commodities": len(self._commodities), "markets": len(self._markets), "price_rows": rows}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _main(argv: Optional[List[str]] = None):
+    import argparse
+    from app.config import get_settings
+
+    parser = argparse.ArgumentParser(description="Mandi price store")
+    parser.add_argument("--db", default=get_settings().market_db_path, help="SQLite file (default MARKET_DB_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Load AGMARKNET / eNAM CSV files (.csv or .csv.gz)")
+    ingest.add_argument("files", nargs="*")
+    ingest.add_argument("--coordinates", help="State,District,Market,Latitude,Longitude CSV")
+    query = commands.add_parser("query", help="Latest price and trend for a crop")
+    query.add_argument("crop")
+    query.add_argument("location", nargs="?", default="india")
+    args = parser.parse_args(argv)
+
+    store = MarketPriceStore(args.db)
+    if args.command == "ingest":
+        for path in args.files:
+            print(store.ingest_csv(path))
+        if args.coordinates:
+            print(f"{args.coordinates}: {store.load_coordinates(args.coordinates)} mandi locations")
+        print(store.stats())
+    else:
+        import asyncio
+        from app.services.additional_services import MarketService
+        print(asyncio.run(MarketService(store=store).get_market_prices(args.crop, args.location)))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,322 @@
+import re
+import logging
+from typing import Dict, List, Optional
+from app.models.schemas import AnswerExtras, ChemicalMention, Dosage, TimeWindow
+
+logger = logging.getLogger(__name__)
+
+# Pesticides and fungicides farmers are commonly advised to use, with the
+# safety flags shown next to them. "banned" covers the Government of India
+# bans (endosulfan 2011, the 2018 order and those effective from 2020);
+# "highly_toxic" is WHO class Ia/Ib; "restricted" means limited to some
+# crops or to licensed pest control operators.
+CHEMICAL_SAFETY: Dict[str, List[str]] = {
+    "endosulfan": ["banned", "bee_toxic", "fish_toxic"],
+    "methyl parathion": ["banned", "highly_toxic"],
+    "phorate": ["banned", "highly_toxic"],
+    "phosphamidon": ["banned", "highly_toxic"],
+    "triazophos": ["banned", "highly_toxic"],
+    "dichlorvos": ["banned", "highly_toxic"],
+    "trichlorfon": ["banned"],
+    "carbaryl": ["banned", "bee_toxic"],
+    "diazinon": ["banned"],
+    "benomyl": ["banned"],
+    "monocrotophos": ["restricted", "highly_toxic", "bee_toxic"],
+    "carbofuran": ["highly_toxic"],
+    "zinc phosphide": ["highly_toxic"],
+    "aluminium phosphide": ["restricted", "highly_toxic"],
+    "glyphosate": ["restricted"],
+    "imidacloprid": ["bee_toxic"],
+    "thiamethoxam": ["bee_toxic"],
+    "clothianidin": ["bee_toxic"],
+    "dimethoate": ["bee_toxic"],
+    "acephate": ["bee_toxic"],
+    "profenofos": ["bee_toxic"],
+    "quinalphos": ["bee_toxic"],
+    "spinosad": ["bee_toxic"],
+    "spinetoram": ["bee_toxic"],
+    "chlorpyrifos": ["bee_toxic", "fish_toxic"],
+    "fipronil": ["bee_toxic", "fish_toxic"],
+    "cypermethrin": ["bee_toxic", "fish_toxic"],
+    "lambda-cyhalothrin": ["bee_toxic", "fish_toxic"],
+    "deltamethrin": ["bee_toxic", "fish_toxic"],
+    "emamectin benzoate": ["bee_toxic", "fish_toxic"],
+    "chlorantraniliprole": [],
+    "cartap hydrochloride": [],
+    "diafenthiuron": [],
+    "pyriproxyfen": [],
+    "flubendiamide": [],
+    "pymetrozine": [],
+    "buprofezin": [],
+    "mancozeb": [],
+    "chlorothalonil": [],
+    "carbendazim": [],
+    "carboxin": [],
+    "thiram": [],
+    "metalaxyl": [],
+    "tricyclazole": [],
+    "tebuconazole": [],
+    "propiconazole": [],
+    "hexaconazole": [],
+    "difenoconazole": [],
+    "azoxystrobin": [],
+    "validamycin": [],
+    "copper oxychloride": [],
+    "pendimethalin": [],
+    "pinoxaden": [],
+    "clodinafop": [],
+    "metsulfuron methyl": [],
+    "atrazine": [],
+    "2,4-D": [],
+}
+
+# Other spellings found in advisories
+CHEMICAL_ALIASES = {
+    "chlorpyriphos": "chlorpyrifos",
+    "aluminum phosphide": "aluminium phosphide",
+}
+
+# Words that make an answer read as actionable advice
+ADVICE_WORDS = ["recommend", "recommended", "suggest", "suggested", "should", "can", "advise", "advised"]
+
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september",
+          "october", "november", "december"]
+
+MAX_SUGGESTIONS = 3
+# Bounds the extras of very long answers
+MAX_EXTRAS = 10
+
+_NUMBER = r"[0-9]+(?:\.[0-9]+)?"
+_RANGE = r"\s*(?:-|–|to)\s*"
+
+
+def _trie(words: List[str]) -> str:
+    """
+    Regex alternation of words arranged as a character trie, so a position
+    that starts no word fails after one character instead of one try per
+    word. Spaces and hyphens inside a word match either.
+    """
+    tree: Dict[str, dict] = {}
+    for word in words:
+        node = tree
+        for char in word.lower():
+            node = node.setdefault(" " if char == "-" else char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [("[ -]" if char == " " else re.escape(char)) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return build(tree)
+
+
+def _key(name: str) -> str:
+    return " ".join(re.split(r"[\s-]+", name.lower()))
+
+
+_MONTH = _trie(MONTHS)
+_MONTH_QUALIFIERS = ["early", "mid", "late", "end of"] + [
+    f"{which} {span} of" for which in ("first", "second", "third", "last") for span in ("week", "fortnight")
+]
+
+# Words that start an extra or raise the score, by kind. A month alone is a
+# calendar window, except "may", which is usually the verb.
+_WORD_KINDS: Dict[str, str] = {
+    **{_key(name): "chemical" for name in [*CHEMICAL_SAFETY, *CHEMICAL_ALIASES]},
+    **{word: "advice" for word in ADVICE_WORDS},
+    **{month: "calendar" for month in MONTHS if month != "may"},
+    **{_key(f"{qualifier} {month}"): "calendar" for qualifier in _MONTH_QUALIFIERS for month in MONTHS},
+}
+
+# One pattern for every extra, matched once over the lowercased answer. Each
+# branch starts at the space before a word, so the regex engine jumps from
+# space to space, and all the words are a single trie.
+_EXTRACT = re.compile(
+    " (?:"
+    # Chemicals with their formulation (dimethoate 30 EC), advice words, calendar
+    # windows (mid-January, late December to mid-January)
+    rf"(?P<word>{_trie(list(_WORD_KINDS))})\b"
+    rf"(?: (?P<formulation>{_NUMBER} ?%? ?(?:ec|sl|sc|wp|wg|wdg|sg|ds|fs|ws|gr|g|sp|cs|od|zc|ew|me))\b"
+    rf"|(?P<until>{_RANGE}(?:{_trie(_MONTH_QUALIFIERS)}[ -]+)?{_MONTH})\b)?"
+    r"|(?=[0-9])(?:"
+    # Doses: 5 ml/liter, 2-4 tonnes/acre, 100 kg seed per hectare, 2 to 3 g per kg of seed
+    rf"(?P<dose>(?P<dose_amount>{_NUMBER})(?:{_RANGE}(?P<dose_max>{_NUMBER}))?\s*"
+    r"(?P<dose_unit>kg|g|gm|grams?|mg|ml|l|lit(?:er|re)s?|tonnes?|tons?|t|quintals?|q)\b"
+    r"(?: (?!per\b)[a-z]+){0,3}?(?:\s*/\s*| per )"
+    r"(?P<dose_per>acre|ha|hectare|lit(?:er|re)|l|kg|plant|tree|pit|m2|sq\.? ?m)s?\b)"
+    # Timings: 30-45 days after sowing, within 24 hours, every 7 days, 21 DAS
+    rf"|(?P<window>(?P<window_start>{_NUMBER})(?:{_RANGE}(?P<window_end>{_NUMBER}))?\s*"
+    r"(?P<window_unit>hours?|hrs?|days?|weeks?|months?|years?|das|dat)\b"
+    r"(?: (?P<window_anchor>(?:after|before) (?:sowing|transplanting|planting|germination|spraying"
+    r"|flowering|irrigation|harvest)))?)"
+    # Dates: 1 to 25 November
+    rf"|(?P<dates>[0-9]{{1,2}}(?:{_RANGE}[0-9]{{1,2}})?[ -]+{_MONTH})\b"
+    "))"
+)
+
+# Bulleted or numbered list items; the text after the marker is a suggestion
+_LIST_ITEM = re.compile(r"\n[ \t]*(?:[•*\-][ \t]+|[0-9]{1,2}[.)][ \t]*)(\S[^\n]{10,})")
+# Word starts after these count too ("(40 kg per acre)"); replaced one for one, so match spans stay valid
+_WORD_BREAKS = "\n\t\r([{\"'"
+_EMPHASIS = re.compile(r"\*\*|__")
+_TIME_UNITS = {"hr": "hours", "hrs": "hours", "das": "days", "dat": "days"}
+_TIME_ANCHORS = {"das": "after sowing", "dat": "after transplanting"}
+
+_CHEMICALS = {**{_key(name): name for name in CHEMICAL_SAFETY},
+              **{_key(alias): name for alias, name in CHEMICAL_ALIASES.items()}}
+
+
+class AnswerAnalysis:
+    """Confidence score, suggestions and structured extras found in an answer"""
+
+    __slots__ = ("confidence", "suggestions", "extras")
+
+    def __init__(self, confidence: float, suggestions: List[str], extras: AnswerExtras):
+        self.confidence = confidence
+        self.suggestions = suggestions
+        self.extras = extras
+
+
+class AnswerPostProcessor:
+    """
+    Single-pass answer analysis on precompiled patterns.
+
+    Text is fed as it arrives (whole answers or streamed chunks). Complete
+    lines are lowercased once and scanned once by the combined pattern, and
+    never again, so analysing a streamed answer chunk by chunk costs the
+    same as analysing it whole. List items are found by jumping from line
+    start to line start until there are enough suggestions. finish() scores the answer: a base of 0.7,
+    plus 0.1 each for length, advice wording and concrete doses or timings.
+    """
+
+    __slots__ = ("_tail", "_chars", "_advice", "_suggestions", "_dosages", "_windows", "_chemicals", "_seen")
+
+    def __init__(self):
+        self._tail: List[str] = []
+        self._chars = 0
+        self._advice = False
+        self._suggestions: List[str] = []
+        self._dosages: List[Dosage] = []
+        self._windows: List[TimeWindow] = []
+        self._chemicals: Dict[str, ChemicalMention] = {}
+        self._seen = set()
+
+    def feed(self, text: str):
+        """Add the next part of the answer; complete lines are analysed right away"""
+        self._chars += len(text)
+        newline = text.rfind("\n")
+        if newline < 0:
+            self._tail.append(text)
+            return
+        self._tail.append(text[:newline])
+        lines = "".join(self._tail)
+        self._tail = [text[newline + 1:]]
+        self._scan(lines)
+
+    def finish(self) -> AnswerAnalysis:
+        """Analyse the last line and score the whole answer"""
+        if self._tail:
+            self._scan("".join(self._tail))
+            self._tail = []
+        confidence = 0.7
+        if self._chars > 100:
+            confidence += 0.1
+        if self._advice:
+            confidence += 0.1
+        if self._dosages or self._windows:
+            confidence += 0.1
+        return AnswerAnalysis(
+            round(min(confidence, 1.0), 2),
+            self._suggestions,
+            AnswerExtras(dosages=self._dosages, time_windows=self._windows, chemicals=list(self._chemicals.values()))
+        )
+
+    def _scan(self, lines: str):
+        """One pass of the combined pattern over complete lines"""
+        text = "\n" + lines
+        if len(self._suggestions) < MAX_SUGGESTIONS:
+            # Jumps from line start to line start, and stops at the last suggestion needed
+            for item in _LIST_ITEM.finditer(text):
+                suggestion = _EMPHASIS.sub("", item.group(1)).strip()
+                if len(suggestion) > 10:
+                    self._suggestions.append(suggestion)
+                    if len(self._suggestions) == MAX_SUGGESTIONS:
+                        break
+
+        lowered = text.lower()
+        # str.replace rather than str.translate, which is slow on non-ASCII text
+        for char in _WORD_BREAKS:
+            lowered = lowered.replace(char, " ")
+        if len(lowered) != len(text):
+            # A few characters lowercase to two; quote from the lowercased text instead
+            text = lowered
+        for match in _EXTRACT.finditer(lowered):
+            word = match.group("word")
+            kind = _WORD_KINDS[word.replace("-", " ")] if word is not None else match.lastgroup
+            if kind == "advice":
+                self._advice = True
+                continue
+            if kind == "chemical":
+                self._chemical(word, match.group("formulation"))
+                continue
+            key = match.group(0)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            quoted = text[match.start() + 1:match.end()]
+            if kind == "dose":
+                if len(self._dosages) < MAX_EXTRAS:
+                    self._dosages.append(self._dosage(match, quoted))
+            elif len(self._windows) < MAX_EXTRAS:
+                self._windows.append(self._window(match, quoted) if kind == "window"
+                                     else TimeWindow(text=quoted, unit="calendar"))
+
+    @staticmethod
+    def _dosage(match: re.Match, text: str) -> Dosage:
+        maximum = match.group("dose_max")
+        return Dosage(
+            text=text,
+            amount=float(match.group("dose_amount")),
+            amount_max=float(maximum) if maximum else None,
+            unit=match.group("dose_unit"),
+            per=match.group("dose_per")
+        )
+
+    @staticmethod
+    def _window(match: re.Match, text: str) -> TimeWindow:
+        unit = match.group("window_unit")
+        end = match.group("window_end")
+        anchor = match.group("window_anchor")
+        return TimeWindow(
+            text=text,
+            start=float(match.group("window_start")),
+            end=float(end) if end else None,
+            unit=_TIME_UNITS.get(unit, unit if unit.endswith("s") else unit + "s"),
+            anchor=" ".join(anchor.split()) if anchor else _TIME_ANCHORS.get(unit)
+        )
+
+    def _chemical(self, word: str, formulation: Optional[str]):
+        name = _CHEMICALS[word.replace("-", " ")]
+        mention = self._chemicals.get(name)
+        if mention is None:
+            if len(self._chemicals) >= MAX_EXTRAS:
+                return
+            self._chemicals[name] = ChemicalMention(
+                name=name,
+                formulation=" ".join(formulation.upper().split()) if formulation else None,
+                safety_flags=CHEMICAL_SAFETY[name]
+            )
+        elif formulation and mention.formulation is None:
+            mention.formulation = " ".join(formulation.upper().split())
+
+
+def analyze_answer(text: str) -> AnswerAnalysis:
+    """Analyse a complete answer"""
+    processor = AnswerPostProcessor()
+    processor.feed(text)
+    return processor.finish()
+
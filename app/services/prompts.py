@@ -0,0 +1,285 @@
+"""
+Prompt assembly for farmer queries.
+
+System prompts are precompiled once per (category, language) with their
+token counts, so a request only adds its own parts: the farmer context
+line, advisory passages, and conversation history. Those are added in
+priority order while they fit the token budget; whatever does not fit is
+left out and counted.
+
+Tokens are counted with a local tokenizer: the vocabulary at
+PROMPT_TOKENIZER_PATH (a tokenizer.json, e.g. Gemma's, which shares
+Gemini's SentencePiece vocabulary) when configured, otherwise a
+script-aware estimate.
+"""
+
+import re
+import logging
+import importlib
+import importlib.util
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from app.config import get_settings
+from app.models.schemas import QueryCategory
+from app.services.llm_backends import Message
+
+logger = logging.getLogger(__name__)
+
+# Role markers and separators each message costs on top of its text
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Latin words, single digits (SentencePiece vocabularies split numbers digit by digit),
+# runs of other scripts, and single punctuation marks
+_PIECES = re.compile(r"[A-Za-z]+|\d|[^\x00-\x7f\s]+|[^\sA-Za-z\d]")
+
+BASE_PROMPT = (
+    "You are an agricultural advisor for farmers in India. Give specific, practical advice "
+    "based on scientific farming practice and local conditions:\n"
+    "- mention suitable crops, seasons and regional factors\n"
+    "- prefer low-cost solutions, and organic or sustainable options where they work\n"
+    "- give safety precautions with any pesticide or chemical\n"
+    "- keep answers concise\n"
+    "- if unsure, advise consulting the local agricultural extension officer"
+)
+
+CATEGORY_FOCUS = {
+    QueryCategory.CROP_MANAGEMENT: "Focus on: crop cultivation, planting techniques, harvesting, yield improvement.",
+    QueryCategory.PEST_DISEASE: "Focus on: pest identification, disease management, organic treatments, IPM.",
+    QueryCategory.WEATHER: "Focus on: weather-related farming advice, seasonal planning, climate adaptation.",
+    QueryCategory.MARKET_PRICE: "Focus on: market trends, price outlook, best selling practices.",
+    QueryCategory.SOIL_HEALTH: "Focus on: soil testing, nutrient management, soil conservation.",
+    QueryCategory.IRRIGATION: "Focus on: water management, irrigation methods, water conservation.",
+    QueryCategory.FERTILIZER: "Focus on: nutrient management, fertilizer application, organic alternatives.",
+}
+
+# Response languages accepted by the API, as named in the answer instruction
+LANGUAGES = {
+    "english": "English",
+    "hindi": "Hindi",
+    "marathi": "Marathi",
+    "gujarati": "Gujarati",
+    "punjabi": "Punjabi",
+    "bengali": "Bengali",
+    "telugu": "Telugu",
+    "tamil": "Tamil",
+    "kannada": "Kannada",
+    "malayalam": "Malayalam",
+    "urdu": "Urdu",
+}
+
+REFERENCE_HEADER = ("Reference material from agricultural advisories. Prefer its doses, timings "
+                    "and thresholds when they answer the question:")
+SUMMARY_HEADER = "Earlier conversation with this farmer:"
+QUESTION_PREFIX = "Farmer's question: "
+
+
+def _language_instruction(language: str) -> str:
+    if language == "english":
+        return ""
+    return (f"Answer in {LANGUAGES[language]}, in simple words a farmer would use. Keep product names "
+            "and doses as printed on the label.")
+
+
+class TokenCounter:
+    """
+    Counts prompt tokens locally. With a tokenizer.json loaded through the
+    `tokenizers` package counts are exact for that vocabulary; otherwise
+    Latin words cost about one token per five letters, digits one each,
+    other scripts one per three characters and punctuation one per mark.
+    """
+
+    def __init__(self, tokenizer_path: str = ""):
+        self.tokenizer_path = tokenizer_path
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+        self._count = lru_cache(maxsize=4096)(self._count_uncached)
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def load(self) -> bool:
+        """Load the configured vocabulary (blocking; a tokenizer.json takes about a second). False if unavailable."""
+        with self._load_lock:
+            if self._tokenizer is not None or not self.tokenizer_path:
+                return self._tokenizer is not None
+            if importlib.util.find_spec("tokenizers") is None:
+                logger.warning("PROMPT_TOKENIZER_PATH is set but the tokenizers package is not installed; "
+                               "prompt token counts are estimates")
+                return False
+            try:
+                tokenizer = importlib.import_module("tokenizers").Tokenizer.from_file(self.tokenizer_path)
+            except Exception as e:
+                logger.error(f"❌ Could not load tokenizer {self.tokenizer_path}: {e}")
+                return False
+            self._tokenizer = tokenizer
+            # Counts cached from the estimate would now be inconsistent
+            self._count.cache_clear()
+            logger.info(f"✅ Prompt tokenizer loaded from {self.tokenizer_path}")
+            return True
+
+    def _count_uncached(self, text: str) -> int:
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        tokens = 0
+        for piece in _PIECES.findall(text):
+            if piece.isascii():
+                tokens += (len(piece) + 4) // 5 if piece.isalpha() else 1
+            else:
+                tokens += (len(piece) + 2) // 3
+        return tokens
+
+    def count(self, text: str) -> int:
+        return self._count(text) if text else 0
+
+
+class Prompt:
+    """Messages for one LLM call, their token count, and what the budget left out"""
+
+    __slots__ = ("messages", "tokens", "history_tokens", "trimmed")
+
+    def __init__(self, messages: List[Message], tokens: int, history_tokens: int, trimmed: Dict[str, int]):
+        self.messages = messages
+        self.tokens = tokens
+        # Conversation history (summary and replayed turns) included in tokens
+        self.history_tokens = history_tokens
+        # Parts left out to fit the budget: {"passage" | "turn" | "summary": count}
+        self.trimmed = trimmed
+
+    def describe(self) -> str:
+        """For the query log line, e.g. "812 prompt tokens, trimmed 2 turn" """
+        if not self.trimmed:
+            return f"{self.tokens} prompt tokens"
+        return f"{self.tokens} prompt tokens, trimmed " + ", ".join(
+            f"{count} {part}" for part, count in self.trimmed.items()
+        )
+
+
+class PromptBuilder:
+    """
+    Assembles the messages for a farmer question within a token budget.
+
+    The template, the farmer context line and the question are always sent.
+    The rest is added in priority order while it fits: the farmer's last
+    exchange (follow-up questions depend on it), advisory passages in rank
+    order, older turns from newest to oldest, then the summary of earlier
+    conversation.
+    """
+
+    def __init__(self, counter: TokenCounter, budget_tokens: int = 2000):
+        self.counter = counter
+        self.budget_tokens = budget_tokens
+        self._templates: Dict[Tuple[QueryCategory, str], Tuple[str, int]] = {}
+        self.compile()
+
+    def load(self):
+        """Load the configured tokenizer (blocking) and recount the templates with it"""
+        if self.counter.load():
+            self.compile()
+
+    def compile(self):
+        """Precompile every (category, language) template with its token count"""
+        for category in QueryCategory:
+            for language in LANGUAGES:
+                parts = [BASE_PROMPT, CATEGORY_FOCUS.get(category, ""), _language_instruction(language)]
+                template = "\n".join(part for part in parts if part)
+                self._templates[(category, language)] = (template, self.counter.count(template))
+        self._reference_header_tokens = self.counter.count(REFERENCE_HEADER)
+        self._summary_header_tokens = self.counter.count(SUMMARY_HEADER)
+        self._question_prefix_tokens = self.counter.count(QUESTION_PREFIX)
+
+    def template(self, category: QueryCategory, language: Optional[str] = None) -> Tuple[str, int]:
+        language = (language or "english").lower()
+        return self._templates.get((category, language)) or self._templates[(category, "english")]
+
+    @staticmethod
+    def context_line(farmer_context: Optional[dict]) -> str:
+        if not farmer_context or not (farmer_context.get("location") or farmer_context.get("crop_type")):
+            return ""
+        return (f"Farmer Context: Location: {farmer_context.get('location') or 'Not specified'}, "
+                f"Crop: {farmer_context.get('crop_type') or 'Not specified'}")
+
+    def turn_tokens(self, turn: Tuple[str, str]) -> int:
+        """Tokens a replayed (question, answer) turn costs"""
+        question, answer = turn
+        return (self._question_prefix_tokens + self.counter.count(question) + self.counter.count(answer)
+                + 2 * MESSAGE_OVERHEAD_TOKENS)
+
+    def build(self, query: str, category: QueryCategory, language: Optional[str] = None,
+              farmer_context: Optional[dict] = None, passages: Sequence = (), summary: str = "",
+              turns: Iterable[Tuple[str, str]] = ()) -> Prompt:
+        """Messages for the question; passages are knowledge base Passages, turns (question, answer) pairs"""
+        template, tokens = self.template(category, language)
+        context = self.context_line(farmer_context)
+        tokens += self.counter.count(context) + self._question_prefix_tokens + self.counter.count(query)
+        tokens += 2 * MESSAGE_OVERHEAD_TOKENS
+        remaining = self.budget_tokens - tokens
+        trimmed: Dict[str, int] = {}
+
+        turns = list(turns)
+        kept_turns = 0
+        history_tokens = 0
+        if turns:
+            cost = self.turn_tokens(turns[-1])
+            if cost <= remaining:
+                remaining -= cost
+                history_tokens += cost
+                kept_turns = 1
+
+        references = []
+        for passage in passages:
+            line = f"[{len(references) + 1}] {passage.title} - {passage.section}: {passage.text}"
+            cost = self.counter.count(line) + (0 if references else self._reference_header_tokens)
+            if cost > remaining:
+                trimmed["passage"] = trimmed.get("passage", 0) + 1
+                continue
+            remaining -= cost
+            references.append(line)
+
+        # Older turns newest first, stopping at the first that does not fit so the replay has no gaps
+        if kept_turns:
+            for turn in reversed(turns[:-1]):
+                cost = self.turn_tokens(turn)
+                if cost > remaining:
+                    break
+                remaining -= cost
+                history_tokens += cost
+                kept_turns += 1
+        if kept_turns < len(turns):
+            trimmed["turn"] = len(turns) - kept_turns
+
+        if summary:
+            cost = self._summary_header_tokens + self.counter.count(summary)
+            # Older than any replayed turn, so only sent when the turns it follows are all there
+            if cost <= remaining and kept_turns == len(turns):
+                remaining -= cost
+                history_tokens += cost
+            else:
+                trimmed["summary"] = 1
+                summary = ""
+
+        system_parts = [template]
+        if context:
+            system_parts.append(context)
+        if references:
+            system_parts.append(REFERENCE_HEADER)
+            system_parts.extend(references)
+        if summary:
+            system_parts.append(f"{SUMMARY_HEADER}\n{summary}")
+        messages: List[Message] = [("system", "\n".join(system_parts))]
+        for question, answer in turns[len(turns) - kept_turns:]:
+            messages.append(("human", f"{QUESTION_PREFIX}{question}"))
+            messages.append(("ai", answer))
+        messages.append(("human", f"{QUESTION_PREFIX}{query}"))
+        return Prompt(messages, self.budget_tokens - remaining, history_tokens, trimmed)
+
+
+def _build_prompt_builder() -> PromptBuilder:
+    settings = get_settings()
+    return PromptBuilder(TokenCounter(settings.prompt_tokenizer_path), settings.prompt_token_budget)
+
+
+# Global instances
+prompt_builder = _build_prompt_builder()
+token_counter = prompt_builder.counter
@@ -0,0 +1,240 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Dict, List, Optional
+from app.config import get_settings
+from app.models.schemas import FarmerQueryResponse, QueryType
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLogRecord:
+    """One answered query waiting to be written"""
+
+    __slots__ = ("query", "response", "farmer_id", "location", "crop_type", "language", "query_type", "created_at")
+
+    def __init__(self, query: str, response: FarmerQueryResponse, farmer_id: Optional[str],
+                 location: Optional[str], crop_type: Optional[str], language: Optional[str],
+                 query_type: QueryType):
+        self.query = query
+        self.response = response
+        self.farmer_id = farmer_id
+        self.location = location
+        self.crop_type = crop_type
+        self.language = language
+        self.query_type = query_type
+        self.created_at = datetime.now()
+
+
+# Queued by stop() after the last record
+_STOP = object()
+
+
+def _dialect_insert(db):
+    """insert() of the session's dialect, which supports ON CONFLICT (only SQLite and PostgreSQL are supported)"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _clip(value: Optional[str], column) -> Optional[str]:
+    """Truncate value to the column's String(n) length"""
+    length = column.type.length
+    return value[:length] if value and length and len(value) > length else value
+
+
+class QueryLogWriter:
+    """
+    Persists queries and answers off the request path.
+    Requests only append to an in-memory queue; a background task writes
+    them in one transaction every batch_size rows or flush_ms milliseconds,
+    whichever comes first. When the queue is full records are dropped
+    rather than slowing down requests.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_ms: int = 500, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[Awaitable] = None
+        self._category_ids: Dict[str, int] = {}
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def record(self, query: str, response: FarmerQueryResponse, farmer_id: Optional[str] = None,
+               location: Optional[str] = None, crop_type: Optional[str] = None,
+               language: Optional[str] = None, query_type: QueryType = QueryType.TEXT):
+        """Queue a query and its answer for writing (never blocks)"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(QueryLogRecord(
+                query, response, farmer_id, location, crop_type, language, query_type
+            ))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"Query log queue full, {self.dropped} records dropped so far")
+
+    def start(self, ready: Optional[Awaitable] = None):
+        """Start accepting records; writing waits for `ready` (e.g. table creation)"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._ready = ready
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer after flushing everything still queued"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            # Not cancelled: the writer may hold a partly collected batch, so it is told
+            # to flush and exit once it reaches the end of the queue
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+        if self._ready is not None:
+            # Tables may still be being created if we stop right after starting
+            try:
+                await asyncio.shield(self._ready)
+            except Exception:
+                pass
+
+        # Records queued after the writer exited (or if it never started)
+        remaining = []
+        while not self._queue.empty():
+            record = self._queue.get_nowait()
+            if record is not _STOP:
+                remaining.append(record)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        self._queue = None
+
+    async def _run(self):
+        if self._ready is not None:
+            try:
+                # Shielded so stopping the writer does not cancel the startup work itself
+                await asyncio.shield(self._ready)
+            except Exception as e:
+                logger.error(f"Query log writer not started, database unavailable: {e}")
+                return
+        while True:
+            record = await self._queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[QueryLogRecord]):
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} query log records: {e}")
+
+    def _write_batch(self, batch: List[QueryLogRecord]):
+        """Write one batch in a single transaction (runs in a worker thread)"""
+        from app.database import SessionLocal
+        from app.models.db_models import Answer, Category, Farmer, Query
+
+        db = SessionLocal()
+        try:
+            if not self._category_ids:
+                self._category_ids = {name: id for id, name in db.query(Category.id, Category.name)}
+
+            # Request fields have no length limits; one over-long value must not fail the whole batch
+            for record in batch:
+                record.farmer_id = _clip(record.farmer_id, Farmer.id)
+                record.location = _clip(record.location, Query.location)
+                record.crop_type = _clip(record.crop_type, Query.crop_type)
+                record.language = _clip(record.language, Query.language)
+
+            first_seen: Dict[str, datetime] = {}
+            for record in batch:
+                if record.farmer_id:
+                    first_seen.setdefault(record.farmer_id, record.created_at)
+            farmers = {}
+            if first_seen:
+                # Another worker may create the same farmer at the same time: insert missing
+                # rows with ON CONFLICT DO NOTHING instead of checking first
+                db.execute(_dialect_insert(db)(Farmer).values([
+                    {"id": farmer_id, "created_at": seen, "last_seen_at": seen}
+                    for farmer_id, seen in first_seen.items()
+                ]).on_conflict_do_nothing(index_elements=["id"]))
+                farmers = {farmer.id: farmer for farmer in db.query(Farmer).filter(Farmer.id.in_(first_seen))}
+
+            for record in batch:
+                if record.farmer_id:
+                    farmer = farmers[record.farmer_id]
+                    farmer.location = record.location or farmer.location
+                    farmer.crop_type = record.crop_type or farmer.crop_type
+                    farmer.language = record.language or farmer.language
+                    farmer.last_seen_at = record.created_at
+
+                response = record.response
+                db.add(Query(
+                    farmer_id=record.farmer_id,
+                    category_id=self._category_ids[response.category.value],
+                    text=record.query,
+                    query_type=record.query_type.value,
+                    location=record.location,
+                    crop_type=record.crop_type,
+                    language=record.language,
+                    created_at=record.created_at,
+                    answer=Answer(
+                        text=response.answer,
+                        confidence_score=response.confidence_score,
+                        suggestions=response.suggestions,
+                        sources=response.sources,
+                        succeeded=response.confidence_score > 0.0,
+                        created_at=response.timestamp
+                    )
+                ))
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+settings = get_settings()
+
+# Global instance
+query_log_writer = QueryLogWriter(
+    batch_size=settings.query_log_batch_size,
+    flush_ms=settings.query_log_flush_ms,
+    max_queue=settings.query_log_max_queue
+)
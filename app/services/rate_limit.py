@@ -0,0 +1,61 @@
+"""
+Per-farmer and per-IP token-bucket rate limits in front of the LLM.
+
+Buckets live in the shared store, so in a multi-worker deployment a
+farmer's requests draw from one bucket whichever worker serves them.
+"""
+
+import logging
+from typing import Optional
+from app.config import get_settings
+from app.metrics import RATE_LIMITED
+from app.services.shared_store import SharedStore, shared_store
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """A client or farmer is over its request budget"""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {scope}")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Two token buckets per request: one per farmer_id (protects the LLM
+    quota from one heavy user) and one per client IP (covers anonymous
+    callers and scripted abuse). A request costs one token per query, at
+    most a full bucket (a large batch empties it rather than never fitting).
+    """
+
+    def __init__(self, store: SharedStore):
+        self.settings = get_settings()
+        self.store = store
+        self.enabled = self.settings.rate_limit_enabled
+
+    def check(self, client_ip: Optional[str], farmer_id: Optional[str] = None, cost: int = 1):
+        """Spend cost tokens from the farmer's and the IP's buckets, or raise RateLimitExceeded"""
+        if not self.enabled:
+            return
+        settings = self.settings
+        # The farmer bucket is the tighter one: check it first so a refusal spends no IP tokens
+        if farmer_id:
+            self._take("farmer", f"rl:farmer:{farmer_id}", settings.rate_limit_farmer_per_minute,
+                       settings.rate_limit_farmer_burst, cost)
+        if client_ip:
+            self._take("ip", f"rl:ip:{client_ip}", settings.rate_limit_ip_per_minute,
+                       settings.rate_limit_ip_burst, cost)
+
+    def _take(self, scope: str, key: str, per_minute: float, burst: int, cost: int):
+        allowed, retry_after = self.store.take_tokens(key, per_minute / 60, burst, cost)
+        if not allowed:
+            RATE_LIMITED.inc((scope,))
+            logger.info(f"Rate limited {key}, retry after {retry_after:.1f}s")
+            raise RateLimitExceeded(scope, retry_after)
+
+
+# Global instance
+rate_limiter = RateLimiter(shared_store)
@@ -0,0 +1,362 @@
+import time
+import random
+import asyncio
+import logging
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from time import perf_counter
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple, TypeVar
+from app.config import get_settings
+from app.metrics import registry, UPSTREAM_CALLS, UPSTREAM_HEDGES, UPSTREAM_LATENCY, UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request must be answered, set per request by DeadlineMiddleware
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the dependency's circuit is open"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when the request's remaining time budget is used up"""
+
+
+class UpstreamUnavailableError(Exception):
+    """Upstream answered with a server error; counts as a failure and may be retried"""
+
+
+def set_deadline(seconds: float) -> Token:
+    """Start a time budget for the current context; never extends an existing one"""
+    deadline = time.monotonic() + seconds
+    current = _request_deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    return _request_deadline.set(deadline)
+
+
+def reset_deadline(token: Token):
+    _request_deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Run the block with at most `seconds` of budget for upstream calls"""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without a deadline"""
+    current = _request_deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    closed: calls pass; consecutive failures are counted.
+    open: calls are rejected until reset_timeout has passed.
+    half_open: a single trial call is let through; success closes the
+    circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def available(self) -> bool:
+        """Whether allow() would let a call through, without taking the half-open trial slot"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self._trial_in_flight
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} failure(s)")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a half-open trial slot without a verdict (e.g. the call was cancelled)"""
+        self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies with percentile lookup"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at the given fraction (0.95 for p95), or None until enough samples exist"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        index = min(len(self._sorted) - 1, int(fraction * len(self._sorted)))
+        return self._sorted[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+# Every Upstream created, for the scrape-time metrics below
+_upstreams: "weakref.WeakSet[Upstream]" = weakref.WeakSet()
+
+
+class Upstream:
+    """
+    Resilient calls to one external dependency.
+
+    Each attempt's timeout adapts to the dependency's observed latency
+    (timeout_multiplier x the timeout_percentile latency, clamped to
+    [min_timeout, max_timeout]) and never exceeds what is left of the
+    incoming request's deadline. Failed attempts are retried with full
+    jitter backoff only while the remaining budget allows another attempt.
+    With hedge enabled (idempotent calls only) a duplicate request is fired
+    when an attempt runs past the hedge_percentile latency. The circuit
+    breaker makes calls fail fast while the dependency is down.
+    """
+
+    def __init__(self, name: str, max_timeout: float, min_timeout: float = 0.25,
+                 timeout_percentile: float = 0.99, timeout_multiplier: float = 3.0,
+                 max_attempts: int = 3, backoff_base: float = 0.1, backoff_max: float = 1.0,
+                 hedge: bool = False, hedge_percentile: float = 0.95,
+                 retry_on: Tuple[type, ...] = (), breaker: Optional[CircuitBreaker] = None,
+                 latency: Optional[LatencyTracker] = None):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Errors that mean the dependency is struggling; anything else is the caller's problem
+        self.retry_on = (TimeoutError, asyncio.TimeoutError, ConnectionError, UpstreamUnavailableError) + tuple(retry_on)
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = latency or LatencyTracker()
+        _upstreams.add(self)
+
+    def adaptive_timeout(self) -> float:
+        """Per-attempt timeout from recent latency, before the request deadline is applied"""
+        observed = self.latency.percentile(self.timeout_percentile)
+        if observed is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, observed * self.timeout_multiplier))
+
+    def attempt_timeout(self) -> Tuple[float, bool]:
+        """Timeout for the next attempt, and whether the request's remaining budget capped it"""
+        timeout = self.adaptive_timeout()
+        budget = remaining_budget()
+        if budget is not None and budget < timeout:
+            return budget, True
+        return timeout, False
+
+    @property
+    def available(self) -> bool:
+        return self.breaker.available
+
+    def acquire(self):
+        """Take permission from the breaker for one call, or fail fast"""
+        if not self.breaker.allow():
+            UPSTREAM_CALLS.inc((self.name, "rejected"))
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record_success(self, elapsed: float):
+        UPSTREAM_CALLS.inc((self.name, "success"))
+        UPSTREAM_LATENCY.observe(elapsed, (self.name,))
+        self.latency.record(elapsed)
+        self.breaker.record_success()
+
+    def record_failure(self, outcome: str, timeout: Optional[float] = None):
+        UPSTREAM_CALLS.inc((self.name, outcome))
+        if outcome == "timeout" and timeout:
+            # Count timeouts as slow samples so the adaptive timeout cannot ratchet down on survivors only
+            self.latency.record(timeout)
+        self.breaker.record_failure()
+
+    def release(self, outcome: str = "cancelled"):
+        """End a call that says nothing about the dependency's health"""
+        UPSTREAM_CALLS.inc((self.name, outcome))
+        self.breaker.release()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def call(self, request: Callable[[], Awaitable[T]]) -> T:
+        """Run request() with adaptive timeouts, budgeted retries, hedging and the breaker"""
+        self.acquire()
+        attempt = 0
+        start = perf_counter()
+        while True:
+            attempt += 1
+            timeout, capped = self.attempt_timeout()
+            if timeout <= 0:
+                self.release("deadline")
+                raise DeadlineExceededError(f"No time left in the request budget for {self.name}")
+            try:
+                result = await self._attempt(request, timeout)
+            except asyncio.CancelledError:
+                self.release()
+                raise
+            except self.retry_on as e:
+                timed_out = isinstance(e, (TimeoutError, asyncio.TimeoutError))
+                if timed_out and capped:
+                    # The caller ran out of time, which says nothing about the dependency
+                    self.release("deadline")
+                    raise DeadlineExceededError(f"Request budget ran out waiting for {self.name}") from e
+                outcome = "timeout" if timed_out else "error"
+                backoff = self._backoff(attempt)
+                budget = remaining_budget()
+                if attempt >= self.max_attempts or (budget is not None and budget < backoff + self.min_timeout):
+                    self.record_failure(outcome, timeout)
+                    raise
+                UPSTREAM_RETRIES.inc((self.name,))
+                logger.info(f"Retrying {self.name} in {backoff * 1000:.0f} ms after {type(e).__name__}")
+                await asyncio.sleep(backoff)
+                continue
+            except Exception:
+                # The dependency answered; the request itself was bad
+                self.release("client_error")
+                raise
+            self.record_success(perf_counter() - start)
+            return result
+
+    async def _attempt(self, request: Callable[[], Awaitable[T]], timeout: float) -> T:
+        delay = self.latency.percentile(self.hedge_percentile) if self.hedge else None
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(request(), timeout)
+
+        deadline_at = perf_counter() + timeout
+        tasks = [asyncio.ensure_future(request())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                UPSTREAM_HEDGES.inc((self.name,))
+                tasks.append(asyncio.ensure_future(request()))
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(0.0, deadline_at - perf_counter()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                winner = None
+                for task in done:
+                    tasks.remove(task)
+                    if task.cancelled():
+                        continue
+                    # Read every exception, so a hedge that failed alongside the winner is not
+                    # logged as "Task exception was never retrieved"
+                    exception = task.exception()
+                    if exception is None:
+                        winner = winner or task
+                    else:
+                        error = error or exception
+                if winner is not None:
+                    return winner.result()
+            raise error or asyncio.CancelledError()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "breaker": self.breaker.state,
+            "timeout_seconds": round(self.adaptive_timeout(), 3),
+            "p95_seconds": self.latency.percentile(0.95),
+            "samples": len(self.latency)
+        }
+
+
+def build_upstream(name: str, max_timeout: float, **kwargs) -> Upstream:
+    """Upstream with the UPSTREAM_* defaults from settings; keyword arguments override them"""
+    settings = get_settings()
+    options = dict(
+        min_timeout=settings.upstream_min_timeout_seconds,
+        timeout_percentile=settings.upstream_timeout_percentile,
+        timeout_multiplier=settings.upstream_timeout_multiplier,
+        max_attempts=settings.upstream_max_attempts,
+        backoff_base=settings.upstream_backoff_base_ms / 1000,
+        backoff_max=settings.upstream_backoff_max_ms / 1000,
+        hedge=settings.upstream_hedge_enabled,
+        breaker=CircuitBreaker(name, settings.upstream_breaker_failures, settings.upstream_breaker_reset_seconds)
+    )
+    options.update(kwargs)
+    return Upstream(name, max_timeout, **options)
+
+
+def all_upstreams() -> List[Upstream]:
+    return sorted(_upstreams, key=lambda upstream: upstream.name)
+
+
+_BREAKER_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+registry.register_callback(
+    "upstream_timeout_seconds", "Current adaptive per-attempt timeout by dependency", "gauge",
+    lambda: {(("dependency", upstream.name),): upstream.adaptive_timeout() for upstream in all_upstreams()}
+)
+registry.register_callback(
+    "upstream_circuit_state", "Circuit breaker state by dependency (0 closed, 1 half-open, 2 open)", "gauge",
+    lambda: {
+        (("dependency", upstream.name),): _BREAKER_STATES[upstream.breaker.state] for upstream in all_upstreams()
+    }
+)
@@ -0,0 +1,211 @@
+import re
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+from app.models.schemas import QueryCategory, FarmerQueryResponse
+from app.services.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+# Indic vowel signs are not \w, but are part of the word; dandas are punctuation
+_NON_WORD = re.compile(r"[^\w\s\u0900-\u0963\u0966-\u0D7F]+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Words that carry no meaning for matching farmer questions
+_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "am", "i", "my", "me", "we", "our", "to", "in", "on",
+    "of", "for", "with", "and", "or", "how", "what", "when", "which", "do", "does", "can",
+    "should", "please", "tell", "about", "it", "this", "that", "crop", "crops", "field"
+})
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase, strip punctuation and collapse whitespace"""
+    if not text:
+        return ""
+    text = _NON_WORD.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _shingles(normalized_query: str) -> FrozenSet[str]:
+    """Token unigrams and bigrams with stopwords and plural 's' removed"""
+    tokens = [
+        token[:-1] if len(token) > 3 and token.endswith("s") else token
+        for token in normalized_query.split()
+        if token not in _STOPWORDS
+    ]
+    bigrams = {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+    return frozenset(tokens) | frozenset(bigrams)
+
+
+class _CacheEntry:
+    __slots__ = ("response", "shingles", "context_key", "expires_at")
+
+    def __init__(self, response: FarmerQueryResponse, shingles: FrozenSet[str],
+                 context_key: Tuple[str, str, str, str], expires_at: float):
+        self.response = response
+        self.shingles = shingles
+        self.context_key = context_key
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Two-tier answer cache in front of the LLM call.
+
+    Exact tier: normalized query + category + location + crop type + language.
+    Near-duplicate tier: Jaccard similarity of token shingles against entries
+    sharing the same category, location, crop type and language.
+    Entries expire after a TTL and are evicted least-recently-used first.
+
+    With a shared store (multi-worker deployments), exact-tier answers are
+    also written there, and a local exact miss is checked against it before
+    the near-duplicate tier, so an answer generated by one worker is served
+    by all of them.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 21600,
+                 similarity_threshold: float = 0.8, shared: Optional[SharedStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.shared = shared
+        self._entries: "OrderedDict[Tuple[str, Tuple[str, str, str, str]], _CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, str, str, str], Set[Tuple[str, Tuple[str, str, str, str]]]] = {}
+        self.hits_exact = 0
+        self.hits_near = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _context_key(category: QueryCategory, farmer_context: Optional[dict],
+                     language: str) -> Tuple[str, str, str, str]:
+        farmer_context = farmer_context or {}
+        return (
+            category.value,
+            normalize_text(farmer_context.get("location")),
+            normalize_text(farmer_context.get("crop_type")),
+            language,
+        )
+
+    def get(self, query: str, category: QueryCategory, farmer_context: Optional[dict] = None,
+            language: str = "english") -> Optional[FarmerQueryResponse]:
+        """Look up a cached answer, trying the exact tier before the near-duplicate tier"""
+        normalized = normalize_text(query)
+        context_key = self._context_key(category, farmer_context, language)
+        key = (normalized, context_key)
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits_exact += 1
+                return self._fresh_copy(entry.response)
+            self._remove(key)
+
+        if self.shared is not None:
+            payload = self.shared.get(self._shared_key(key))
+            if payload is not None:
+                response = FarmerQueryResponse.parse_raw(payload)
+                self._insert(key, normalized, context_key, response)
+                self.hits_shared += 1
+                return self._fresh_copy(response)
+
+        shingles = _shingles(normalized)
+        best_key, best_score = None, 0.0
+        if shingles:
+            for candidate_key in list(self._buckets.get(context_key, ())):
+                candidate = self._entries[candidate_key]
+                if candidate.expires_at <= now:
+                    self._remove(candidate_key)
+                    continue
+                # Cheap upper bound on Jaccard before computing the intersection
+                smaller, larger = sorted((len(shingles), len(candidate.shingles)))
+                if not larger or smaller / larger < self.similarity_threshold:
+                    continue
+                score = len(shingles & candidate.shingles) / len(shingles | candidate.shingles)
+                if score > best_score:
+                    best_key, best_score = candidate_key, score
+
+        if best_key is not None and best_score >= self.similarity_threshold:
+            self._entries.move_to_end(best_key)
+            self.hits_near += 1
+            logger.debug(f"Near-duplicate cache hit (similarity {best_score:.2f})")
+            return self._fresh_copy(self._entries[best_key].response)
+
+        self.misses += 1
+        return None
+
+    def set(self, query: str, category: QueryCategory, farmer_context: Optional[dict],
+            response: FarmerQueryResponse, language: str = "english") -> None:
+        """Store an answer, evicting the least recently used entries when full"""
+        normalized = normalize_text(query)
+        context_key = self._context_key(category, farmer_context, language)
+        key = (normalized, context_key)
+        self._insert(key, normalized, context_key, response)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), response.json().encode(), self.ttl_seconds)
+
+    def _insert(self, key: Tuple[str, Tuple[str, str, str, str]], normalized: str,
+                context_key: Tuple[str, str, str, str], response: FarmerQueryResponse) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _CacheEntry(
+            response=response,
+            shingles=_shingles(normalized),
+            context_key=context_key,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._buckets.setdefault(context_key, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    @staticmethod
+    def _shared_key(key: Tuple[str, Tuple[str, str, str, str]]) -> str:
+        normalized, (category, location, crop_type, language) = key
+        return f"answer:{category}|{location}|{crop_type}|{language}|{normalized}"
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        hits = self.hits_exact + self.hits_near + self.hits_shared
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits_exact": self.hits_exact,
+            "hits_near": self.hits_near,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: Tuple[str, Tuple[str, str, str, str]]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket = self._buckets.get(entry.context_key)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[entry.context_key]
+
+    @staticmethod
+    def _fresh_copy(response: FarmerQueryResponse) -> FarmerQueryResponse:
+        return response.copy(update={"timestamp": datetime.now()})
@@ -0,0 +1,167 @@
+"""
+Key-value and token-bucket store shared by all worker processes.
+
+Backed by one SQLite file in WAL mode, so no outside service (Redis) is
+needed: workers on the same machine see each other's writes, and each
+operation is a single statement, atomic across processes. Durability is
+traded for speed (synchronous=OFF); the contents are caches and rate
+limits that are safe to lose. With no path configured the store is a
+private in-memory database, which is all a single worker needs.
+"""
+
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, Tuple
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Refill, then spend cost tokens only if the bucket holds enough; one statement, so atomic across workers
+_TAKE_TOKENS = """
+INSERT INTO buckets (key, tokens, updated_at, allowed)
+VALUES (:key, CASE WHEN :capacity >= :cost THEN :capacity - :cost ELSE :capacity END, :now, :capacity >= :cost)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = CASE
+        WHEN MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :cost
+        THEN MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) - :cost
+        ELSE MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate)
+    END,
+    allowed = MIN(:capacity, tokens + MAX(0, :now - updated_at) * :rate) >= :cost,
+    updated_at = :now
+RETURNING tokens, allowed
+"""
+
+# Expired rows are swept after this many writes
+_PURGE_EVERY = 1000
+
+
+class SharedStore:
+    """
+    SQLite-backed cache and rate-limit state for multi-worker deployments.
+    Calls are synchronous: each is one indexed statement taking tens of
+    microseconds. If another worker holds the write lock past busy_timeout_ms,
+    operations fail open (a cache miss, a granted token) rather than stall.
+    """
+
+    def __init__(self, path: str = "", busy_timeout_ms: int = 50):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.errors = 0
+
+    @property
+    def shared(self) -> bool:
+        """True when backed by a file other workers can open"""
+        return bool(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # isolation_level=None: every statement commits on its own, holding the write lock briefly
+            connection = sqlite3.connect(self.path or ":memory:", check_same_thread=False,
+                                         isolation_level=None, timeout=self.busy_timeout_ms / 1000)
+            if self.path:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _wrote(self, connection: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            connection.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+            # A bucket untouched for an hour has refilled; dropping it changes nothing
+            connection.execute("DELETE FROM buckets WHERE updated_at <= ?", (now - 3600,))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared store read failed: {e}")
+            return None
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, now + ttl_seconds)
+                )
+                self._wrote(connection, now)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Shared store write failed: {e}")
+
+    def take_tokens(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Token bucket holding up to capacity tokens, refilled at rate per second.
+        Returns (allowed, seconds until cost tokens are available). A cost above
+        capacity takes a full bucket, so large requests are slowed, never refused forever.
+        """
+        cost = min(cost, capacity)
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                tokens, allowed = connection.execute(
+                    _TAKE_TOKENS, {"key": key, "rate": rate, "capacity": capacity, "cost": cost, "now": now}
+                ).fetchone()
+                self._wrote(connection, now)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            return True, 0.0
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) / rate if rate > 0 else float("inf")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> dict:
+        try:
+            with self._lock:
+                connection = self._connect()
+                keys = connection.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+                buckets = connection.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+        except sqlite3.Error:
+            keys = buckets = None
+        return {
+            "path": self.path or ":memory:",
+            "shared": self.shared,
+            "keys": keys,
+            "buckets": buckets,
+            "errors": self.errors
+        }
+
+
+# Global instance; SHARED_STORE_PATH is set for multi-worker runs (see main.py and gunicorn.conf.py)
+shared_store = SharedStore(get_settings().shared_store_path)
@@ -0,0 +1,112 @@
+"""
+Nearest-neighbour search over latitude/longitude points.
+
+Points are stored as unit vectors on the sphere, so straight-line (chord)
+distance orders them exactly like great-circle distance and a plain k-d
+tree works without special handling for longitude wrap-around.
+"""
+
+import heapq
+import math
+from operator import itemgetter
+from typing import Callable, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _to_xyz(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)
+
+
+def _chord_to_km(chord_squared: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+def _km_to_chord_squared(km: float) -> float:
+    if km >= math.pi * EARTH_RADIUS_KM:
+        return 4.0
+    return (2 * math.sin(km / (2 * EARTH_RADIUS_KM))) ** 2
+
+
+_AXIS_KEYS = (itemgetter(0), itemgetter(1), itemgetter(2))
+
+
+class KDTree(Generic[T]):
+    """
+    Static 3-d tree over (latitude, longitude, item) points.
+    Build is O(n log n); a nearest query visits O(log n) nodes for
+    well-spread points. Rebuild it when the points change.
+    """
+
+    __slots__ = ("_root", "size")
+
+    def __init__(self, points: Iterable[Tuple[float, float, T]]):
+        entries = [(*_to_xyz(latitude, longitude), item) for latitude, longitude, item in points]
+        self.size = len(entries)
+        self._root = self._build(entries, 0)
+
+    @classmethod
+    def _build(cls, entries: list, axis: int):
+        # Entry: (x, y, z, item); node: (xyz, item, axis, left, right)
+        if not entries:
+            return None
+        entries.sort(key=_AXIS_KEYS[axis])
+        middle = len(entries) // 2
+        next_axis = (axis + 1) % 3
+        x, y, z, item = entries[middle]
+        return (
+            (x, y, z), item, axis,
+            cls._build(entries[:middle], next_axis),
+            cls._build(entries[middle + 1:], next_axis)
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1,
+                predicate: Optional[Callable[[T], bool]] = None,
+                max_km: Optional[float] = None) -> List[Tuple[T, float]]:
+        """Up to k closest items (optionally only those passing predicate, within max_km), with km"""
+        if self._root is None or k <= 0:
+            return []
+        tx, ty, tz = _to_xyz(latitude, longitude)
+        target = (tx, ty, tz)
+        limit = _km_to_chord_squared(max_km) if max_km is not None else 4.0
+        # Max-heap of the best k so far: (-distance², tiebreak, item)
+        best: list = []
+        counter = 0
+        # (node, lower bound on distance² to anything under it)
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            worst = -best[0][0] if len(best) == k else limit
+            if bound > worst:
+                continue
+            point, item, axis, left, right = node
+            dx, dy, dz = point[0] - tx, point[1] - ty, point[2] - tz
+            distance = dx * dx + dy * dy + dz * dz
+            if distance <= worst and (predicate is None or predicate(item)):
+                counter += 1
+                if len(best) == k:
+                    heapq.heapreplace(best, (-distance, counter, item))
+                else:
+                    heapq.heappush(best, (-distance, counter, item))
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Far side first, so the near side is searched (and tightens the bound) before it
+            if far is not None:
+                stack.append((far, max(bound, diff * diff)))
+            if near is not None:
+                stack.append((near, bound))
+        best.sort(key=lambda entry: -entry[0])
+        return [(item, _chord_to_km(-negative)) for negative, _, item in best]
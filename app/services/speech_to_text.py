@@ -0,0 +1,252 @@
+"""
+Voice queries: offline speech-to-text on CPU.
+
+Clips are transcribed by faster-whisper in a worker process pool, so
+decoding and the model never block the event loop. Streaming uploads are
+cut at quiet points every few seconds and each piece is transcribed while
+the rest of the clip is still arriving.
+"""
+
+import asyncio
+import logging
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import perf_counter
+from typing import Callable, List, Optional
+from app.config import get_settings
+from app.metrics import QUERY_STAGE_LATENCY, SPEECH_REAL_TIME_FACTOR
+from app.services import speech_worker
+from app.services.speech_worker import ModelLoadError
+from app.services.uploads import UploadTooLargeError
+
+logger = logging.getLogger(__name__)
+
+# Response language names used by the API, and Whisper's language codes
+WHISPER_LANGUAGES = {
+    "english": "en",
+    "hindi": "hi",
+    "marathi": "mr",
+    "gujarati": "gu",
+    "punjabi": "pa",
+    "bengali": "bn",
+    "telugu": "te",
+    "tamil": "ta",
+    "kannada": "kn",
+    "malayalam": "ml",
+    "urdu": "ur"
+}
+_LANGUAGE_NAMES = {code: name for name, code in WHISPER_LANGUAGES.items()}
+
+
+class SpeechUnavailableError(RuntimeError):
+    """faster-whisper or the speech model is missing"""
+
+
+def _quietest_cut(pcm: bytes, sample_rate: int, search_seconds: float = 1.0) -> int:
+    """Byte offset in the middle of the quietest 20 ms frame in the last search_seconds of PCM16"""
+    import numpy as np
+
+    frame = sample_rate // 50
+    samples = np.frombuffer(pcm, dtype="<i2")
+    window = min(len(samples), int(search_seconds * sample_rate)) // frame * frame
+    if window == 0:
+        return len(pcm)
+    tail = samples[len(samples) - window:].astype(np.float32).reshape(-1, frame)
+    quietest = int(np.argmin((tail * tail).mean(axis=1)))
+    return (len(samples) - window + quietest * frame + frame // 2) * 2
+
+
+class Transcript:
+    """Text of a voice clip and how long it took to produce"""
+
+    __slots__ = ("text", "language", "audio_seconds", "processing_seconds")
+
+    def __init__(self, text: str, language: Optional[str], audio_seconds: float, processing_seconds: float):
+        self.text = text
+        self.language = language
+        self.audio_seconds = audio_seconds
+        self.processing_seconds = processing_seconds
+
+    @property
+    def language_name(self) -> Optional[str]:
+        """Detected language as an API language name (e.g. "hindi")"""
+        return _LANGUAGE_NAMES.get(self.language)
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.processing_seconds / self.audio_seconds if self.audio_seconds else 0.0
+
+
+class SpeechService:
+    """Runs transcriptions in a process pool; each worker keeps its own model loaded"""
+
+    def __init__(self, transcribe: Optional[Callable] = None):
+        self.settings = get_settings()
+        # Module-level function run in the workers; replaceable for benchmarks
+        self.transcribe_fn = transcribe or speech_worker.transcribe
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._load_error: Optional[str] = None
+        self.clips = 0
+        self.audio_seconds = 0.0
+        self.processing_seconds = 0.0
+
+    @property
+    def unavailable_reason(self) -> Optional[str]:
+        if self._load_error is not None:
+            return self._load_error
+        modules = ("numpy", "faster_whisper") if self.transcribe_fn is speech_worker.transcribe else ("numpy",)
+        for module in modules:
+            if importlib.util.find_spec(module) is None:
+                return f"{module} is not installed"
+        return None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the server process runs threads that must not be forked mid-operation
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.settings.speech_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=speech_worker.init_worker,
+                initargs=(
+                    self.settings.speech_model,
+                    self.settings.speech_compute_type,
+                    self.settings.speech_threads,
+                    self.settings.speech_model_dir or None
+                )
+            )
+        return self._pool
+
+    async def transcribe(self, audio: bytes, sample_rate: Optional[int] = None,
+                         language: Optional[str] = None) -> Transcript:
+        """
+        Transcribe an encoded clip, or raw 16-bit mono PCM when sample_rate
+        is given. language is an API language name; None auto-detects.
+        Raises UploadRejectedError or SpeechUnavailableError.
+        """
+        reason = self.unavailable_reason
+        if reason is not None:
+            raise SpeechUnavailableError(reason)
+
+        start = perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            text, detected, seconds = await loop.run_in_executor(
+                self._get_pool(),
+                self.transcribe_fn,
+                audio,
+                sample_rate,
+                WHISPER_LANGUAGES.get((language or "").lower()),
+                self.settings.speech_beam_size,
+                self.settings.speech_max_seconds
+            )
+        except ModelLoadError as e:
+            # Missing weights will not appear on their own; stop sending clips until restart
+            self._load_error = str(e)
+            logger.error(f"❌ {e}")
+            raise SpeechUnavailableError(self._load_error)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            self._pool = None
+            raise
+        elapsed = perf_counter() - start
+
+        QUERY_STAGE_LATENCY.observe(elapsed, ("speech_to_text",))
+        if seconds:
+            SPEECH_REAL_TIME_FACTOR.observe(elapsed / seconds)
+        self.clips += 1
+        self.audio_seconds += seconds
+        self.processing_seconds += elapsed
+        return Transcript(text, detected, seconds, elapsed)
+
+    def stream(self, sample_rate: int, language: Optional[str] = None) -> "StreamingTranscription":
+        """Start transcribing a clip that arrives in PCM chunks"""
+        reason = self.unavailable_reason
+        if reason is not None:
+            raise SpeechUnavailableError(reason)
+        return StreamingTranscription(self, sample_rate, language)
+
+    async def check(self) -> Optional[bool]:
+        """Health check; None when speech-to-text is not configured"""
+        return None if self.unavailable_reason is not None else True
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "available": self.unavailable_reason is None,
+            "unavailable_reason": self.unavailable_reason,
+            "model": self.settings.speech_model,
+            "clips": self.clips,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "real_time_factor": round(self.processing_seconds / self.audio_seconds, 3) if self.audio_seconds else 0.0
+        }
+
+
+class StreamingTranscription:
+    """
+    Transcribes 16-bit mono PCM as it arrives. Once speech_segment_seconds
+    of audio is buffered, the buffer is cut at its quietest point (usually a
+    pause between words) and that piece goes to the pool, so by the end of
+    the upload only the last few seconds are left to transcribe.
+    """
+
+    def __init__(self, service: SpeechService, sample_rate: int, language: Optional[str] = None):
+        self.service = service
+        self.sample_rate = sample_rate
+        self.language = language
+        self._buffer = bytearray()
+        self._tasks: List[asyncio.Task] = []
+        self._reported = 0
+        self._received = 0
+        self._segment_bytes = int(service.settings.speech_segment_seconds * sample_rate) * 2
+        self._max_bytes = int(service.settings.speech_max_seconds * sample_rate) * 2
+
+    def feed(self, chunk: bytes):
+        """Add audio; raises UploadTooLargeError past speech_max_seconds"""
+        self._received += len(chunk)
+        if self._received > self._max_bytes:
+            limit = self.service.settings.speech_max_seconds
+            raise UploadTooLargeError(f"Voice clip is longer than {limit:g} seconds")
+        self._buffer += chunk
+        if len(self._buffer) >= self._segment_bytes:
+            cut = _quietest_cut(self._buffer, self.sample_rate)
+            self._submit(bytes(self._buffer[:cut]))
+            del self._buffer[:cut]
+
+    def _submit(self, pcm: bytes):
+        self._tasks.append(asyncio.create_task(self.service.transcribe(pcm, self.sample_rate, self.language)))
+
+    def ready(self) -> List[Transcript]:
+        """Pieces finished since the last call, in order (raises if one failed)"""
+        finished = []
+        while self._reported < len(self._tasks) and self._tasks[self._reported].done():
+            finished.append(self._tasks[self._reported].result())
+            self._reported += 1
+        return finished
+
+    async def finish(self) -> Transcript:
+        """Transcribe what is left and join the pieces; processing_seconds is the wait after the upload ended"""
+        start = perf_counter()
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        pieces = await asyncio.gather(*self._tasks)
+        return Transcript(
+            " ".join(piece.text for piece in pieces if piece.text),
+            next((piece.language for piece in pieces if piece.language), None),
+            sum(piece.audio_seconds for piece in pieces),
+            perf_counter() - start
+        )
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+# Global instance
+speech_service = SpeechService()
@@ -0,0 +1,102 @@
+"""
+Speech-to-text, run in worker processes.
+
+Each worker loads one faster-whisper (CTranslate2, int8) model on first use
+and keeps it for its lifetime. Kept free of app imports (apart from the
+dependency-free uploads module) so spawned workers start quickly;
+arguments and results are plain bytes, strings and floats.
+"""
+
+import io
+import time
+from typing import Optional, Tuple
+from app.services.uploads import UploadRejectedError
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+
+_config: dict = {}
+_model = None
+
+
+class AudioRejectedError(UploadRejectedError):
+    """The upload is not decodable audio"""
+
+
+class ModelLoadError(RuntimeError):
+    """The speech model could not be loaded (missing package or weights)"""
+
+
+def init_worker(model: str, compute_type: str, threads: int, model_dir: Optional[str]):
+    """Process pool initializer: remember the model settings (loading waits for the first clip)"""
+    _config.update(model=model, compute_type=compute_type, threads=threads, model_dir=model_dir)
+
+
+def _get_model():
+    global _model
+    if _model is None:
+        try:
+            from faster_whisper import WhisperModel
+
+            _model = WhisperModel(
+                _config.get("model", "base"),
+                device="cpu",
+                compute_type=_config.get("compute_type", "int8"),
+                cpu_threads=_config.get("threads", 2),
+                download_root=_config.get("model_dir")
+            )
+        except Exception as e:
+            detail = str(e).splitlines()[0] if str(e) else type(e).__name__
+            raise ModelLoadError(f"Could not load speech model {_config.get('model')!r}: {detail}")
+    return _model
+
+
+def pcm_to_float(pcm: bytes, sample_rate: int):
+    """16-bit little-endian mono PCM to float32 samples at 16 kHz"""
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_rate != SAMPLE_RATE and len(samples):
+        # Linear interpolation is plenty for speech recognition input
+        duration = len(samples) / sample_rate
+        positions = np.arange(0, duration, 1 / SAMPLE_RATE) * sample_rate
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def warm_up() -> float:
+    """Load the model ahead of the first clip; returns the load time in seconds"""
+    start = time.perf_counter()
+    _get_model()
+    return time.perf_counter() - start
+
+
+def transcribe(audio: bytes, sample_rate: Optional[int], language: Optional[str],
+               beam_size: int = 1, max_seconds: float = 120.0) -> Tuple[str, str, float]:
+    """
+    Transcribe raw PCM (when sample_rate is given) or an encoded clip
+    (WAV, OGG/Opus, MP3, M4A...). Returns (text, language, audio seconds).
+    """
+    if sample_rate:
+        samples = pcm_to_float(audio, sample_rate)
+    else:
+        from faster_whisper import decode_audio
+
+        try:
+            samples = decode_audio(io.BytesIO(audio), sampling_rate=SAMPLE_RATE)
+        except Exception as e:
+            raise AudioRejectedError(f"Unsupported or corrupt audio: {e}")
+    if not len(samples):
+        return "", language or "", 0.0
+    if len(samples) > max_seconds * SAMPLE_RATE:
+        raise AudioRejectedError(f"Voice clip is longer than {max_seconds:g} seconds")
+    model = _get_model()
+    segments, info = model.transcribe(
+        samples,
+        language=language,
+        beam_size=beam_size,
+        # Clips are short, single-question utterances; context carry-over only adds hallucinations
+        condition_on_previous_text=False,
+        vad_filter=True
+    )
+    text = " ".join(segment.text.strip() for segment in segments)
+    return text.strip(), info.language, len(samples) / SAMPLE_RATE
@@ -0,0 +1,421 @@
+"""
+Answers in the farmer's language.
+
+The LLM is prompted in the farmer's language directly (see prompts.py), so
+a normal answer needs no translation. Text that only exists in English,
+curated FAQ answers and the offline advisory rules, is translated here:
+first by the LLM, or offline from phrase glossaries in
+TRANSLATION_GLOSSARY_DIR. Complete translations are cached per (answer
+hash, language), in process and in the shared store, so a repeated
+advisory is translated once.
+
+The question's language is detected from its script: a question typed in
+Devanagari, Gurmukhi, Tamil, etc. is answered in that language even when
+the request left `language` at its English default.
+"""
+
+import os
+import re
+import csv
+import hashlib
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import get_settings
+from app.services.llm_backends import LLMChain
+from app.services.prompts import LANGUAGES
+from app.services.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+# ISO 639-1 codes (as sent by phones and Whisper) for the API language names
+LANGUAGE_CODES = {
+    "en": "english",
+    "hi": "hindi",
+    "mr": "marathi",
+    "gu": "gujarati",
+    "pa": "punjabi",
+    "bn": "bengali",
+    "te": "telugu",
+    "ta": "tamil",
+    "kn": "kannada",
+    "ml": "malayalam",
+    "ur": "urdu",
+}
+
+# Unicode blocks of the scripts Indian languages are written in
+_SCRIPTS = [
+    (0x0900, 0x097F, "hindi"),  # Devanagari; Marathi is told apart by its function words
+    (0x0980, 0x09FF, "bengali"),
+    (0x0A00, 0x0A7F, "punjabi"),
+    (0x0A80, 0x0AFF, "gujarati"),
+    (0x0B80, 0x0BFF, "tamil"),
+    (0x0C00, 0x0C7F, "telugu"),
+    (0x0C80, 0x0CFF, "kannada"),
+    (0x0D00, 0x0D7F, "malayalam"),
+    (0x0600, 0x06FF, "urdu"),
+]
+
+# Common words that are Marathi rather than Hindi
+_MARATHI_WORDS = frozenset({
+    "आहे", "आहेत", "काय", "कसे", "कशी", "कसा", "मध्ये", "माझ्या", "माझे", "माझी", "आणि", "नाही",
+    "करावी", "करावे", "करावा", "कोणते", "कोणती", "किती", "पिकावर", "शेतात", "वर", "साठी", "पाहिजे",
+})
+_HINDI_WORDS = frozenset({
+    "है", "हैं", "क्या", "कैसे", "में", "मेरे", "मेरी", "मेरा", "और", "नहीं", "करें", "कौन", "कितना",
+    "के", "की", "का", "लिए", "चाहिए", "पर",
+})
+
+# Words in any of the scripts above, including their vowel signs (which \w does not match)
+_WORDS = re.compile(r"[A-Za-z0-9]+|[\u0600-\u06FF\u0900-\u0963\u0966-\u0D7F]+")
+# Sentence ends in English and in Indic scripts (danda)
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+# Numbered or bulleted list markers kept as they are
+_LIST_MARKER = re.compile(r"^(\s*(?:\d+[.)]|[-*•])\s+)")
+_SLOT = re.compile(r"\{(\w+)\}")
+
+TRANSLATE_PROMPT = (
+    "Translate the farm advisory below from English into {language}, in simple words a farmer would use. "
+    "Keep numbers, doses, units, dates, product and chemical names, and the numbered list, unchanged. "
+    "Reply with the translation only."
+)
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """API language name for a name or ISO code ("Hindi", "hi", "hi-IN"); None when unknown or "auto" """
+    if not language:
+        return None
+    language = language.strip().lower()
+    if language in LANGUAGES:
+        return language
+    return LANGUAGE_CODES.get(language.split("-")[0].split("_")[0])
+
+
+def detect_language(text: str) -> str:
+    """Language of the text from its script; Latin script (and anything unrecognised) is English"""
+    counts: Dict[str, int] = {}
+    latin = 0
+    for char in text:
+        code = ord(char)
+        if code < 0x80:
+            latin += char.isalpha()
+            continue
+        for start, end, language in _SCRIPTS:
+            if start <= code <= end:
+                counts[language] = counts.get(language, 0) + 1
+                break
+    if not counts:
+        return "english"
+    language, count = max(counts.items(), key=lambda item: item[1])
+    # Mostly Latin with a stray Indic word (a crop name) is still an English question
+    if count < latin:
+        return "english"
+    if language == "hindi":
+        words = set(_WORDS.findall(text))
+        if len(words & _MARATHI_WORDS) > len(words & _HINDI_WORDS):
+            return "marathi"
+    return language
+
+
+def resolve_language(requested: Optional[str], query: str) -> str:
+    """
+    Language to answer in: the requested one, unless it is missing, "auto"
+    or the English default while the question is written in an Indian script.
+    """
+    language = normalize_language(requested)
+    if language is None or language == "english":
+        detected = detect_language(query)
+        if detected != "english":
+            return detected
+    return language or "english"
+
+
+class Translation:
+    """A translated text; complete is False when some sentences were left in English"""
+
+    __slots__ = ("text", "complete", "translator")
+
+    def __init__(self, text: str, complete: bool, translator: str):
+        self.text = text
+        self.complete = complete
+        self.translator = translator
+
+
+class Glossary:
+    """
+    Offline phrase tables, one TSV per language (`english<TAB>translation`).
+    Entries are whole sentences, sentence templates with {slots} (filled
+    from the term entries), or single terms. Terms also map a question back
+    to English words for the knowledge base search.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._sentences: Dict[str, Dict[str, str]] = {}
+        self._templates: Dict[str, List[Tuple[re.Pattern, str]]] = {}
+        self._terms: Dict[str, Dict[str, str]] = {}
+        self._reverse: Dict[str, Dict[Tuple[str, ...], str]] = {}
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        """Read every <language>.tsv in the directory (blocking)"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._read()
+                self._loaded = True
+
+    def _read(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            language, extension = os.path.splitext(name)
+            if extension != ".tsv" or language not in LANGUAGES:
+                continue
+            sentences, templates, terms, reverse = {}, [], {}, {}
+            with open(os.path.join(self.directory, name), encoding="utf-8", newline="") as f:
+                for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+                    if len(row) != 2 or row[0].startswith("#"):
+                        continue
+                    english, translated = row[0].strip(), row[1].strip()
+                    if _SLOT.search(english):
+                        templates.append((_template_pattern(english), translated))
+                    elif english[-1] in ".!?:":
+                        sentences[_key(english)] = translated
+                    else:
+                        # The first translation listed for a term is the one used in answers
+                        terms.setdefault(english.lower(), translated)
+                        reverse[tuple(_WORDS.findall(translated))] = english.lower()
+            self._sentences[language] = sentences
+            # Longest templates first, so "for your {crop} crop in {place}" wins over "in {place}"
+            self._templates[language] = sorted(templates, key=lambda item: -len(item[0].pattern))
+            self._terms[language] = terms
+            self._reverse[language] = reverse
+        logger.info(f"✅ Translation glossaries loaded: {', '.join(self._sentences) or 'none'}")
+
+    @property
+    def languages(self) -> List[str]:
+        self.load()
+        return list(self._sentences)
+
+    def translate(self, text: str, language: str) -> Translation:
+        """Translate line by line, sentence by sentence; unknown sentences stay in English"""
+        self.load()
+        sentences = self._sentences.get(language)
+        if sentences is None:
+            return Translation(text, False, "glossary")
+        complete = True
+        lines = []
+        for line in text.split("\n"):
+            marker = _LIST_MARKER.match(line)
+            prefix = marker.group(1) if marker else ""
+            body = line[len(prefix):]
+            if not body.strip():
+                lines.append(line)
+                continue
+            translated = self._sentence(body, language)
+            if translated is None:
+                parts = []
+                for sentence in _SENTENCE_END.split(body.strip()):
+                    part = self._sentence(sentence, language)
+                    complete = complete and part is not None
+                    parts.append(part if part is not None else sentence)
+                translated = " ".join(parts)
+            lines.append(prefix + translated)
+        return Translation("\n".join(lines), complete, "glossary")
+
+    def _sentence(self, sentence: str, language: str) -> Optional[str]:
+        translated = self._sentences[language].get(_key(sentence))
+        if translated is not None:
+            return translated
+        terms = self._terms[language]
+        for pattern, template in self._templates[language]:
+            match = pattern.match(sentence.strip())
+            if match:
+                return template.format(**{
+                    slot: terms.get(value.strip().lower(), value.strip()) for slot, value in match.groupdict().items()
+                })
+        return None
+
+    def to_english(self, text: str, language: str) -> str:
+        """English words for the glossary terms in a question (for the knowledge base search)"""
+        self.load()
+        reverse = self._reverse.get(language)
+        if not reverse:
+            return ""
+        words = _WORDS.findall(text)
+        found = []
+        i = 0
+        while i < len(words):
+            # Longest term first: "गोबर की खाद" before "खाद"
+            for size in (3, 2, 1):
+                english = reverse.get(tuple(words[i:i + size]))
+                if english is not None:
+                    found.append(english)
+                    i += size
+                    break
+            else:
+                if words[i].isascii():
+                    found.append(words[i])
+                i += 1
+        return " ".join(found)
+
+
+def _key(sentence: str) -> str:
+    return " ".join(sentence.lower().split())
+
+
+def _template_pattern(english: str) -> re.Pattern:
+    """Regex for a glossary sentence with {slots}; each slot captures the text in its place"""
+    parts = _SLOT.split(english)
+    pattern = "".join(re.escape(part) if i % 2 == 0 else f"(?P<{part}>.+?)" for i, part in enumerate(parts))
+    return re.compile(f"^{pattern}$", re.IGNORECASE)
+
+
+class TranslationService:
+    """
+    Translates English-only answers with the first translator that gives a
+    complete translation (the LLM chain, then the glossaries), caching the
+    result. Concurrent requests for the same translation share one call.
+    """
+
+    def __init__(self, glossary: Glossary, chain: Optional[LLMChain] = None, translators: str = "llm,glossary",
+                 max_entries: int = 2048, ttl_seconds: float = 604800, shared: Optional[SharedStore] = None,
+                 llm_limit: Optional[asyncio.Semaphore] = None):
+        self.glossary = glossary
+        self.chain = chain
+        # Shared with the answer LLM calls, so translations count against the same concurrency limit
+        self.llm_limit = llm_limit
+        self.translators = [name.strip() for name in translators.split(",") if name.strip()]
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.translated: Dict[str, int] = {}
+        self.incomplete = 0
+
+    @staticmethod
+    def _cache_key(text: str, language: str) -> str:
+        return f"translation:{language}:{hashlib.sha256(text.encode()).hexdigest()[:32]}"
+
+    async def translate(self, text: str, language: str) -> Translation:
+        """The text in `language`; English, or a best-effort glossary translation, when nothing does better"""
+        if language == "english" or not text:
+            return Translation(text, True, "none")
+        key = self._cache_key(text, language)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return Translation(cached, True, "cache")
+        if self.shared is not None:
+            payload = self.shared.get(key)
+            if payload is not None:
+                self._remember(key, payload.decode())
+                self.hits_shared += 1
+                return Translation(payload.decode(), True, "cache")
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            self.misses += 1
+            result = await self._translate(text, language)
+            if result.complete:
+                self._remember(key, result.text)
+                if self.shared is not None:
+                    self.shared.set(key, result.text.encode(), self.ttl_seconds)
+            else:
+                self.incomplete += 1
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters see the failure; nobody may be waiting, so do not warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _translate(self, text: str, language: str) -> Translation:
+        partial = None
+        for name in self.translators:
+            if name == "llm" and self.chain is not None:
+                result = await self._llm_translate(text, language)
+            elif name == "glossary":
+                result = self.glossary.translate(text, language)
+            else:
+                continue
+            if result is None:
+                continue
+            if result.complete:
+                self.translated[result.translator] = self.translated.get(result.translator, 0) + 1
+                return result
+            partial = partial or result
+        return partial or Translation(text, False, "none")
+
+    async def _llm_translate(self, text: str, language: str) -> Optional[Translation]:
+        messages = [("system", TRANSLATE_PROMPT.format(language=LANGUAGES[language])), ("human", text)]
+        try:
+            if self.llm_limit is not None:
+                async with self.llm_limit:
+                    translated, backend = await self.chain.complete(messages)
+            else:
+                translated, backend = await self.chain.complete(messages)
+        except Exception as e:
+            logger.warning(f"LLM translation to {language} failed: {e}")
+            return None
+        # The offline rules answer farm questions, they do not translate
+        if not backend.multilingual or not translated.strip():
+            return None
+        return Translation(translated.strip(), True, "llm")
+
+    def to_english(self, query: str, language: str) -> str:
+        """The question as English search terms, from the glossary (no LLM call on the request path)"""
+        return self.glossary.to_english(query, language)
+
+    def _remember(self, key: str, text: str):
+        self._cache[key] = text
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.hits_shared + self.misses
+        return {
+            "translators": self.translators,
+            "glossary_languages": self.glossary.languages,
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "translated": dict(self.translated),
+            "incomplete": self.incomplete,
+            "hit_rate": round((self.hits + self.hits_shared) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def build_translation_service(chain: Optional[LLMChain], shared: Optional[SharedStore] = None,
+                              llm_limit: Optional[asyncio.Semaphore] = None) -> TranslationService:
+    settings = get_settings()
+    return TranslationService(
+        Glossary(settings.translation_glossary_dir),
+        chain=chain,
+        translators=settings.translation_backends,
+        max_entries=settings.translation_cache_max_entries,
+        ttl_seconds=settings.translation_cache_ttl_seconds,
+        shared=shared,
+        llm_limit=llm_limit
+    )
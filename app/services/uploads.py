@@ -0,0 +1,35 @@
+"""
+Base64 media uploads (photos, voice clips) sent inside JSON request bodies.
+
+Dependency-free so the process-pool workers can import its exceptions
+without loading the app.
+"""
+
+import binascii
+
+
+class UploadRejectedError(ValueError):
+    """The upload cannot be used (bad encoding, unsupported format, too long)"""
+
+
+class UploadTooLargeError(UploadRejectedError):
+    """The decoded upload would exceed the configured byte limit"""
+
+
+def decode_base64(data: str, max_bytes: int) -> bytes:
+    """Decode base64 (or a data: URL) after checking the decoded size would fit"""
+    start = 0
+    if data.startswith("data:"):
+        start = data.find(",") + 1
+        if start == 0:
+            raise UploadRejectedError("Malformed data URL")
+    if (len(data) - start) * 3 // 4 > max_bytes:
+        raise UploadTooLargeError(f"Upload is larger than {max_bytes / 1_000_000:g} MB")
+    try:
+        # a2b_base64 reads an ASCII str directly, so the text is not first re-encoded to bytes
+        decoded = binascii.a2b_base64(data[start:] if start else data)
+    except (binascii.Error, ValueError) as e:
+        raise UploadRejectedError(f"Invalid base64 data: {e}")
+    if not decoded:
+        raise UploadRejectedError("Upload is empty")
+    return decoded
@@ -0,0 +1,146 @@
+"""
+Response encodings for the mobile app on metered data.
+
+Farmer query routes answer in MessagePack or CBOR when the Accept header
+prefers them to JSON (see CompactRoute), and constant endpoints are
+served with an ETag so a client's repeat request costs a 304 and no body.
+"""
+
+import json
+import hashlib
+import importlib
+import importlib.util
+from contextvars import ContextVar
+from typing import Callable, Dict, Mapping, Optional
+from fastapi.routing import APIRoute
+from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import Response
+from app.config import get_settings
+
+settings = get_settings()
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# Media types clients send for each compact format, and the optional package that encodes it
+_ALIASES = {
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor": CBOR,
+}
+_PACKAGES = {MSGPACK: ("msgpack", "packb"), CBOR: ("cbor2", "dumps")}
+
+# Set per request by CompactRoute, read when NegotiatedResponse renders the body
+_wire_format: ContextVar[Optional[str]] = ContextVar("wire_format", default=None)
+
+_encoders: Dict[str, Optional[Callable[[object], bytes]]] = {}
+
+
+def _encoder(media_type: str) -> Optional[Callable[[object], bytes]]:
+    """The installed encoder for a compact format, imported on first use"""
+    if media_type not in _encoders:
+        package, function = _PACKAGES[media_type]
+        if importlib.util.find_spec(package) is None:
+            _encoders[media_type] = None
+        else:
+            _encoders[media_type] = getattr(importlib.import_module(package), function)
+    return _encoders[media_type]
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """The compact media type the client prefers to JSON, or None to answer in JSON"""
+    # Fast path: nearly every request is a JSON client
+    if not settings.compact_encoding_enabled or not accept or ("msgpack" not in accept and "cbor" not in accept):
+        return None
+    best, best_q, json_q = None, 0.0, 0.0
+    for item in accept.split(","):
+        media_type, _, params = item.strip().partition(";")
+        media_type = media_type.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in (JSON, "application/*", "*/*"):
+            json_q = max(json_q, q)
+        elif media_type in _ALIASES and q > best_q and _encoder(_ALIASES[media_type]) is not None:
+            best, best_q = _ALIASES[media_type], q
+    return best if best is not None and best_q >= json_q else None
+
+
+def _without_nulls(value):
+    # Compact clients read a missing field as null, so nulls are not worth their bytes
+    if isinstance(value, dict):
+        return {key: _without_nulls(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [_without_nulls(item) for item in value]
+    return value
+
+
+class NegotiatedResponse(JSONResponse):
+    """JSON, or MessagePack / CBOR when the request was negotiated to one by CompactRoute"""
+
+    # Same signature as JSONResponse: FastAPI reads the status_code default from it for the OpenAPI schema
+    def __init__(self, content, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 media_type: Optional[str] = None, background: Optional[BackgroundTask] = None):
+        self.media_type = _wire_format.get() or JSON
+        super().__init__(content, status_code, headers, media_type, background)
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content) -> bytes:
+        if self.media_type == JSON:
+            return super().render(content)
+        return _encoder(self.media_type)(_without_nulls(content))
+
+
+class CompactRoute(APIRoute):
+    """
+    Route class for routers whose default_response_class is NegotiatedResponse:
+    picks the wire format from the Accept header before the endpoint's return
+    value is serialized. Responses an endpoint builds itself (streams, errors)
+    are unaffected.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            token = _wire_format.set(negotiate(request.headers.get("accept")))
+            try:
+                return await handler(request)
+            finally:
+                _wire_format.reset(token)
+
+        return negotiated_handler
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: the compression middleware marks ETags of compressed bodies weak
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class StaticJSON:
+    """A constant JSON body served with an ETag and Cache-Control; revalidations get 304 Not Modified"""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, content, max_age_seconds: int):
+        self.body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+        self.headers = {"ETag": self.etag, "Cache-Control": f"public, max-age={max_age_seconds}"}
+
+    def response(self, request: Request) -> Response:
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type=JSON, headers=self.headers)
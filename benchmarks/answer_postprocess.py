@@ -0,0 +1,218 @@
+"""
+Answer post-processing benchmark
+Builds a corpus of large answers from the bundled advisories, FAQ answers
+and offline tips, then times the single-pass AnswerPostProcessor against
+the original confidence scoring and suggestion extraction, alone and with
+the extras found by one extra regex pass each. Streamed answers are fed
+chunk by chunk and compared with re-running the original code on the text
+received so far after every chunk. Checks that streamed and whole answers
+give the same result and that known doses, timings and chemicals are found.
+
+Run: python benchmarks/answer_postprocess.py
+"""
+
+import csv
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm_backends import _STUB_ADVICE
+from app.services.postprocess import CHEMICAL_SAFETY, AnswerPostProcessor, analyze_answer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANSWERS = 100
+ANSWER_CHARS = (8000, 16000)
+CHUNK_CHARS = 24  # a few LLM tokens per streamed chunk
+STREAMED_ANSWERS = 10
+MIN_STREAM_SPEEDUP = 10.0
+
+
+def legacy_calculate_confidence(response: str, query: str) -> float:
+    """The original implementation, kept here for comparison"""
+    confidence = 0.7
+
+    if len(response) > 100:
+        confidence += 0.1
+    if any(word in response.lower() for word in ['recommend', 'suggest', 'should', 'can']):
+        confidence += 0.1
+    if any(word in response.lower() for word in ['kg/acre', 'ml/liter', 'days', 'weeks']):
+        confidence += 0.1
+
+    return min(confidence, 1.0)
+
+
+def legacy_extract_suggestions(response: str):
+    """The original implementation, kept here for comparison"""
+    suggestions = []
+
+    lines = response.split('\n')
+    for line in lines:
+        line = line.strip()
+        if line.startswith(('•', '-', '*')) or (line and line[0].isdigit() and '.' in line):
+            suggestion = line.lstrip('•-*0123456789. ')
+            if suggestion and len(suggestion) > 10:
+                suggestions.append(suggestion)
+
+    return suggestions[:3]
+
+
+# The extras as the original code would have grown them: one more pass each
+SEPARATE_PASSES = [
+    re.compile(r"\d+(?:\.\d+)?(?:\s*(?:-|to)\s*\d+(?:\.\d+)?)?\s*(?:kg|g|ml|l|liters?|tonnes?|quintals?)"
+               r"(?:\s+\w+){0,3}?\s*(?:/|per)\s*(?:acre|ha|hectare|liter|kg|plant)", re.IGNORECASE),
+    re.compile(r"\d+(?:\s*(?:-|to)\s*\d+)?\s*(?:hours?|days?|weeks?|months?|years?)", re.IGNORECASE),
+    re.compile(r"\b(?:" + "|".join(re.escape(name) for name in CHEMICAL_SAFETY) + r")\b", re.IGNORECASE),
+]
+
+
+def legacy_with_extras(answer: str):
+    return (legacy_calculate_confidence(answer, ""), legacy_extract_suggestions(answer),
+            [pattern.findall(answer) for pattern in SEPARATE_PASSES])
+
+
+def load_sentences():
+    sentences = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "data", "agronomy", "*.md"))):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip() and not line.startswith(("#", "Source:")):
+                    sentences.extend(re.split(r"(?<=\.)\s+", line.strip()))
+    with open(os.path.join(ROOT, "data", "agronomy", "faq.csv"), encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sentences.extend(re.split(r"(?<=\.)\s+", row["Answer"]))
+    for tips in _STUB_ADVICE.values():
+        sentences.extend(tips)
+    return [sentence for sentence in sentences if sentence]
+
+
+def build_corpus(sentences):
+    """Long LLM-style answers: paragraphs, numbered steps and bullet points"""
+    rng = random.Random(7)
+    corpus = []
+    for _ in range(ANSWERS):
+        target = rng.randint(*ANSWER_CHARS)
+        parts, size = [], 0
+        while size < target:
+            style = rng.random()
+            if style < 0.4:
+                block = " ".join(rng.sample(sentences, 4))
+            elif style < 0.7:
+                block = "\n".join(f"{n}. {s}" for n, s in enumerate(rng.sample(sentences, 4), start=1))
+            else:
+                block = "\n".join(f"- **{s}**" if rng.random() < 0.3 else f"• {s}" for s in rng.sample(sentences, 3))
+            parts.append(block)
+            size += len(block) + 2
+        corpus.append("\n\n".join(parts))
+    return corpus
+
+
+def chunks(text: str):
+    return [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+
+
+def timed(function, corpus) -> float:
+    start = time.perf_counter()
+    for answer in corpus:
+        function(answer)
+    return time.perf_counter() - start
+
+
+def streamed(answer: str):
+    processor = AnswerPostProcessor()
+    for chunk in chunks(answer):
+        processor.feed(chunk)
+    return processor.finish()
+
+
+def legacy_streamed(answer: str):
+    """What the original code costs when re-run on the text received so far after every chunk"""
+    received = ""
+    for chunk in chunks(answer):
+        received += chunk
+        legacy_calculate_confidence(received, "")
+        legacy_extract_suggestions(received)
+
+
+def known_extras() -> bool:
+    """Doses, timings and chemicals that must be found in the curated FAQ answers"""
+    with open(os.path.join(ROOT, "data", "agronomy", "faq.csv"), encoding="utf-8", newline="") as f:
+        answers = {row["Question"]: row["Answer"] for row in csv.DictReader(f)}
+    aphids = analyze_answer(answers["How do I control aphids in mustard?"]).extras
+    sowing = analyze_answer(answers["When is the best time to sow wheat?"]).extras
+
+    chemicals = {chemical.name: chemical for chemical in aphids.chemicals}
+    checks = [
+        ("dimethoate 30 EC flagged bee_toxic", "dimethoate" in chemicals
+         and chemicals["dimethoate"].formulation == "30 EC" and "bee_toxic" in chemicals["dimethoate"].safety_flags),
+        ("imidacloprid 17.8 SL", "imidacloprid" in chemicals and chemicals["imidacloprid"].formulation == "17.8 SL"),
+        ("1 ml per liter", any(d.amount == 1 and d.unit == "ml" and d.per == "liter" for d in aphids.dosages)),
+        ("0.25 ml per liter", any(d.amount == 0.25 for d in aphids.dosages)),
+        ("5 to 25 October", any(w.text == "5 to 25 October" for w in aphids.time_windows)),
+        ("1 to 25 November", any(w.text == "1 to 25 November" for w in sowing.time_windows)),
+        ("last week of October", any(w.text.startswith("last week of October") for w in sowing.time_windows)),
+    ]
+    ok = True
+    for name, found in checks:
+        print(f"{'✅' if found else '❌'} Found {name}")
+        ok &= found
+    return ok
+
+
+def main() -> bool:
+    print("🧪 Answer post-processing")
+    print("=" * 50)
+    corpus = build_corpus(load_sentences())
+    total_kb = sum(len(answer) for answer in corpus) / 1024
+    print(f"Corpus: {len(corpus)} answers, {total_kb:.0f} KB")
+
+    legacy = timed(lambda answer: (legacy_calculate_confidence(answer, ""), legacy_extract_suggestions(answer)), corpus)
+    separate = timed(legacy_with_extras, corpus)
+    single = timed(analyze_answer, corpus)
+    incremental = timed(streamed, corpus)
+    print(f"Original scoring, no extras:       {legacy / total_kb * 1e6:7.1f} µs/KB")
+    print(f"Original + one pass per extra:     {separate / total_kb * 1e6:7.1f} µs/KB")
+    print(f"Single pass, whole answers:        {single / total_kb * 1e6:7.1f} µs/KB")
+    print(f"Single pass, {CHUNK_CHARS}-char chunks:        {incremental / total_kb * 1e6:7.1f} µs/KB")
+
+    sample = corpus[:STREAMED_ANSWERS]
+    rerun = timed(legacy_streamed, sample)
+    fed = timed(streamed, sample)
+    speedup = rerun / fed
+    print(f"Streaming {len(sample)} answers: original re-run per chunk {rerun * 1000:.1f} ms, "
+          f"fed chunk by chunk {fed * 1000:.1f} ms ({speedup:.0f}x)")
+
+    ok = True
+    mismatched = 0
+    extras = {"dosages": 0, "time_windows": 0, "chemicals": 0, "flagged": 0}
+    for answer in corpus:
+        whole, parts = analyze_answer(answer), streamed(answer)
+        if (whole.confidence, whole.suggestions, whole.extras) != (parts.confidence, parts.suggestions, parts.extras):
+            mismatched += 1
+        extras["dosages"] += len(whole.extras.dosages)
+        extras["time_windows"] += len(whole.extras.time_windows)
+        extras["chemicals"] += len(whole.extras.chemicals)
+        extras["flagged"] += sum(1 for chemical in whole.extras.chemicals if chemical.safety_flags)
+    print(f"Extras per answer: {', '.join(f'{k} {v / len(corpus):.1f}' for k, v in extras.items())}")
+
+    print(f"{'✅' if not mismatched else '❌'} Streamed and whole answers agree ({mismatched} differ)")
+    ok &= not mismatched
+    if single > separate:
+        print("❌ Single pass slower than separate extraction passes")
+        ok = False
+    if speedup < MIN_STREAM_SPEEDUP:
+        print(f"❌ Streaming speedup under {MIN_STREAM_SPEEDUP:.0f}x")
+        ok = False
+    ok &= known_extras()
+
+    print("\n🎉 Post-processing benchmark passed" if ok else "\n❌ Post-processing benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
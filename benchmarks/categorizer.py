@@ -0,0 +1,124 @@
+"""
+Micro-benchmark for the query categorizer
+Compares the precompiled single-pass QueryCategorizer with the original
+per-call keyword scan, shows where their answers differ, and checks the
+categorizer against a set of labelled queries.
+
+Run: python benchmarks/categorizer.py
+"""
+
+import os
+import sys
+import timeit
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import QueryCategory
+from app.services.categorizer import query_categorizer
+
+QUERIES = [
+    "How to control aphids on mustard?",
+    "When should I sow wheat in Punjab?",
+    "What is the best fertilizer dose of nitrogen for paddy?",
+    "My tomato plants have yellow spots on leaves",
+    "soil nutrients for cotton",
+    "How much phosphorus should I apply to soybean?",
+    "Is there any training program for drip irrigation?",
+    "gehu ka bhav kya hai mandi me",
+    "कपास में कीट का प्रकोप बढ़ गया है",
+    "टोमॅटो पिकाला पाणी किती द्यावे",
+    "Should I irrigate my crops before expected rain?",
+    "What is the current onion market price in Lasalgaon?",
+]
+ITERATIONS = 20000
+
+# Queries with the category they must get; includes pesticide names, pest
+# stems and inflected words ("wilting", "rainy") that whole-word matching
+# once sent to GENERAL
+LABELLED = [
+    ("How to control aphids on mustard?", QueryCategory.PEST_DISEASE),
+    ("Which pesticide should I spray on cotton?", QueryCategory.PEST_DISEASE),
+    ("Best fungicide for tomato", QueryCategory.PEST_DISEASE),
+    ("Pink bollworm in cotton", QueryCategory.PEST_DISEASE),
+    ("Whiteflies on chilli", QueryCategory.PEST_DISEASE),
+    ("insecticides for bollworm", QueryCategory.PEST_DISEASE),
+    ("Which herbicide kills weeds in soybean?", QueryCategory.PEST_DISEASE),
+    ("leaf curl in chilli", QueryCategory.PEST_DISEASE),
+    ("कपास में कीट का प्रकोप बढ़ गया है", QueryCategory.PEST_DISEASE),
+    ("When should I sow wheat in Punjab?", QueryCategory.CROP_MANAGEMENT),
+    ("What is the best fertilizer dose of nitrogen for paddy?", QueryCategory.FERTILIZER),
+    ("How much phosphorus should I apply to soybean?", QueryCategory.FERTILIZER),
+    ("Is there any training program for drip irrigation?", QueryCategory.IRRIGATION),
+    ("टोमॅटो पिकाला पाणी किती द्यावे", QueryCategory.IRRIGATION),
+    ("gehu ka bhav kya hai mandi me", QueryCategory.MARKET_PRICE),
+    ("What is the current onion market price in Lasalgaon?", QueryCategory.MARKET_PRICE),
+    ("Will it rain this week?", QueryCategory.WEATHER),
+    ("How do I get a soil test done?", QueryCategory.SOIL_HEALTH),
+    ("my cotton plants are wilting", QueryCategory.PEST_DISEASE),
+    ("leaves are rotting", QueryCategory.PEST_DISEASE),
+    ("fruits are rotten", QueryCategory.PEST_DISEASE),
+    ("irrigating sugarcane", QueryCategory.IRRIGATION),
+    ("harvested onion", QueryCategory.CROP_MANAGEMENT),
+    ("rainy tomorrow", QueryCategory.WEATHER),
+    ("marketing my soybean", QueryCategory.MARKET_PRICE),
+    ("fertilizing paddy", QueryCategory.FERTILIZER),
+    ("weeding in wheat", QueryCategory.CROP_MANAGEMENT),
+]
+
+
+def legacy_determine_category(query: str) -> QueryCategory:
+    """The original implementation, kept here for comparison"""
+    query_lower = query.lower()
+
+    keywords = {
+        QueryCategory.PEST_DISEASE: ['pest', 'disease', 'insect', 'fungus', 'virus', 'infection', 'spots', 'worm', 'aphid'],
+        QueryCategory.CROP_MANAGEMENT: ['planting', 'harvesting', 'cultivation', 'growing', 'yield', 'variety', 'seed'],
+        QueryCategory.WEATHER: ['weather', 'rain', 'temperature', 'season', 'monsoon', 'drought', 'flood'],
+        QueryCategory.SOIL_HEALTH: ['soil', 'nutrients', 'ph', 'organic matter', 'testing', 'fertility'],
+        QueryCategory.IRRIGATION: ['water', 'irrigation', 'watering', 'drip', 'sprinkler', 'drought'],
+        QueryCategory.FERTILIZER: ['fertilizer', 'nutrients', 'nitrogen', 'phosphorus', 'potassium', 'manure'],
+        QueryCategory.MARKET_PRICE: ['price', 'market', 'selling', 'cost', 'profit', 'revenue']
+    }
+
+    for category, words in keywords.items():
+        if any(word in query_lower for word in words):
+            return category
+
+    return QueryCategory.GENERAL
+
+
+def main():
+    print("🧪 Categorizer micro-benchmark")
+    print("=" * 50)
+
+    legacy = timeit.timeit(
+        lambda: [legacy_determine_category(q) for q in QUERIES], number=ITERATIONS
+    )
+    compiled = timeit.timeit(
+        lambda: [query_categorizer.categorize(q) for q in QUERIES], number=ITERATIONS
+    )
+    calls = ITERATIONS * len(QUERIES)
+    print(f"Legacy scan:  {legacy / calls * 1e6:6.2f} µs/query (first match only)")
+    print(f"Compiled:     {compiled / calls * 1e6:6.2f} µs/query (all categories scored)")
+
+    print("\nQuery                                              legacy            compiled")
+    for query in QUERIES:
+        old = legacy_determine_category(query).value
+        new = query_categorizer.categorize(query).value
+        marker = "" if old == new else "  *"
+        print(f"{query[:50]:50} {old:17} {new}{marker}")
+
+    print()
+    wrong = 0
+    for query, expected in LABELLED:
+        got = query_categorizer.categorize(query)
+        if got != expected:
+            wrong += 1
+            print(f"❌ {query!r}: {got.value} instead of {expected.value}")
+    print(f"{'✅' if not wrong else '❌'} {len(LABELLED) - wrong}/{len(LABELLED)} labelled queries categorized correctly")
+    return not wrong
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark
+Measures how long a fresh process takes to import the app and how long a
+freshly spawned uvicorn server takes to answer its first /ping with 200.
+No API keys are needed; the Gemini client is only built on first use.
+
+Run: python benchmarks/cold_start.py
+"""
+
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUNDS = 5
+TARGET_SECONDS = 1.0
+
+
+def _clean_env(tmp_dir: str) -> dict:
+    env = dict(os.environ)
+    env.pop("GEMINI_API_KEY", None)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'cold_start.db')}"
+    env["LLM_WARMUP"] = "false"
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_first_ping(env: dict) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < 30:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                connection.request("GET", "/api/v1/ping")
+                if connection.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("Server did not answer /ping within 30s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> bool:
+    print("🧪 Cold-start benchmark")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = _clean_env(tmp_dir)
+        import_times = [measure_import(env) for _ in range(ROUNDS)]
+        ping_times = [measure_first_ping(env) for _ in range(ROUNDS)]
+
+    print(f"Import main:         median {statistics.median(import_times) * 1000:.0f} ms, "
+          f"max {max(import_times) * 1000:.0f} ms")
+    print(f"Spawn to first /ping: median {statistics.median(ping_times) * 1000:.0f} ms, "
+          f"max {max(ping_times) * 1000:.0f} ms (includes interpreter start)")
+
+    ok = statistics.median(ping_times) < TARGET_SECONDS
+    print(f"\n🎉 Cold start under {TARGET_SECONDS:.0f}s" if ok else f"\n❌ Cold start over {TARGET_SECONDS:.0f}s")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
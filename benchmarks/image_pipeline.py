@@ -0,0 +1,161 @@
+"""
+Image pipeline benchmark
+Uses synthetic 12-megapixel phone JPEGs to measure: event-loop stalls when
+images are decoded inline versus in the worker process pool, throughput of
+batched versus one-at-a-time inference, and whether a re-compressed,
+resized copy of a photo is answered from the perceptual-hash cache.
+
+Uses the configured ONNX model when IMAGE_MODEL_PATH points to one, and
+otherwise a simulated classifier with CPU-like batch costs.
+
+Run: python benchmarks/image_pipeline.py
+"""
+
+import asyncio
+import base64
+import io
+import os
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+IMAGES = 16
+REQUESTS = 64
+# Simulated model: fixed cost per run plus a smaller cost per image
+RUN_SECONDS = 0.020
+IMAGE_SECONDS = 0.004
+
+
+class SimulatedClassifier:
+    """Stands in for the ONNX model when no model file is configured"""
+
+    unavailable_reason = None
+
+    def classify(self, images, top_k=3):
+        time.sleep(RUN_SECONDS + IMAGE_SECONDS * len(images))
+        return [[("Tomato - Late blight", 0.81), ("Tomato - Early blight", 0.12), ("Tomato - Healthy", 0.04)]
+                for _ in images]
+
+
+def phone_jpeg(seed: int, size=(4000, 3000), quality: int = 90) -> bytes:
+    """A smooth synthetic leaf-coloured photo, JPEG-encoded like a phone camera"""
+    import random
+    from PIL import Image
+
+    rng = random.Random(seed)
+    tiny = Image.new("RGB", (8, 6))
+    tiny.putdata([(rng.randint(20, 120), rng.randint(90, 220), rng.randint(10, 90)) for _ in range(48)])
+    buffer = io.BytesIO()
+    tiny.resize(size, Image.BICUBIC).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+async def loop_lag(work) -> tuple:
+    """Run work() while a 5 ms ticker measures how late the event loop wakes it"""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            worst = max(worst, time.perf_counter() - start - 0.005)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # let the ticker start its first sleep
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed, worst
+
+
+async def run() -> bool:
+    from app.services.image_analysis import ImageAnalysisService, OnnxClassifier
+    from app.services.image_preprocess import preprocess
+    from app.config import get_settings
+
+    settings = get_settings()
+    classifier = OnnxClassifier(settings.image_model_path, settings.image_labels_path,
+                                settings.image_input_size, settings.image_inference_threads)
+    if classifier.unavailable_reason is not None:
+        print(f"ℹ️  {classifier.unavailable_reason}; using a simulated classifier")
+        classifier = SimulatedClassifier()
+    service = ImageAnalysisService(classifier=classifier)
+    size, max_pixels = settings.image_input_size, settings.image_max_pixels
+
+    photos = [phone_jpeg(seed) for seed in range(IMAGES)]
+    encoded = [base64.b64encode(photo).decode() for photo in photos]
+    print(f"🧪 {IMAGES} phone photos, {sum(map(len, photos)) / IMAGES / 1e6:.1f} MB each on average")
+    print("=" * 50)
+    ok = True
+
+    # 1. Decode + downscale: inline on the event loop versus the process pool
+    async def inline():
+        for photo in photos:
+            preprocess(photo, size, max_pixels)
+
+    loop = asyncio.get_running_loop()
+    pool = service._get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, preprocess, photo, size, max_pixels)
+                           for photo in photos[:settings.image_workers]))  # start the workers
+
+    async def pooled():
+        await asyncio.gather(*(loop.run_in_executor(pool, preprocess, photo, size, max_pixels) for photo in photos))
+
+    inline_seconds, inline_lag = await loop_lag(inline)
+    pooled_seconds, pooled_lag = await loop_lag(pooled)
+    print(f"Inline decode:    {inline_seconds / IMAGES * 1000:6.1f} ms/image, "
+          f"worst loop stall {inline_lag * 1000:6.1f} ms")
+    print(f"Pooled decode:    {pooled_seconds / IMAGES * 1000:6.1f} ms/image, "
+          f"worst loop stall {pooled_lag * 1000:6.1f} ms")
+    if pooled_lag < inline_lag / 2:
+        print("✅ Process pool keeps the event loop responsive")
+    else:
+        print("❌ Event loop still stalls while images are decoded")
+        ok = False
+
+    # 2. Inference: one image per run versus micro-batches
+    pixels = bytes(size * size * 3)
+    results = {}
+    for max_batch in (1, settings.image_max_batch):
+        service.batcher.max_batch = max_batch
+        service.batcher.batches = service.batcher.images = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(service.batcher.submit(pixels) for _ in range(REQUESTS)))
+        results[max_batch] = REQUESTS / (time.perf_counter() - start)
+        stats = service.batcher.stats()
+        print(f"Max batch {max_batch:>2}:      {results[max_batch]:6.1f} images/s, "
+              f"average batch {stats['average_batch_size']}")
+    average_batch = service.batcher.stats()["average_batch_size"]
+    if average_batch > 1 and results[settings.image_max_batch] > results[1]:
+        print(f"✅ Batching is {results[settings.image_max_batch] / results[1]:.1f}x faster under concurrent load")
+    else:
+        print("❌ Batching did not help")
+        ok = False
+
+    # 3. The same photo, re-compressed and resized by a messaging app
+    first = await service.analyze(encoded[0])
+    forwarded = base64.b64encode(phone_jpeg(0, size=(1600, 1200), quality=60)).decode()
+    start = time.perf_counter()
+    second = await service.analyze(forwarded)
+    print(f"Forwarded copy:   hash distance {(first.image_hash ^ second.image_hash).bit_count()} bits, "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    if second.cached and not first.cached:
+        print("✅ Re-compressed copy answered from the perceptual-hash cache")
+    else:
+        print("❌ Re-compressed copy missed the cache")
+        ok = False
+
+    await service.close()
+    print("\n🎉 Image pipeline benchmark passed" if ok else "\n❌ Image pipeline benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
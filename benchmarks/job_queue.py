@@ -0,0 +1,279 @@
+"""
+Background job queue benchmark
+Compares answering /ask in the request with ?mode=async (202 and a job ID,
+then polling /jobs/{id}) with a slow stub LLM, and checks the queue itself:
+priority order, retries and dead-lettering, requeueing a dead job, HTTP 4xx
+failing without retries, signed webhook delivery with a failed first try,
+and a job whose worker died being picked up again when its lease runs out.
+
+Run: python benchmarks/job_queue.py
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+# Load tests come from one client address; the per-IP rate limit would refuse most of them
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# Questions matching a curated FAQ would be answered without the LLM this benchmark measures
+os.environ.setdefault("KNOWLEDGE_ENABLED", "false")
+os.environ.setdefault("LLM_BACKENDS", "stub")
+os.environ.setdefault("LLM_STUB_LATENCY_MS", "400")
+os.environ.setdefault("JOB_POLL_SECONDS", "0.05")
+os.environ.setdefault("JOB_RETRY_BASE_SECONDS", "0.05")
+os.environ.setdefault("JOB_WEBHOOK_SECRET", "benchmark-secret")
+
+from pydantic import BaseModel
+from stub_servers import StubWebhookReceiver
+
+QUERIES = 20
+MAX_SUBMIT_P99_MS = 50.0
+
+
+class Echo(BaseModel):
+    n: int
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def wait_finished(queue, job_ids, timeout: float = 10.0) -> dict:
+    """Poll the store until every job has finished; returns {job_id: Job}"""
+    from app.services.jobs import FINISHED
+    deadline = time.perf_counter() + timeout
+    while True:
+        jobs = {job_id: await queue.get(job_id) for job_id in job_ids}
+        if all(job.status in FINISHED for job in jobs.values()) or time.perf_counter() > deadline:
+            return jobs
+        await asyncio.sleep(0.02)
+
+
+async def async_mode(tmp_dir: str) -> bool:
+    """Request time of sync /ask versus submitting with mode=async, then polling for the answers"""
+    import httpx
+    from app.services.jobs import job_queue
+    from main import app
+
+    print(f"/ask with a {os.environ['LLM_STUB_LATENCY_MS']} ms stub LLM, {QUERIES} queries each way")
+    job_queue.start()
+    ok = True
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        sync_ms = []
+        for i in range(QUERIES):
+            start = time.perf_counter()
+            response = await client.post("/api/v1/ask", json={"query": f"Sync question {i} about wheat rust",
+                                                               "use_cache": False})
+            sync_ms.append((time.perf_counter() - start) * 1000)
+            ok &= response.status_code == 200
+
+        submit_ms, job_ids = [], []
+        start_all = time.perf_counter()
+        for i in range(QUERIES):
+            start = time.perf_counter()
+            response = await client.post("/api/v1/ask?mode=async",
+                                         json={"query": f"Async question {i} about wheat rust", "use_cache": False})
+            submit_ms.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 202 or "Location" not in response.headers:
+                print(f"❌ mode=async answered {response.status_code}")
+                return False
+            job_ids.append(response.json()["job_id"])
+
+        pending = set(job_ids)
+        polls = 0
+        while pending and time.perf_counter() - start_all < 30:
+            for job_id in list(pending):
+                polls += 1
+                job = (await client.get(f"/api/v1/jobs/{job_id}")).json()
+                if job["status"] == "succeeded" and job["result"]["answer"]:
+                    pending.discard(job_id)
+                elif job["status"] in ("failed", "dead"):
+                    print(f"❌ Job {job_id} {job['status']}: {job['error']}")
+                    return False
+            await asyncio.sleep(0.05)
+        all_answered = time.perf_counter() - start_all
+
+        missing = await client.get("/api/v1/jobs/no-such-job")
+        ok &= missing.status_code == 404
+    await job_queue.stop()
+
+    print(f"Sync request time:    p50 {percentile(sync_ms, 0.5):7.1f} ms, p99 {percentile(sync_ms, 0.99):7.1f} ms")
+    print(f"Async submit time:    p50 {percentile(submit_ms, 0.5):7.1f} ms, p99 {percentile(submit_ms, 0.99):7.1f} ms")
+    print(f"All async answers ready after {all_answered:.2f} s ({polls} polls, {job_queue.workers} workers)")
+    if pending:
+        print(f"❌ {len(pending)} jobs never finished")
+        ok = False
+    if percentile(submit_ms, 0.99) > MAX_SUBMIT_P99_MS:
+        print(f"❌ Submitting a job took over {MAX_SUBMIT_P99_MS} ms")
+        ok = False
+    return ok
+
+
+async def priorities(tmp_dir: str) -> bool:
+    from app.services.jobs import JobQueue, JobStore
+
+    order = []
+
+    async def record(request: Echo):
+        order.append(request.n)
+        return request
+
+    queue = JobQueue(JobStore(os.path.join(tmp_dir, "priority.db")), workers=1, poll_seconds=0.05)
+    queue.register("echo", Echo, record)
+    # Submitted before the worker starts, lowest priority first
+    job_ids = [await queue.submit("echo", Echo(n=priority), priority=priority) for priority in (1, 3, 9, 0, 5, 7)]
+    queue.start()
+    await wait_finished(queue, job_ids)
+    await queue.stop()
+    ok = order == sorted(order, reverse=True)
+    print(f"{'✅' if ok else '❌'} Jobs ran in priority order: {order}")
+    return ok
+
+
+async def retries(tmp_dir: str) -> bool:
+    from fastapi import HTTPException
+    from app.services.jobs import JobQueue, JobStore
+
+    calls = {"flaky": 0, "rejected": 0}
+    healthy = asyncio.Event()
+
+    async def flaky(request: Echo):
+        calls["flaky"] += 1
+        if not healthy.is_set():
+            raise RuntimeError("upstream down")
+        return request
+
+    async def rejected(request: Echo):
+        calls["rejected"] += 1
+        raise HTTPException(status_code=400, detail="No speech was detected in the recording.")
+
+    queue = JobQueue(JobStore(os.path.join(tmp_dir, "retry.db")), workers=2, max_attempts=3,
+                     retry_base_seconds=0.05, poll_seconds=0.02)
+    queue.register("flaky", Echo, flaky)
+    queue.register("rejected", Echo, rejected)
+    queue.start()
+    flaky_id = await queue.submit("flaky", Echo(n=1))
+    rejected_id = await queue.submit("rejected", Echo(n=2))
+    jobs = await wait_finished(queue, [flaky_id, rejected_id])
+    ok = True
+
+    job = jobs[flaky_id]
+    dead = job.status == "dead" and job.attempts == 3 and calls["flaky"] == 3 and job.payload
+    print(f"{'✅' if dead else '❌'} Failing job dead-lettered after {job.attempts} attempts ({job.error})")
+    ok &= bool(dead)
+    listed = [j.id for j in await queue.list("dead")]
+    ok &= listed == [flaky_id]
+
+    job = jobs[rejected_id]
+    refused = job.status == "failed" and job.attempts == 1 and calls["rejected"] == 1
+    print(f"{'✅' if refused else '❌'} Rejected request failed without retries ({job.error})")
+    ok &= refused
+
+    healthy.set()
+    requeued = await queue.requeue(flaky_id) and not await queue.requeue(rejected_id)
+    job = (await wait_finished(queue, [flaky_id]))[flaky_id]
+    revived = requeued and job.status == "succeeded" and job.attempts == 1 and job.payload is None
+    print(f"{'✅' if revived else '❌'} Requeued dead job succeeded")
+    ok &= revived
+    await queue.stop()
+    return ok
+
+
+async def webhooks(tmp_dir: str) -> bool:
+    from app.services.jobs import JobQueue, JobStore
+
+    async def answer(request: Echo):
+        return {"answer": f"Answer {request.n}"}
+
+    attempts = {"count": 0}
+
+    def status():
+        # The farmer app is briefly unreachable on the first delivery
+        attempts["count"] += 1
+        return 503 if attempts["count"] == 1 else 200
+
+    queue = JobQueue(JobStore(os.path.join(tmp_dir, "webhook.db")), workers=1, retry_base_seconds=0.05,
+                     poll_seconds=0.02, webhook_attempts=3, webhook_secret=os.environ["JOB_WEBHOOK_SECRET"])
+    queue.register("echo", Echo, answer)
+    queue.start()
+    with StubWebhookReceiver(status=status) as receiver:
+        job_id = await queue.submit("echo", Echo(n=7), callback_url=receiver.url)
+        delivered = await asyncio.to_thread(receiver.wait_for, 1, 10.0)
+        for _ in range(50):
+            job = await queue.get(job_id)
+            if job.webhook_status != "pending":
+                break
+            await asyncio.sleep(0.02)
+    await queue.stop()
+    if not delivered:
+        print("❌ Webhook never delivered")
+        return False
+
+    payload, headers, body = receiver.deliveries[0]
+    expected = "sha256=" + hmac.new(os.environ["JOB_WEBHOOK_SECRET"].encode(), body, hashlib.sha256).hexdigest()
+    ok = (payload["job_id"] == job_id and payload["result"] == {"answer": "Answer 7"}
+          and headers.get("X-Webhook-Signature") == expected and job.webhook_status == "delivered")
+    print(f"{'✅' if ok else '❌'} Signed webhook delivered on attempt {attempts['count']} "
+          f"(webhook_status {job.webhook_status})")
+    return ok
+
+
+async def lease_recovery(tmp_dir: str) -> bool:
+    from app.services.jobs import JobQueue, JobStore
+
+    async def answer(request: Echo):
+        return request
+
+    path = os.path.join(tmp_dir, "lease.db")
+    queue = JobQueue(JobStore(path), workers=1, poll_seconds=0.02)
+    queue.register("echo", Echo, answer)
+    job_id = await queue.submit("echo", Echo(n=3))
+
+    # Another process claims the job and dies without finishing it
+    crashed = JobStore(path)
+    claimed = crashed.claim(lease_seconds=0.2)
+    crashed.close()
+
+    start = time.perf_counter()
+    queue.start()
+    job = (await wait_finished(queue, [job_id]))[job_id]
+    await queue.stop()
+    ok = claimed is not None and claimed.id == job_id and job.status == "succeeded" and job.attempts == 2
+    print(f"{'✅' if ok else '❌'} Job of a crashed worker recovered after its lease "
+          f"({time.perf_counter() - start:.2f} s, attempt {job.attempts})")
+    return ok
+
+
+async def run(tmp_dir: str) -> bool:
+    from app.services.http_client import close_http_client
+
+    print("🧪 Background job queue")
+    print("=" * 50)
+    ok = await async_mode(tmp_dir)
+    ok &= await priorities(tmp_dir)
+    ok &= await retries(tmp_dir)
+    ok &= await webhooks(tmp_dir)
+    ok &= await lease_recovery(tmp_dir)
+    await close_http_client()
+
+    print("\n🎉 Job queue benchmark passed" if ok else "\n❌ Job queue benchmark failed")
+    return ok
+
+
+def main() -> bool:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(tmp_dir, "jobs.db"))
+        return asyncio.run(run(tmp_dir))
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
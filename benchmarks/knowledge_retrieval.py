@@ -0,0 +1,150 @@
+"""
+Local knowledge base benchmark
+Builds the agronomy index from data/agronomy into a temporary file, then
+runs a mix of farmer questions (paraphrased FAQ questions, questions the
+advisories cover, and questions they do not) through GeminiService with a
+counting stub LLM. Reports index build time, retrieval latency, how many
+answers came straight from the FAQ without an LLM call, and whether the
+prompts for covered questions carried advisory passages.
+
+Run: python benchmarks/knowledge_retrieval.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEARCH_REPEATS = 500
+MAX_SEARCH_P99_MS = 5.0
+
+# Worded differently from faq.csv, as farmers would ask
+FAQ_QUESTIONS = [
+    "how to control aphids in my mustard",
+    "what is the seed rate for wheat",
+    "how do I control pink bollworm in cotton",
+    "how to control fall armyworm in maize crop",
+    "how do I take soil sample",
+    "how can I save water in paddy field",
+]
+COVERED_QUESTIONS = [
+    "dose of nitrogen urea for wheat crop",
+    "yellow rust spots on wheat leaves which fungicide",
+    "brown plant hopper hopper burn in rice",
+    "late blight on tomato leaves after rain",
+    "drip irrigation benefits for vegetables",
+    "whitefly on cotton leaves",
+]
+UNCOVERED_QUESTIONS = [
+    "what is today's price of onion in Nashik mandi",
+    "how do I apply for a kisan credit card",
+    "my cow is not eating fodder",
+]
+
+
+class CountingLLM:
+    """Stand-in for ChatGoogleGenerativeAI that records the prompts it is sent"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0].content)
+        return SimpleNamespace(content="Apply the recommended dose and consult your local Krishi Vigyan Kendra.")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(index_path: str) -> bool:
+    from app.services.gemini_service import GeminiService
+    from app.services.knowledge_base import KnowledgeBase
+
+    print("🧪 Local agronomy knowledge base")
+    print("=" * 50)
+    ok = True
+
+    knowledge = KnowledgeBase(os.path.join(ROOT, "data", "agronomy"), index_path)
+    start = time.perf_counter()
+    built = knowledge.build()
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({built['passages']} passages, {built['faqs']} FAQs)")
+    knowledge.load()
+
+    questions = FAQ_QUESTIONS + COVERED_QUESTIONS + UNCOVERED_QUESTIONS
+    timings = []
+    for i in range(SEARCH_REPEATS):
+        question = questions[i % len(questions)]
+        start = time.perf_counter()
+        knowledge.search(question)
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p99 = percentile(timings, 0.5), percentile(timings, 0.99)
+    print(f"Retrieval over {SEARCH_REPEATS} searches: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+    if p99 > MAX_SEARCH_P99_MS:
+        print(f"❌ Retrieval p99 above {MAX_SEARCH_P99_MS} ms")
+        ok = False
+
+    llm = CountingLLM()
+    service = GeminiService(llm=llm)
+    service.knowledge = knowledge
+
+    faq_answered = 0
+    for question in FAQ_QUESTIONS:
+        calls = len(llm.prompts)
+        await service.process_farmer_query(question, use_cache=False)
+        if len(llm.prompts) == calls:
+            faq_answered += 1
+        else:
+            print(f"  FAQ question went to the LLM: {question!r}")
+    print(f"FAQ questions answered without the LLM: {faq_answered}/{len(FAQ_QUESTIONS)}")
+    if faq_answered < len(FAQ_QUESTIONS) - 1:
+        print("❌ Too few FAQ questions answered locally")
+        ok = False
+
+    grounded = 0
+    for question in COVERED_QUESTIONS:
+        calls = len(llm.prompts)
+        response = await service.process_farmer_query(question, use_cache=False)
+        if len(llm.prompts) > calls and "Reference material" in llm.prompts[-1] and len(response.sources) > 1:
+            grounded += 1
+        else:
+            print(f"  No passages retrieved for: {question!r}")
+    print(f"Covered questions sent with advisory passages and cited: {grounded}/{len(COVERED_QUESTIONS)}")
+    if grounded < len(COVERED_QUESTIONS) - 1:
+        print("❌ Too few covered questions grounded in the advisories")
+        ok = False
+
+    ungrounded = 0
+    for question in UNCOVERED_QUESTIONS:
+        await service.process_farmer_query(question, use_cache=False)
+        if "Reference material" not in llm.prompts[-1]:
+            ungrounded += 1
+    print(f"Uncovered questions sent without passages: {ungrounded}/{len(UNCOVERED_QUESTIONS)}")
+    if ungrounded < len(UNCOVERED_QUESTIONS):
+        print("❌ Unrelated passages were added to prompts")
+        ok = False
+
+    skipped = len(questions) - len(llm.prompts)
+    print(f"LLM calls skipped: {skipped} of {len(questions)} questions ({skipped / len(questions):.0%})")
+    knowledge.close()
+
+    print("\n🎉 Knowledge base benchmark passed" if ok else "\n❌ Knowledge base benchmark failed")
+    return ok
+
+
+def main() -> bool:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return asyncio.run(run(os.path.join(tmp_dir, "index.db")))
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
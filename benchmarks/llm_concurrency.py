@@ -0,0 +1,116 @@
+"""
+Load test for the non-blocking LLM path
+Fires concurrent farmer queries at GeminiService backed by a stubbed LLM and
+checks that the completions overlap instead of running one after another,
+that the in-flight limit is respected and that /ping stays responsive.
+
+Run: python benchmarks/llm_concurrency.py
+"""
+
+import asyncio
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+# Load tests come from one client address; the per-IP rate limit would refuse most of them
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# Questions matching a curated FAQ would be answered without the LLM this benchmark measures
+os.environ.setdefault("KNOWLEDGE_ENABLED", "false")
+
+CONCURRENT_REQUESTS = 50
+LLM_LATENCY = 0.2  # seconds per stubbed completion
+MAX_CONCURRENCY = 16
+
+
+class StubLLM:
+    """Stand-in for ChatGoogleGenerativeAI with a fixed completion latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        return SimpleNamespace(
+            content="You should apply neem oil at 5 ml/liter every 7 days. "
+                    "Recommend checking the field weekly for new aphid colonies."
+        )
+
+
+async def run_load_test() -> bool:
+    import httpx
+    from app.config import get_settings
+    from app.services.gemini_service import GeminiService
+
+    get_settings().llm_max_concurrency = MAX_CONCURRENCY
+    stub = StubLLM(LLM_LATENCY)
+    service = GeminiService(llm=stub)
+
+    print(f"🧪 {CONCURRENT_REQUESTS} concurrent queries, {LLM_LATENCY * 1000:.0f} ms stub latency, "
+          f"limit {MAX_CONCURRENCY}")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[
+        service.process_farmer_query(f"How to control aphids on mustard? #{i}")
+        for i in range(CONCURRENT_REQUESTS)
+    ])
+    elapsed = time.perf_counter() - start
+
+    serial_time = CONCURRENT_REQUESTS * LLM_LATENCY
+    bounded_time = math.ceil(CONCURRENT_REQUESTS / MAX_CONCURRENCY) * LLM_LATENCY
+    print(f"Wall time:         {elapsed:.3f}s")
+    print(f"Serial estimate:   {serial_time:.3f}s")
+    print(f"Bounded estimate:  {bounded_time:.3f}s")
+    print(f"Max LLM in flight: {stub.max_in_flight}")
+
+    ok = True
+    if any(r.confidence_score == 0.0 for r in responses):
+        print("❌ Some queries failed")
+        ok = False
+    if elapsed > bounded_time * 1.5:
+        print("❌ Queries did not overlap")
+        ok = False
+    if stub.max_in_flight > MAX_CONCURRENCY:
+        print("❌ Concurrency limit exceeded")
+        ok = False
+
+    # /ping must answer while the LLM calls are still in flight
+    import main
+    from app.routers import farmer_query
+    farmer_query.gemini_service = service
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        load = [
+            asyncio.create_task(client.get("/api/v1/ask-simple", params={"query": f"wheat sowing {i}"}))
+            for i in range(CONCURRENT_REQUESTS)
+        ]
+        await asyncio.sleep(LLM_LATENCY / 4)
+        ping_start = time.perf_counter()
+        ping = await client.get("/api/v1/ping")
+        ping_latency = time.perf_counter() - ping_start
+        await asyncio.gather(*load)
+
+    print(f"/ping under load:  {ping_latency * 1000:.1f} ms (status {ping.status_code})")
+    if ping.status_code != 200 or ping_latency > LLM_LATENCY / 2:
+        print("❌ /ping was blocked by in-flight LLM calls")
+        ok = False
+
+    print("\n🎉 Concurrent requests overlap" if ok else "\n❌ Load test failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_load_test()) else 1)
@@ -0,0 +1,135 @@
+"""
+LLM fallback chain benchmark
+Runs the chain against two simulated models whose latency has a slow tail
+and compares p50/p99 with and without hedged requests. Also checks that a
+failing primary falls over to the secondary, that its breaker opens (for
+connection errors and for other API errors such as quota exhaustion), and
+that the offline stub answers when every model is down.
+
+Run: python benchmarks/llm_hedging.py
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+# Load tests come from one client address; the per-IP rate limit would refuse most of them
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+# Questions matching a curated FAQ would be answered without the LLM this benchmark measures
+os.environ.setdefault("KNOWLEDGE_ENABLED", "false")
+
+REQUESTS = 1000
+WARMUP_REQUESTS = 100
+CONCURRENCY = 20
+FAST_SECONDS = 0.02
+SLOW_SECONDS = 0.5
+SLOW_FRACTION = 0.03  # below 5%, so the p95 hedge threshold sits on the fast path
+MESSAGES = [("system", "You are an agricultural advisor."), ("human", "Farmer's question: How to control aphids?")]
+
+
+def make_backend_class():
+    from app.services.llm_backends import LLMBackend
+    from app.services.resilience import Upstream
+
+    class SimulatedModel(LLMBackend):
+        """Model whose latency is usually fast with an occasional slow call"""
+
+        def __init__(self, name: str, seed: int, fail: bool = False, error: type = ConnectionError):
+            # Like build_chain's LLM_MIN_TIMEOUT_SECONDS floor: the adaptive timeout must not drop
+            # below the slow path when a latency window happens to hold few slow calls
+            super().__init__(name, timeout=2.0, upstream=Upstream(
+                f"llm:{name}", 2.0, min_timeout=2 * SLOW_SECONDS, max_attempts=1, retry_on=(Exception,)
+            ))
+            self.random = random.Random(seed)
+            self.fail = fail
+            self.error = error
+
+        async def _complete(self, messages):
+            slow = self.random.random() < SLOW_FRACTION
+            await asyncio.sleep(SLOW_SECONDS if slow else FAST_SECONDS)
+            if self.fail:
+                raise self.error("simulated outage")
+            return f"answer from {self.name}"
+
+    return SimulatedModel
+
+
+async def run_chain(chain, requests: int) -> list:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await chain.complete(MESSAGES)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return sorted(latencies)
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+async def main() -> bool:
+    from app.services.llm_backends import LLMChain, LLMUnavailableError, StubBackend
+
+    SimulatedModel = make_backend_class()
+    print(f"🧪 {REQUESTS} completions, {SLOW_FRACTION:.0%} of calls take {SLOW_SECONDS * 1000:.0f} ms "
+          f"instead of {FAST_SECONDS * 1000:.0f} ms")
+    print("=" * 50)
+
+    results = {}
+    for hedge in (False, True):
+        chain = LLMChain([SimulatedModel("primary", 1), SimulatedModel("secondary", 2)], hedge=hedge)
+        # Fill the latency windows first so the p95 hedge threshold is known
+        await run_chain(chain, WARMUP_REQUESTS)
+        latencies = await run_chain(chain, REQUESTS)
+        results[hedge] = latencies
+        label = "hedged" if hedge else "no hedge"
+        print(f"{label:>9}: p50 {percentile(latencies, 0.5) * 1000:6.1f} ms   "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms   "
+              f"mean {statistics.mean(latencies) * 1000:6.1f} ms")
+
+    ok = True
+    if percentile(results[True], 0.99) < percentile(results[False], 0.99) / 2:
+        print("✅ Hedging at least halves p99 latency")
+    else:
+        print("❌ Hedging did not cut p99 latency")
+        ok = False
+
+    # Failover: the primary is down, the secondary answers and the primary's circuit opens,
+    # whether the API fails at the connection or answers with an error (quota, 5xx, auth)
+    for error in (ConnectionError, RuntimeError):
+        primary = SimulatedModel("primary", 3, fail=True, error=error)
+        chain = LLMChain([primary, SimulatedModel("secondary", 4)], hedge=False)
+        answers = [await chain.complete(MESSAGES) for _ in range(10)]
+        if all(backend.name == "secondary" for _, backend in answers) and primary.breaker.state == "open":
+            print(f"✅ Primary failing with {error.__name__} falls over to the secondary and its circuit opens")
+        else:
+            print(f"❌ Failover or circuit breaker did not behave as expected for {error.__name__} "
+                  f"(breaker {primary.breaker.state})")
+            ok = False
+
+    # Every model down: the offline stub still answers
+    chain = LLMChain([SimulatedModel("primary", 5, fail=True), StubBackend()], hedge=True)
+    try:
+        answer, backend = await chain.complete(MESSAGES)
+        print(f"✅ Offline stub answered ({len(answer)} chars) when every model failed")
+    except LLMUnavailableError as e:
+        print(f"❌ Chain gave up: {e}")
+        ok = False
+
+    print("\n🎉 LLM chain behaves as expected" if ok else "\n❌ LLM chain check failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,326 @@
+"""
+API load and latency benchmark
+Drives /ask, /ask-simple, /weather, /market-price and /health with closed-loop
+virtual users, in-process (ASGI, no sockets) and over HTTP against a uvicorn
+subprocess. Answers come from the offline stub LLM and weather from a local
+stub server, each with a lognormal latency distribution given by its median
+and p99; mandi prices come from a small synthetic store. Nothing leaves the
+machine.
+
+Reports throughput and p50/p95/p99 latency per endpoint and writes them to
+benchmarks/results/<commit>.json. With --compare, any endpoint whose p95 or
+throughput is worse than in the earlier file by more than --tolerance
+fails the run.
+
+Run: python benchmarks/load_test.py [--mode both] [--compare benchmarks/results/<commit>.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Add the project root to Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+from stub_servers import StubWeatherServer, lognormal_latency
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+QUESTIONS = [
+    "How to control aphids on mustard",
+    "When should I sow wheat",
+    "What fertilizer dose for paddy at tillering",
+    "How often should I irrigate sugarcane in summer",
+    "Is this a good week to sell onion",
+    "How to improve soil organic carbon",
+]
+LOCATIONS = ["Nashik", "Pune", "Nagpur", "Aurangabad", "Ahmednagar", "Solapur", "Kolhapur", "Satara"]
+MARKET_ROWS = 20_000
+
+
+def _ask(i: int):
+    return "POST", "/api/v1/ask", {"json": {
+        "query": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "location": LOCATIONS[i % len(LOCATIONS)],
+        "use_cache": False
+    }}
+
+
+def _ask_simple(i: int):
+    return "GET", "/api/v1/ask-simple", {"params": {"query": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})"}}
+
+
+def _weather(i: int):
+    return "GET", "/api/v1/weather", {"params": {"location": LOCATIONS[i % len(LOCATIONS)]}}
+
+
+def _market_price(i: int):
+    return "GET", "/api/v1/market-price", {"params": {"crop": f"Commodity {i % 40}", "location": f"Mandi {i % 500}"}}
+
+
+def _health(i: int):
+    return "GET", "/api/v1/health", {}
+
+
+ENDPOINTS = {
+    "ask": _ask,
+    "ask-simple": _ask_simple,
+    "weather": _weather,
+    "market-price": _market_price,
+    "health": _health,
+}
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0.0
+
+
+def summarize(latencies: list, errors: int, seconds: float) -> dict:
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / seconds, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+async def drive(client, endpoint, seconds: float, concurrency: int) -> dict:
+    """Closed loop: each virtual user sends its next request as soon as the last one is answered"""
+    import httpx
+
+    counter = itertools.count()
+    # Warm-up round, not measured
+    await asyncio.gather(*(_send(client, endpoint(next(counter))) for _ in range(concurrency)))
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def user():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            request = endpoint(next(counter))
+            start = time.perf_counter()
+            try:
+                response = await _send(client, request)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def _send(client, request: tuple):
+    method, path, kwargs = request
+    return await client.request(method, path, **kwargs)
+
+
+async def run_inprocess(args, endpoints: dict) -> dict:
+    """Requests go straight into the ASGI app: measures the app without sockets or a second process"""
+    import httpx
+    import main as app_main
+
+    results = {}
+    async with app_main.lifespan(app_main.app):
+        startup = next((task for task in asyncio.all_tasks() if task.get_name() == "background_startup"), None)
+        if startup is not None:
+            await startup
+        transport = httpx.ASGITransport(app=app_main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name, endpoint in endpoints.items():
+                results[name] = await drive(client, endpoint, args.duration, args.concurrency)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_http(args, endpoints: dict) -> dict:
+    """Requests go over TCP to a uvicorn subprocess, as a real client's would"""
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            deadline = time.perf_counter() + 60
+            while True:
+                try:
+                    if (await client.get("/api/v1/ping")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    if time.perf_counter() > deadline:
+                        raise RuntimeError("Server did not start within 60s")
+                    await asyncio.sleep(0.05)
+            # Let background startup (gazetteer, database) finish before measuring
+            await asyncio.sleep(1.0)
+            for name, endpoint in endpoints.items():
+                results[name] = await drive(client, endpoint, args.duration, args.concurrency)
+    finally:
+        server.terminate()
+        server.wait(timeout=15)
+    return results
+
+
+def seed_market_store(path: str):
+    from market_store import write_csv, write_coordinates
+    from app.services.market_store import MarketPriceStore
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "prices.csv")
+        coordinates_path = os.path.join(tmp_dir, "mandis.csv")
+        write_csv(csv_path, MARKET_ROWS)
+        write_coordinates(coordinates_path)
+        store = MarketPriceStore(path)
+        store.ingest_csv(csv_path)
+        store.load_coordinates(coordinates_path)
+        store.close()
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def print_results(mode: str, results: dict):
+    print(f"\n{mode}:")
+    print(f"  {'endpoint':<14}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, row in results.items():
+        print(f"  {name:<14}{row['throughput_rps']:>8.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['errors']:>8}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print changes against an earlier run; False if any endpoint regressed beyond the tolerance"""
+    print(f"\nCompared with {baseline.get('commit', 'unknown')} (tolerance {tolerance:.0%}):")
+    ok = True
+    for mode, results in report["results"].items():
+        for name, row in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            p95_change = row["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+            rps_change = row["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+            regressed = p95_change > tolerance or rps_change < -tolerance
+            mark = "❌" if regressed else "  "
+            print(f"{mark} {mode:<10}{name:<14} p95 {before['p95_ms']:8.1f} -> {row['p95_ms']:8.1f} ms "
+                  f"({p95_change:+.0%})   req/s {before['throughput_rps']:7.1f} -> {row['throughput_rps']:7.1f} "
+                  f"({rps_change:+.0%})")
+            ok = ok and not regressed
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "http", "both"], default="both")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated subset of endpoints")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users per endpoint")
+    parser.add_argument("--llm-median-ms", type=float, default=200.0)
+    parser.add_argument("--llm-p99-ms", type=float, default=1000.0)
+    parser.add_argument("--weather-median-ms", type=float, default=80.0)
+    parser.add_argument("--weather-p99-ms", type=float, default=400.0)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 / throughput change")
+    return parser.parse_args()
+
+
+def main() -> bool:
+    args = parse_args()
+    endpoints = {name: ENDPOINTS[name] for name in args.endpoints.split(",")}
+    modes = ["inprocess", "http"] if args.mode == "both" else [args.mode]
+    commit = git_commit()
+    print(f"🧪 Load test at {commit}: {args.concurrency} users x {args.duration:.0f} s per endpoint, "
+          f"LLM p50/p99 {args.llm_median_ms:.0f}/{args.llm_p99_ms:.0f} ms, "
+          f"weather p50/p99 {args.weather_median_ms:.0f}/{args.weather_p99_ms:.0f} ms")
+    print("=" * 50)
+
+    weather = StubWeatherServer(latency=lognormal_latency(args.weather_median_ms, args.weather_p99_ms, seed=1))
+    with tempfile.TemporaryDirectory() as tmp_dir, weather:
+        market_db = os.path.join(tmp_dir, "market.db")
+        seed_market_store(market_db)
+        # Settings are read from the environment by the in-process app and the uvicorn subprocess alike
+        os.environ.update({
+            "LLM_BACKENDS": "stub",
+            "LLM_STUB_LATENCY_MS": str(args.llm_median_ms),
+            "LLM_STUB_LATENCY_P99_MS": str(args.llm_p99_ms),
+            "WEATHER_API_KEY": "benchmark-dummy-key",
+            "WEATHER_API_URL": weather.url,
+            # Every request reaches the stub upstreams, so their latency distributions show
+            "WEATHER_CACHE_TTL_SECONDS": "0",
+            "RESPONSE_CACHE_ENABLED": "false",
+            "RATE_LIMIT_ENABLED": "false",
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp_dir, 'farmer.db')}",
+            "MARKET_DB_PATH": market_db,
+        })
+        results = {}
+        for mode in modes:
+            runner = run_inprocess if mode == "inprocess" else run_http
+            results[mode] = asyncio.run(runner(args, endpoints))
+            print_results(mode, results[mode])
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output if args.output else os.path.relpath(output, PROJECT_ROOT)}")
+
+    ok = True
+    failing = [f"{mode}/{name}" for mode, rows in results.items() for name, row in rows.items() if row["errors"]]
+    if failing:
+        print(f"❌ Requests failed on: {', '.join(failing)}")
+        ok = False
+    if args.compare:
+        with open(args.compare) as f:
+            ok = compare(report, json.load(f), args.tolerance) and ok
+
+    print("\n🎉 Load test passed" if ok else "\n❌ Load test failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
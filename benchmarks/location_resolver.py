@@ -0,0 +1,159 @@
+"""
+Location resolver benchmark
+Builds a synthetic 100k-village gazetteer, then measures resolution
+throughput for exact names (cache bypassed), a realistic repeat-heavy mix
+through the cache, and misspelled names that need fuzzy matching. Also
+compares k-d tree nearest-station lookups with a linear scan.
+
+Run: python benchmarks/location_resolver.py
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+VILLAGES = 100_000
+STATIONS = 2_000
+LOOKUPS = 200_000
+FUZZY_LOOKUPS = 2_000
+NEAREST_LOOKUPS = 20_000
+TARGET_PER_SECOND = 100_000
+SYLLABLES = [consonant + vowel for consonant in ("k", "kh", "g", "ch", "j", "t", "d", "n", "p", "b", "m", "y",
+                                                  "r", "l", "v", "sh", "s", "h", "dh", "bh")
+             for vowel in ("a", "i", "u", "e", "o", "an")]
+SUFFIXES = ["pur", "gaon", "wadi", "nagar", "abad", "khed", "wada", "ner", ""]
+
+
+def village_names(rng: random.Random, count: int) -> list:
+    names = set()
+    while len(names) < count:
+        syllables = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+        names.add((syllables + rng.choice(SUFFIXES)).title())
+    return sorted(names)
+
+
+def write_files(tmp_dir: str, names: list, rng: random.Random):
+    gazetteer = os.path.join(tmp_dir, "gazetteer.csv")
+    stations = os.path.join(tmp_dir, "stations.csv")
+    with open(gazetteer, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Kind", "Taluka", "District", "State", "Latitude", "Longitude", "Aliases"])
+        for index, name in enumerate(names):
+            writer.writerow([name, "village", f"Taluka {index % 3000}", f"District {index % 600}",
+                             f"State {index % 28}", round(rng.uniform(8, 34), 5), round(rng.uniform(69, 97), 5), ""])
+    station_rows = [(f"Station {index}", f"State {index % 28}", round(rng.uniform(8, 34), 4),
+                     round(rng.uniform(69, 97), 4)) for index in range(STATIONS)]
+    with open(stations, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Station", "State", "Latitude", "Longitude"])
+        writer.writerows(station_rows)
+    return gazetteer, stations, station_rows
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    position = rng.randrange(1, len(name) - 1)
+    return name[:position] + name[position + 1:] if rng.random() < 0.5 else name[:position] + "x" + name[position:]
+
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>10,.0f} lookups/s  ({seconds / count * 1e6:6.2f} µs each)"
+
+
+def main() -> bool:
+    from app.services.location_resolver import LocationResolver
+    from app.services.spatial_index import haversine_km
+
+    rng = random.Random(42)
+    print(f"🧪 {VILLAGES:,} gazetteer villages, {STATIONS:,} weather stations")
+    print("=" * 50)
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        names = village_names(rng, VILLAGES)
+        gazetteer, stations, station_rows = write_files(tmp_dir, names, rng)
+
+        start = time.perf_counter()
+        resolver = LocationResolver(gazetteer, stations, cache_size=0)
+        resolver.load()
+        print(f"Load + index:     {time.perf_counter() - start:.2f} s")
+
+        # 1. Exact names, every lookup resolved from scratch
+        queries = [rng.choice(names) for _ in range(LOOKUPS)]
+        start = time.perf_counter()
+        resolved = sum(resolver.resolve(query) is not None for query in queries)
+        exact_rate = LOOKUPS / (time.perf_counter() - start)
+        print(f"Exact, no cache:  {rate(LOOKUPS, time.perf_counter() - start)}")
+        if resolved != LOOKUPS:
+            print(f"❌ Only {resolved} of {LOOKUPS} exact names resolved")
+            ok = False
+
+        # 2. Realistic traffic: a few thousand active villages, typed in different ways
+        resolver.cache_size = 10_000
+        resolver.hits = resolver.misses = 0
+        active = [rng.choice(names) for _ in range(1500)]
+        variants = [lambda n: n, str.lower, str.upper, lambda n: f"{n}, {rng.choice(['Nashik', 'Pune'])}",
+                    lambda n: f" {n} "]
+        mix = [rng.choice(variants)(rng.choice(active)) for _ in range(LOOKUPS)]
+        start = time.perf_counter()
+        for query in mix:
+            resolver.resolve(query)
+        mix_rate = LOOKUPS / (time.perf_counter() - start)
+        print(f"Mixed, cached:    {rate(LOOKUPS, time.perf_counter() - start)}  "
+              f"hit rate {resolver.stats()['cache_hit_rate']:.0%}")
+
+        # 3. Misspellings that need fuzzy matching (cache bypassed)
+        resolver.cache_size = 0
+        long_names = [name for name in names if len(name) >= 6]
+        typos = [(name, misspell(name, rng)) for name in rng.sample(long_names, FUZZY_LOOKUPS)]
+        start = time.perf_counter()
+        correct = 0
+        for name, typo in typos:
+            match = resolver.resolve(typo)
+            correct += match is not None and match.place.name == name
+        print(f"Fuzzy, no cache:  {rate(FUZZY_LOOKUPS, time.perf_counter() - start)}  "
+              f"{correct / FUZZY_LOOKUPS:.0%} resolved to the intended village")
+
+        # 4. Nearest weather station: k-d tree against a linear scan
+        points = [(rng.uniform(8, 34), rng.uniform(69, 97)) for _ in range(NEAREST_LOOKUPS)]
+        start = time.perf_counter()
+        tree_results = [resolver.nearest_station(lat, lon) for lat, lon in points]
+        tree_seconds = time.perf_counter() - start
+        sample = points[:NEAREST_LOOKUPS // 20]
+        start = time.perf_counter()
+        scan_results = []
+        for lat, lon in sample:
+            name, _, s_lat, s_lon = min(station_rows, key=lambda row: haversine_km(lat, lon, row[2], row[3]))
+            in_range = haversine_km(lat, lon, s_lat, s_lon) <= resolver.station_max_km
+            scan_results.append(name if in_range else None)
+        scan_seconds = (time.perf_counter() - start) * NEAREST_LOOKUPS / len(sample)
+        print(f"Nearest, k-d:     {rate(NEAREST_LOOKUPS, tree_seconds)}")
+        print(f"Nearest, scan:    {rate(NEAREST_LOOKUPS, scan_seconds)}")
+        tree_names = [nearest[0].name if nearest else None for nearest in tree_results[:len(sample)]]
+        if scan_results != tree_names:
+            print("❌ k-d tree and linear scan disagree on the nearest station")
+            ok = False
+
+    if exact_rate >= TARGET_PER_SECOND and mix_rate >= TARGET_PER_SECOND:
+        print(f"✅ Exact and cached lookups sustain {TARGET_PER_SECOND:,}/s")
+    else:
+        print(f"❌ Below {TARGET_PER_SECOND:,} lookups/s")
+        ok = False
+    if tree_seconds < scan_seconds / 10:
+        print(f"✅ k-d tree nearest lookup is {scan_seconds / tree_seconds:.0f}x faster than a linear scan")
+    else:
+        print("❌ k-d tree is not clearly faster than a linear scan")
+        ok = False
+
+    print("\n🎉 Location resolver is fast enough" if ok else "\n❌ Location resolver benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,138 @@
+"""
+Market price store benchmark
+Streams a synthetic AGMARKNET-style CSV (a year of daily prices for many
+commodities across many mandis) into a temporary store, then reports
+ingest rows/s, peak memory growth during ingest and p50/p99 latency of
+the lookups the API makes per request.
+
+Run: python benchmarks/market_store.py [rows]
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import resource
+from datetime import date, timedelta
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+COMMODITIES = 40
+MARKETS = 500
+DEFAULT_ROWS = 1_000_000
+QUERIES = 2000
+QUERY_TARGET_MS = 1.0
+MEMORY_TARGET_MB = 50
+
+
+def write_csv(path: str, rows: int) -> int:
+    """Write rows one at a time (never held in memory), a market per commodity per day"""
+    rng = random.Random(7)
+    start = date(2025, 1, 1)
+    days = max(1, rows // (COMMODITIES * MARKETS) + 1)
+    written = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["State", "District", "Market", "Commodity", "Variety", "Grade",
+                         "Arrival_Date", "Min_x0020_Price", "Max_x0020_Price", "Modal_x0020_Price"])
+        for offset in range(days):
+            day = (start + timedelta(days=offset)).strftime("%d/%m/%Y")
+            for market in range(MARKETS):
+                for commodity in range(COMMODITIES):
+                    if written == rows:
+                        return written
+                    modal = 1000 + commodity * 100 + rng.randint(-150, 150)
+                    writer.writerow([f"State {market % 28}", f"District {market % 120}", f"Mandi {market}",
+                                     f"Commodity {commodity}", "Other", "FAQ", day,
+                                     modal - 200, modal + 200, modal])
+                    written += 1
+    return written
+
+
+def write_coordinates(path: str):
+    rng = random.Random(11)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["State", "District", "Market", "Latitude", "Longitude"])
+        for market in range(MARKETS):
+            writer.writerow([f"State {market % 28}", f"District {market % 120}", f"Mandi {market}",
+                             round(rng.uniform(8, 34), 4), round(rng.uniform(69, 97), 4)])
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+def time_queries(name: str, query, rng: random.Random) -> float:
+    latencies = []
+    for _ in range(QUERIES):
+        start = time.perf_counter()
+        query(rng)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = percentile(latencies, 0.99) * 1000
+    print(f"{name:>8}: p50 {percentile(latencies, 0.5) * 1000:6.3f} ms   p99 {p99:6.3f} ms")
+    return p99
+
+
+def main() -> bool:
+    from app.services.market_store import MarketPriceStore
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    print(f"🧪 Ingesting {rows:,} price rows ({COMMODITIES} commodities x {MARKETS} mandis)")
+    print("=" * 50)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "prices.csv")
+        coordinates_path = os.path.join(tmp_dir, "mandis.csv")
+        rows = write_csv(csv_path, rows)
+        write_coordinates(coordinates_path)
+        print(f"CSV size: {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        store = MarketPriceStore(os.path.join(tmp_dir, "market_prices.db"))
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report = store.ingest_csv(csv_path)
+        peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024  # ru_maxrss is KB on Linux
+        store.load_coordinates(coordinates_path)
+        print(f"Ingest: {report}")
+        if peak_mb < MEMORY_TARGET_MB:
+            print(f"✅ Ingest memory stays flat (peak RSS grew {peak_mb:.1f} MB for {rows:,} rows)")
+        else:
+            print(f"❌ Ingest peak memory {peak_mb:.1f} MB exceeds {MEMORY_TARGET_MB} MB")
+            ok = False
+
+        commodities = [store.resolve_commodity(f"Commodity {i}") for i in range(COMMODITIES)]
+        markets = [store.resolve_markets(f"Mandi {i}")[0].id for i in range(MARKETS)]
+        latest_day = store.latest_price(commodities[0]).date
+
+        timings = {
+            "latest": time_queries("latest", lambda r: store.latest_price(r.choice(commodities), r.choice(markets)),
+                                   random.Random(1)),
+            "trend": time_queries("trend", lambda r: store.trend(r.choice(commodities), r.choice(markets)),
+                                  random.Random(2)),
+            "history": time_queries("history", lambda r: store.history(
+                r.choice(commodities), r.choice(markets), latest_day - timedelta(days=30), latest_day),
+                random.Random(3)),
+            "nearest": time_queries("nearest", lambda r: store.nearest_markets(
+                r.uniform(8, 34), r.uniform(69, 97), commodity_id=r.choice(commodities)), random.Random(4)),
+        }
+        store.close()
+
+    slow = [name for name, p99 in timings.items() if p99 >= QUERY_TARGET_MS]
+    if slow:
+        print(f"❌ p99 over {QUERY_TARGET_MS} ms for: {', '.join(slow)}")
+        ok = False
+    else:
+        print(f"✅ Every lookup answers in under {QUERY_TARGET_MS} ms at p99")
+
+    print("\n🎉 Market price store is fast enough" if ok else "\n❌ Market price store benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,91 @@
+"""
+Benchmark for the metrics instrumentation overhead
+Measures the cost of individual metric updates and of MetricsMiddleware
+around a trivial ASGI app, compared with calling the app directly.
+
+Run: python benchmarks/metrics_overhead.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.metrics import MetricsRegistry
+from app.middleware.metrics import MetricsMiddleware
+
+ITERATIONS = 200000
+ROUNDS = 5
+BUDGET_US = 5.0  # allowed middleware overhead per request
+
+
+class FakeRoute:
+    path = "/api/v1/ask"
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = FakeRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def time_app(app, iterations: int) -> float:
+    """Best of several rounds, in µs per request"""
+    scope = {"type": "http", "method": "POST", "path": "/api/v1/ask"}
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await app(scope, receive, send)
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+def time_call(fn, iterations: int) -> float:
+    """Best of several rounds, in µs per call"""
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / iterations * 1e6
+
+
+async def main() -> bool:
+    print("🧪 Metrics overhead benchmark")
+    print("=" * 50)
+
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "bench", ("route",))
+    histogram = registry.histogram("bench_seconds", "bench", ("route",))
+    labels = ("/api/v1/ask",)
+
+    print(f"Counter.inc:         {time_call(lambda: counter.inc(labels), ITERATIONS):.3f} µs")
+    print(f"Histogram.observe:   {time_call(lambda: histogram.observe(0.0123, labels), ITERATIONS):.3f} µs")
+
+    baseline = await time_app(bare_app, ITERATIONS)
+    instrumented = await time_app(MetricsMiddleware(bare_app), ITERATIONS)
+    overhead = instrumented - baseline
+    print(f"Bare ASGI app:       {baseline:.3f} µs/request")
+    print(f"With middleware:     {instrumented:.3f} µs/request")
+    print(f"Middleware overhead: {overhead:.3f} µs/request (budget {BUDGET_US} µs)")
+
+    ok = overhead < BUDGET_US
+    print("\n🎉 Overhead within budget" if ok else "\n❌ Overhead over budget")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,207 @@
+"""
+Multi-worker load test
+Starts uvicorn with 1, 2 and 4 workers (capped at the CPU count) and the
+offline stub LLM, then drives /ask from several client processes to show
+requests per second scaling with worker count. It also checks that workers
+share state: a farmer's token bucket is enforced once across all workers,
+and an answer cached by one worker is served by another.
+
+Run: python benchmarks/multi_worker.py
+"""
+
+import asyncio
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+SECONDS = 5.0
+CLIENT_PROCESSES = 2
+CONNECTIONS_PER_CLIENT = 16
+FARMER_BURST = 5
+FARMER_REQUESTS = 20
+QUESTIONS = [
+    "How to control aphids on mustard",
+    "When should I sow wheat in Punjab",
+    "What fertilizer dose for paddy at tillering",
+    "How much water does sugarcane need in summer",
+    "Best price to sell onion this week",
+    "How to improve soil organic carbon",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, tmp_dir: str, **settings) -> tuple:
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKENDS": "stub",
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp_dir, 'farmer.db')}",
+        "MARKET_DB_PATH": os.path.join(tmp_dir, "market.db"),
+        "SHARED_STORE_PATH": os.path.join(tmp_dir, f"shared-{workers}-{time.time_ns()}.db"),
+        "QUERY_LOG_ENABLED": "false",
+    })
+    env.update({name.upper(): str(value) for name, value in settings.items()})
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.perf_counter() + 60
+    while time.perf_counter() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/api/v1/ping")
+            if connection.getresponse().status == 200:
+                return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+async def _drive(port: int, seconds: float, connections: int, client_id: int) -> tuple:
+    import httpx
+
+    completed = failed = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        async def connection_loop(index: int):
+            nonlocal completed, failed
+            sent = 0
+            while time.perf_counter() < deadline:
+                question = f"{QUESTIONS[(index + sent) % len(QUESTIONS)]} ({client_id}-{index}-{sent})"
+                response = await client.post("/api/v1/ask", json={"query": question, "use_cache": False})
+                if response.status_code == 200:
+                    completed += 1
+                else:
+                    failed += 1
+                sent += 1
+
+        await asyncio.gather(*(connection_loop(index) for index in range(connections)))
+    return completed, failed
+
+
+def client_process(args) -> tuple:
+    return asyncio.run(_drive(*args))
+
+
+def measure_throughput(workers: int, tmp_dir: str) -> float:
+    server, port = start_server(workers, tmp_dir, rate_limit_enabled="false")
+    try:
+        with multiprocessing.get_context("spawn").Pool(CLIENT_PROCESSES) as pool:
+            # Short warm-up so every worker has imported its lazy dependencies
+            pool.map(client_process, [(port, 1.0, 4, client) for client in range(CLIENT_PROCESSES)])
+            results = pool.map(client_process, [(port, SECONDS, CONNECTIONS_PER_CLIENT, client)
+                                                for client in range(CLIENT_PROCESSES)])
+    finally:
+        stop_server(server)
+    completed = sum(done for done, _ in results)
+    failed = sum(errors for _, errors in results)
+    if failed:
+        print(f"   ({failed} requests failed)")
+    return completed / SECONDS
+
+
+def check_shared_rate_limit(tmp_dir: str) -> bool:
+    """One farmer, many fresh connections spread over two workers: the burst applies once"""
+    server, port = start_server(2, tmp_dir, rate_limit_farmer_burst=FARMER_BURST,
+                                rate_limit_farmer_per_minute=1)
+    statuses, workers_seen = [], set()
+    try:
+        for attempt in range(FARMER_REQUESTS):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            connection.request("POST", "/api/v1/ask",
+                               body=f'{{"query": "Aphids on mustard {attempt}", "farmer_id": "bench-farmer"}}',
+                               headers={"Content-Type": "application/json", "Connection": "close"})
+            statuses.append(connection.getresponse().status)
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            connection.request("GET", "/api/v1/cache-stats", headers={"Connection": "close"})
+            response = connection.getresponse()
+            workers_seen.add(response.read().split(b'"worker_pid":')[1].split(b"}")[0])
+    finally:
+        stop_server(server)
+    allowed = statuses.count(200)
+    print(f"Farmer burst {FARMER_BURST}:   {allowed} of {FARMER_REQUESTS} allowed, "
+          f"{statuses.count(429)} got 429, across {len(workers_seen)} worker(s)")
+    return allowed == FARMER_BURST and statuses.count(429) == FARMER_REQUESTS - FARMER_BURST
+
+
+def check_shared_cache(tmp_dir: str) -> bool:
+    """An answer stored through one store connection is a hit through another (another worker)"""
+    from datetime import datetime
+    from app.models.schemas import FarmerQueryResponse, QueryCategory
+    from app.services.response_cache import ResponseCache
+    from app.services.shared_store import SharedStore
+
+    path = os.path.join(tmp_dir, "cache-check.db")
+    first, second = ResponseCache(shared=SharedStore(path)), ResponseCache(shared=SharedStore(path))
+    answer = FarmerQueryResponse(answer="Spray neem oil at 5 ml/liter.", confidence_score=0.8,
+                                 category=QueryCategory.PEST_DISEASE, timestamp=datetime.now())
+    first.set("How to control aphids on mustard?", QueryCategory.PEST_DISEASE, {"location": "Nashik"}, answer)
+    hit = second.get("how to control aphids on mustard", QueryCategory.PEST_DISEASE, {"location": "Nashik"})
+    print(f"Shared cache:     {'hit' if hit is not None else 'miss'} in a second worker's cache")
+    return hit is not None and hit.answer == answer.answer
+
+
+def main() -> bool:
+    cpus = os.cpu_count() or 1
+    worker_counts = [count for count in (1, 2, 4) if count <= max(cpus, 2)]
+    print(f"🧪 Multi-worker load test: {cpus} CPU(s), {CLIENT_PROCESSES} client processes x "
+          f"{CONNECTIONS_PER_CLIENT} connections, {SECONDS:.0f} s per run")
+    print("=" * 50)
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        throughput = {}
+        for workers in worker_counts:
+            throughput[workers] = measure_throughput(workers, tmp_dir)
+            print(f"{workers} worker(s):      {throughput[workers]:7.0f} requests/s "
+                  f"({throughput[workers] / throughput[1]:.2f}x)")
+        if cpus < 2:
+            print("ℹ️  Only one CPU: extra workers cannot add throughput on this machine")
+        elif throughput[2] >= throughput[1] * 1.4:
+            print("✅ Throughput scales with worker count")
+        else:
+            print("❌ Two workers are not clearly faster than one")
+            ok = False
+
+        if check_shared_rate_limit(tmp_dir):
+            print("✅ Rate limit is enforced across workers")
+        else:
+            print("❌ Workers did not share the farmer's token bucket")
+            ok = False
+        if check_shared_cache(tmp_dir):
+            print("✅ Answer cache is shared across workers")
+        else:
+            print("❌ Answer cache is not shared")
+            ok = False
+
+    print("\n🎉 Multi-worker benchmark passed" if ok else "\n❌ Multi-worker benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,151 @@
+"""
+Prompt assembly benchmark
+Compares the precompiled templates and token budget in app/services/prompts
+with the original per-request prompt construction (kept here for
+comparison) on a first question, a question with advisory passages, and
+follow-ups deep into a conversation. Reports prompt tokens, what the budget
+left out and build time, and checks that no prompt exceeds the budget.
+
+Run: python benchmarks/prompt_budget.py
+"""
+
+import os
+import sys
+import timeit
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+from app.models.schemas import QueryCategory
+from app.services.knowledge_base import Passage
+from app.services.prompts import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, TokenCounter
+
+BUDGET = 1200
+ITERATIONS = 5000
+CONTEXT = {"location": "Karnal, Haryana", "crop_type": "Wheat"}
+PASSAGES = [
+    Passage("Wheat Package of Practices", "Nutrient management",
+            "Apply 150 kg nitrogen, 60 kg phosphorus and 40 kg potash per hectare for irrigated timely sown "
+            "wheat. Give half the nitrogen and all the phosphorus and potash at sowing, and the remaining "
+            "nitrogen at the first irrigation. Apply zinc sulphate at 25 kg per hectare where zinc is low.",
+            "ICAR-IIWBR"),
+    Passage("Soil Health and Fertilizer Management", "Fertilizer use",
+            "Apply fertilizer according to the soil test. Urea has 46 percent nitrogen and DAP has 18 percent "
+            "nitrogen and 46 percent phosphorus. Split nitrogen into two or three doses. Neem-coated urea "
+            "releases nitrogen slowly and reduces losses.", "Soil Health Card scheme"),
+    Passage("Wheat Package of Practices", "Irrigation",
+            "The crown root initiation stage, 20 to 25 days after sowing, is the most critical irrigation. "
+            "Light soils need six to eight irrigations and heavy soils four to six.", "ICAR-IIWBR"),
+]
+ANSWER = ("1. Apply 50 kg urea per acre at the first irrigation, 20 to 25 days after sowing.\n"
+          "2. Broadcast it evenly when the soil is moist, not on standing water.\n"
+          "3. If leaves are pale yellow between veins, spray 0.5% zinc sulphate with 0.25% lime.\n"
+          "4. Keep the field free of weeds in the first 40 days so the fertilizer feeds the crop.\n"
+          "Consult your Krishi Vigyan Kendra for a soil test before the next season.")
+TURNS = [(f"Follow-up question {i} about urea and irrigation for my wheat", ANSWER) for i in range(4)]
+SUMMARY = "\n".join(f"Farmer asked: earlier question {i} about wheat. Advice: {ANSWER[:150]}" for i in range(4))
+SCENARIOS = [
+    ("first question", {}),
+    ("with 3 passages", {"passages": PASSAGES}),
+    ("follow-up, 2 turns", {"passages": PASSAGES, "turns": TURNS[:2]}),
+    ("long conversation", {"passages": PASSAGES, "turns": TURNS, "summary": SUMMARY}),
+]
+
+
+def legacy_build_messages(query, category, farmer_context=None, passages=(), summary="", turns=()):
+    """The original implementation, kept here for comparison"""
+    base_prompt = """You are an expert agricultural advisor AI assistant designed to help farmers in India.
+        You provide practical, actionable advice based on scientific farming practices and local conditions.
+
+        Guidelines:
+        1. Give specific, actionable advice
+        2. Consider Indian farming conditions and practices
+        3. Mention relevant crops, seasons, and regional factors
+        4. Include cost-effective solutions
+        5. Provide safety warnings when discussing pesticides/chemicals
+        6. Suggest organic/sustainable alternatives when possible
+        7. Keep responses concise but comprehensive
+        8. If unsure, recommend consulting local agricultural extension officers"""
+
+    category_specific = {
+        QueryCategory.CROP_MANAGEMENT: "\nFocus on: Crop cultivation, planting techniques, harvesting, yield improvement.",
+        QueryCategory.PEST_DISEASE: "\nFocus on: Pest identification, disease management, organic treatments, IPM strategies.",
+        QueryCategory.WEATHER: "\nFocus on: Weather-related farming advice, seasonal planning, climate adaptation.",
+        QueryCategory.MARKET_PRICE: "\nFocus on: Market trends, price forecasting, best selling practices.",
+        QueryCategory.SOIL_HEALTH: "\nFocus on: Soil testing, nutrient management, soil conservation.",
+        QueryCategory.IRRIGATION: "\nFocus on: Water management, irrigation methods, water conservation.",
+        QueryCategory.FERTILIZER: "\nFocus on: Nutrient management, fertilizer application, organic alternatives."
+    }
+
+    if category and category in category_specific:
+        base_prompt += category_specific[category]
+
+    if passages:
+        base_prompt += ("\n\nReference material from agricultural advisories. Prefer its doses, timings "
+                        "and thresholds when they answer the question:")
+        for number, passage in enumerate(passages, start=1):
+            base_prompt += f"\n[{number}] {passage.title} - {passage.section}: {passage.text}"
+
+    system_prompt = base_prompt
+    if farmer_context:
+        system_prompt += f"\nFarmer Context: Location: {farmer_context.get('location') or 'Not specified'}, Crop: {farmer_context.get('crop_type') or 'Not specified'}"
+    if summary:
+        system_prompt += f"\nEarlier conversation with this farmer:\n{summary}"
+
+    messages = [("system", system_prompt)]
+    for previous_question, previous_answer in turns:
+        messages.append(("human", f"Farmer's question: {previous_question}"))
+        messages.append(("ai", previous_answer))
+    messages.append(("human", f"Farmer's question: {query}"))
+    return messages
+
+
+def message_tokens(counter: TokenCounter, messages) -> int:
+    return sum(counter.count(content) + MESSAGE_OVERHEAD_TOKENS for _, content in messages)
+
+
+def main() -> bool:
+    counter = TokenCounter()
+    builder = PromptBuilder(counter, budget_tokens=BUDGET)
+    query = "How much urea should I give my wheat now?"
+    category = QueryCategory.FERTILIZER
+
+    print(f"🧪 Prompt assembly, {BUDGET}-token budget ({'exact' if counter.exact else 'estimated'} token counts)")
+    print("=" * 50)
+    ok = True
+    for name, parts in SCENARIOS:
+        legacy = legacy_build_messages(query, category, CONTEXT, **parts)
+        prompt = builder.build(query, category, "english", CONTEXT, **parts)
+        legacy_tokens = message_tokens(counter, legacy)
+        counted = message_tokens(counter, prompt.messages)
+        legacy_us = timeit.timeit(lambda: legacy_build_messages(query, category, CONTEXT, **parts),
+                                  number=ITERATIONS) / ITERATIONS * 1e6
+        # Distinct questions, so the token counts of the question are not all cache hits
+        questions = iter(range(ITERATIONS * 2))
+        new_us = timeit.timeit(lambda: builder.build(f"{query} {next(questions)}", category, "english", CONTEXT, **parts),
+                               number=ITERATIONS) / ITERATIONS * 1e6
+        print(f"{name:<20} legacy {legacy_tokens:5d} tokens ({legacy_us:5.1f} us)  "
+              f"budgeted {prompt.tokens:5d} tokens ({new_us:5.1f} us, {prompt.describe()})")
+        if prompt.tokens > BUDGET:
+            print(f"❌ {name}: {prompt.tokens} tokens is over the budget")
+            ok = False
+        if abs(counted - prompt.tokens) > 8:
+            print(f"❌ {name}: budget accounting ({prompt.tokens}) disagrees with the messages ({counted})")
+            ok = False
+        if prompt.tokens > legacy_tokens:
+            print(f"❌ {name}: the budgeted prompt is longer than the original")
+            ok = False
+
+    # Follow-ups must keep the farmer's last exchange even when the budget is tight
+    prompt = builder.build(query, category, "english", CONTEXT, PASSAGES, SUMMARY, TURNS)
+    if prompt.messages[-3][1] != f"Farmer's question: {TURNS[-1][0]}":
+        print("❌ The latest turn was left out of a long conversation")
+        ok = False
+
+    print("\n🎉 Prompt budget benchmark passed" if ok else "\n❌ Prompt budget benchmark failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,173 @@
+"""
+Local stub upstream servers used by the benchmarks and load tests
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def lognormal_latency(median_ms: float, p99_ms: float = 0.0, seed: int = 0):
+    """
+    Latency sampler in seconds for StubWeatherServer: lognormal with the given
+    median and p99 (the shape of most real upstream APIs), or fixed without a p99.
+    Uses the same parameters as the app's LLM_STUB_LATENCY_MS / LLM_STUB_LATENCY_P99_MS.
+    """
+    if p99_ms <= median_ms or median_ms <= 0:
+        return median_ms / 1000
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    mu, sigma = math.log(median_ms / 1000), math.log(p99_ms / median_ms) / 2.326
+
+    def sample() -> float:
+        with lock:
+            return rng.lognormvariate(mu, sigma)
+
+    return sample
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """Does not print tracebacks when a client hangs up early (e.g. a cancelled hedge)"""
+
+    # The default backlog of 5 overflows on a cold concurrent burst, adding ~1 s SYN retries
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class StubWeatherServer:
+    """
+    OpenWeather-compatible stub running on a background thread.
+    Counts upstream requests and distinct client connections so tests can
+    check caching, request coalescing and keep-alive reuse. latency and
+    status may be callables to simulate slow tails and failures.
+    """
+
+    def __init__(self, latency: float = 0.1, host: str = "127.0.0.1", port: int = 0, status: int = 200):
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = _QuietServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/data/2.5/weather"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    stub.connections.add(self.client_address)
+                latency = stub.latency() if callable(stub.latency) else stub.latency
+                if latency:
+                    time.sleep(latency)
+                status = stub.status() if callable(stub.status) else stub.status
+
+                query = parse_qs(urlparse(self.path).query)
+                location = query["q"][0] if "q" in query else f"{query['lat'][0]},{query['lon'][0]}"
+                body = json.dumps({
+                    "name": location.title(),
+                    "main": {"temp": 29.5, "humidity": 62},
+                    "rain": {"1h": 0.4},
+                    "weather": [{"description": "light rain"}]
+                }).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubWeatherServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StubWebhookReceiver:
+    """
+    Records webhook POSTs (JSON body and headers) on a background thread.
+    status may be a callable, e.g. to fail the first deliveries.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, status: int = 200):
+        self.status = status
+        self.deliveries = []
+        self.received = threading.Condition()
+        self._server = _QuietServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/farmer-app/jobs"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = stub.status() if callable(stub.status) else stub.status
+                if status < 300:
+                    with stub.received:
+                        stub.deliveries.append((json.loads(body), dict(self.headers), body))
+                        stub.received.notify_all()
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def wait_for(self, count: int, timeout: float) -> bool:
+        """Block until `count` deliveries arrived; False on timeout"""
+        with self.received:
+            return self.received.wait_for(lambda: len(self.deliveries) >= count, timeout)
+
+    def start(self) -> "StubWebhookReceiver":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
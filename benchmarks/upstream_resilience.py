@@ -0,0 +1,148 @@
+"""
+Upstream resilience benchmark
+Drives WeatherService against a local stub server to check the shared
+upstream-call utility: hedging cuts the latency tail, retries absorb
+transient 503s, the circuit breaker fails fast while the upstream is down
+and calls give up when the request deadline runs out.
+
+Run: python benchmarks/upstream_resilience.py
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+from stub_servers import StubWeatherServer
+
+REQUESTS = 300
+WARMUP_REQUESTS = 200  # fills the latency window
+CONCURRENCY = 20
+FAST_SECONDS = 0.02
+SLOW_SECONDS = 0.6
+SLOW_FRACTION = 0.02  # well below 5%, so the p95 hedge threshold sits on the fast path
+
+
+def tail_latency(seed: int):
+    rng = random.Random(seed)
+    return lambda: SLOW_SECONDS if rng.random() < SLOW_FRACTION else FAST_SECONDS
+
+
+def percentile(latencies: list, fraction: float) -> float:
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+async def timed_lookups(service, prefix: str, count: int) -> list:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            # Distinct locations so every lookup reaches the upstream
+            await service.get_weather_info(f"{prefix} {index}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(index) for index in range(count)))
+    return latencies
+
+
+async def main() -> bool:
+    from app.config import get_settings
+    from app.services.additional_services import WeatherService
+    from app.services.http_client import close_http_client
+    from app.services.resilience import deadline
+
+    settings = get_settings()
+    settings.weather_api_key = "stub-key"
+    settings.upstream_backoff_base_ms = 10
+    ok = True
+
+    print(f"🧪 {REQUESTS} weather lookups, {SLOW_FRACTION:.0%} of upstream calls take "
+          f"{SLOW_SECONDS * 1000:.0f} ms instead of {FAST_SECONDS * 1000:.0f} ms")
+    print("=" * 50)
+
+    # 1. Hedging against a slow tail
+    p99 = {}
+    for hedge in (False, True):
+        with StubWeatherServer(latency=tail_latency(1)) as server:
+            settings.weather_api_url = server.url
+            settings.upstream_hedge_enabled = hedge
+            service = WeatherService()
+            # Open the connection pool first; the latency window then only holds warm calls
+            await timed_lookups(service, "connect", CONCURRENCY)
+            await timed_lookups(service, "warmup", WARMUP_REQUESTS)
+            latencies = await timed_lookups(service, "village", REQUESTS)
+            p99[hedge] = percentile(latencies, 0.99)
+            print(f"{'hedged' if hedge else 'no hedge':>9}: p50 {percentile(latencies, 0.5) * 1000:6.1f} ms   "
+                  f"p99 {p99[hedge] * 1000:6.1f} ms   upstream requests {server.requests}")
+        await close_http_client()
+    if p99[True] < p99[False] / 2:
+        print("✅ Hedging at least halves p99 latency")
+    else:
+        print("❌ Hedging did not cut p99 latency")
+        ok = False
+
+    # 2. Transient failures are retried within the budget
+    rng = random.Random(2)
+    with StubWeatherServer(latency=FAST_SECONDS, status=lambda: 503 if rng.random() < 0.3 else 200) as server:
+        settings.weather_api_url = server.url
+        service = WeatherService()
+        results = [await service.get_weather_info(f"flaky {index}") for index in range(100)]
+        succeeded = sum(result is not None for result in results)
+        print(f"30% upstream 503s: {succeeded}/100 lookups succeeded")
+        if succeeded >= 95:
+            print("✅ Retries absorb transient upstream errors")
+        else:
+            print("❌ Retries did not absorb transient errors")
+            ok = False
+    await close_http_client()
+
+    # 3. Upstream down: the breaker opens and later calls fail fast
+    with StubWeatherServer(latency=FAST_SECONDS, status=503) as server:
+        settings.weather_api_url = server.url
+        service = WeatherService()
+        for index in range(settings.upstream_breaker_failures):
+            await service.get_weather_info(f"down {index}")
+        requests_before = server.requests
+        start = time.perf_counter()
+        for index in range(100):
+            await service.get_weather_info(f"fast fail {index}")
+        elapsed = (time.perf_counter() - start) / 100
+        print(f"Upstream down: breaker {service.upstream.breaker.state}, "
+              f"{elapsed * 1000:.2f} ms per call, {server.requests - requests_before} upstream requests")
+        if service.upstream.breaker.state == "open" and server.requests == requests_before:
+            print("✅ Open circuit fails fast without calling the upstream")
+        else:
+            print("❌ Circuit breaker did not open")
+            ok = False
+    await close_http_client()
+
+    # 4. The request deadline bounds the whole call, retries included
+    with StubWeatherServer(latency=1.0) as server:
+        settings.weather_api_url = server.url
+        service = WeatherService()
+        start = time.perf_counter()
+        with deadline(0.2):
+            result = await service.get_weather_info("deadline")
+        elapsed = time.perf_counter() - start
+        print(f"0.2 s request budget, 1 s upstream: gave up after {elapsed * 1000:.0f} ms")
+        if result is None and elapsed < 0.3:
+            print("✅ Upstream call respects the request deadline")
+        else:
+            print("❌ Upstream call overran the request deadline")
+            ok = False
+    await close_http_client()
+
+    print("\n🎉 Upstream resilience checks passed" if ok else "\n❌ Upstream resilience checks failed")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,180 @@
+"""
+Voice pipeline benchmark
+Sends the bundled clips in data/audio/fixtures/ through a local server:
+whole clips to POST /ask-voice, and the same clips streamed in 100 ms PCM
+frames at real-time pace (as if recorded live) over the /ask-voice/stream
+WebSocket. Reports the real-time factor of transcription and end-to-end
+latency from the end of the upload to the answer. Answers come from the
+offline stub LLM.
+
+Uses faster-whisper when it and its model weights are available, and
+otherwise a simulated transcriber that burns CPU at SIMULATED_RTF.
+The bundled clips are synthetic voice-like signals for timing; use
+recorded farmer questions to check accuracy.
+
+Run: python benchmarks/voice_pipeline.py
+"""
+
+import asyncio
+import base64
+import glob
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import wave
+
+# Add the project root to Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+os.environ.setdefault("LLM_BACKENDS", "stub")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+
+FIXTURES = os.path.join(PROJECT_ROOT, "data", "audio", "fixtures", "*.wav")
+FRAME_SECONDS = 0.1
+SIMULATED_RTF = 0.3
+
+
+def simulated_transcribe(audio, sample_rate, language, beam_size=1, max_seconds=120.0):
+    """Stand-in for speech_worker.transcribe: CPU-bound for SIMULATED_RTF x the clip length"""
+    if sample_rate:
+        seconds = len(audio) / 2 / sample_rate
+    else:
+        with wave.open(io.BytesIO(audio)) as clip:
+            seconds = clip.getnframes() / clip.getframerate()
+    deadline = time.perf_counter() + seconds * SIMULATED_RTF
+    while time.perf_counter() < deadline:
+        pass
+    return f"simulated transcript of {seconds:.1f} seconds of speech", "en", seconds
+
+
+def read_pcm(path: str):
+    with wave.open(path) as clip:
+        return clip.readframes(clip.getnframes()), clip.getframerate()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def stream_clip(url: str, pcm: bytes, rate: int):
+    """Send a clip at real-time pace; returns (seconds from end of recording to answer, partials, last event)"""
+    import websockets
+
+    frame_bytes = int(rate * FRAME_SECONDS) * 2
+    partials = 0
+    async with websockets.connect(f"{url}?sample_rate={rate}") as websocket:
+        started = time.perf_counter()
+        for index, offset in enumerate(range(0, len(pcm), frame_bytes)):
+            await websocket.send(pcm[offset:offset + frame_bytes])
+            # Pace the frames like a live recording
+            await asyncio.sleep(max(0.0, started + (index + 1) * FRAME_SECONDS - time.perf_counter()))
+        start = time.perf_counter()
+        await websocket.send("end")
+        while True:
+            event = json.loads(await websocket.recv())
+            partials += event["event"] == "partial"
+            if event["event"] in ("answer", "error"):
+                return time.perf_counter() - start, partials, event
+
+
+async def run() -> bool:
+    import httpx
+    import uvicorn
+    from app.config import get_settings
+    from app.services import speech_worker
+    from app.services.speech_to_text import speech_service
+    import main as app_main
+
+    settings = get_settings()
+    fixtures = sorted(glob.glob(FIXTURES))
+    print(f"🧪 {len(fixtures)} voice clips, streamed in {FRAME_SECONDS * 1000:.0f} ms frames")
+    print("=" * 50)
+
+    reason = speech_service.unavailable_reason
+    if reason is None:
+        try:
+            load_seconds = await asyncio.get_running_loop().run_in_executor(
+                speech_service._get_pool(), speech_worker.warm_up
+            )
+            print(f"ℹ️  faster-whisper {settings.speech_model!r} loaded in {load_seconds:.1f} s")
+        except speech_worker.ModelLoadError as e:
+            reason = str(e)
+    if reason is not None:
+        print(f"ℹ️  {reason}; using a simulated transcriber (RTF {SIMULATED_RTF})")
+        await speech_service.close()
+        speech_service.transcribe_fn = simulated_transcribe
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app_main.app, port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    ok = True
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+        for path in fixtures:
+            name = os.path.basename(path)
+            with open(path, "rb") as f:
+                clip = f.read()
+
+            # 1. Whole clip: nothing happens until the upload is complete
+            start = time.perf_counter()
+            payload = {"audio_base64": base64.b64encode(clip).decode()}
+            response = await client.post("/api/v1/ask-voice", json=payload)
+            whole_latency = time.perf_counter() - start
+            if response.status_code != 200:
+                print(f"❌ {name}: /ask-voice answered {response.status_code} {response.text}")
+                ok = False
+                continue
+            body = response.json()
+            audio_seconds = body["audio_seconds"]
+            rtf = body["transcription_seconds"] / audio_seconds
+            print(f"{name:<18} {audio_seconds:5.1f} s audio, RTF {rtf:.2f}")
+            print(f"  whole clip:     {whole_latency * 1000:7.0f} ms from upload to answer")
+
+            # 2. Streaming: frames sent as they are recorded, transcribed while recording
+            pcm, rate = read_pcm(path)
+            stream_latency, partials, event = await stream_clip(
+                f"ws://127.0.0.1:{port}/api/v1/ask-voice/stream", pcm, rate
+            )
+            if event["event"] != "answer":
+                print(f"❌ {name}: stream ended with {event}")
+                ok = False
+                continue
+            print(f"  streamed:       {stream_latency * 1000:7.0f} ms from end of recording to answer "
+                  f"({partials} partial transcript(s) during recording)")
+            if audio_seconds > settings.speech_segment_seconds and stream_latency >= whole_latency:
+                print(f"❌ {name}: streaming did not cut the wait after recording")
+                ok = False
+
+    server.should_exit = True
+    await server_task
+
+    stats = speech_service.stats()
+    print(f"\nOverall real-time factor: {stats['real_time_factor']:.2f} over {stats['clips']} transcriptions")
+    if stats["real_time_factor"] >= 1:
+        print("❌ Transcription is slower than real time")
+        ok = False
+    else:
+        print("✅ Transcription runs faster than real time")
+
+    print("\n🎉 Voice pipeline benchmark passed" if ok else "\n❌ Voice pipeline benchmark failed")
+    return ok
+
+
+def main() -> bool:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'voice.db')}")
+        os.environ.setdefault("MARKET_DB_PATH", os.path.join(tmp_dir, "market.db"))
+        return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,86 @@
+"""
+Load test for WeatherService against a local stub OpenWeather server
+Checks that concurrent requests for one location are coalesced into a single
+upstream call, that repeated requests are served from the TTL cache and that
+pooled keep-alive connections are reused.
+
+Run: python benchmarks/weather_coalescing.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+
+from stub_servers import StubWeatherServer
+
+CONCURRENT_REQUESTS = 500
+UPSTREAM_LATENCY = 0.1
+
+
+async def run_weather_test(server: StubWeatherServer) -> bool:
+    from app.config import get_settings
+    from app.services.additional_services import WeatherService
+    from app.services.http_client import close_http_client
+
+    settings = get_settings()
+    settings.weather_api_key = "stub-key"
+    settings.weather_api_url = server.url
+    service = WeatherService()
+    ok = True
+
+    print(f"🧪 {CONCURRENT_REQUESTS} concurrent requests for Nashik, "
+          f"{UPSTREAM_LATENCY * 1000:.0f} ms upstream latency")
+    print("=" * 50)
+
+    # Test 1: single-flight coalescing
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        service.get_weather_info("Nashik") for _ in range(CONCURRENT_REQUESTS)
+    ])
+    elapsed = time.perf_counter() - start
+    print(f"Cold burst:  {elapsed * 1000:.1f} ms, upstream calls: {server.requests}")
+    if server.requests != 1 or any(r is None for r in results):
+        print("❌ Concurrent requests were not coalesced into one upstream call")
+        ok = False
+    else:
+        print("✅ Coalesced into one upstream call")
+
+    # Test 2: TTL cache
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        service.get_weather_info(" nashik ") for _ in range(CONCURRENT_REQUESTS)
+    ])
+    elapsed = time.perf_counter() - start
+    print(f"Warm burst:  {elapsed * 1000:.1f} ms, upstream calls: {server.requests}")
+    if server.requests != 1:
+        print("❌ Cached location hit the upstream again")
+        ok = False
+    else:
+        print("✅ Served from cache")
+
+    # Test 3: connection reuse across different locations
+    server.connections.clear()
+    locations = [f"Village {i}" for i in range(20)]
+    for location in locations:
+        await service.get_weather_info(location)
+    print(f"Sequential:  {len(locations)} locations over {len(server.connections)} connection(s)")
+    if len(server.connections) > 2:
+        print("❌ Connections were not reused")
+        ok = False
+    else:
+        print("✅ Keep-alive connection reused")
+
+    await close_http_client()
+    print("\n🎉 Weather service checks passed" if ok else "\n❌ Weather service checks failed")
+    return ok
+
+
+if __name__ == "__main__":
+    with StubWeatherServer(latency=UPSTREAM_LATENCY) as stub_server:
+        passed = asyncio.run(run_weather_test(stub_server))
+    sys.exit(0 if passed else 1)
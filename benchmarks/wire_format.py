@@ -0,0 +1,142 @@
+"""
+Bytes-on-the-wire benchmark
+Sends typical farmer answers (a short tip, a detailed Gemini-style answer,
+a Hindi answer and a 10-query batch) through the full middleware stack in
+every negotiated combination of body format (JSON, MessagePack, CBOR) and
+content encoding (identity, gzip, brotli), and reports body bytes and the
+mean in-process request time. Also checks that /categories revalidation with
+If-None-Match costs a 304 and no body.
+
+Run: python benchmarks/wire_format.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("QUERY_LOG_ENABLED", "false")
+
+REPEATS = 200
+SOURCES = ["Gemini AI Agricultural Assistant", "ICAR Package of Practices", "State Agriculture Department"]
+ANSWERS = {
+    "short tip": (
+        "Spray neem oil (5 ml per liter of water) in the evening and repeat after 7 days.",
+        ["Check the underside of leaves twice a week"],
+    ),
+    "detailed answer": (
+        "**Aphid control in mustard (rabi season)**\n\n"
+        "1. **Monitor**: Aphids appear from late December when temperatures fall below 20°C. Check 10 plants "
+        "at random in each part of the field twice a week; act when 25-30 aphids are seen on the top 10 cm of "
+        "the central shoot, or when 50% of plants are infested.\n"
+        "2. **Cultural practices**: Sow before 25 October so the crop flowers before aphid numbers peak. Avoid "
+        "excess nitrogen, which makes plants lush and attractive to aphids. Remove and destroy infested "
+        "twigs in the early stage.\n"
+        "3. **Biological control**: Conserve ladybird beetles and syrphid flies; do not spray when their "
+        "numbers are high. Spray neem seed kernel extract (5%) or neem oil (5 ml per liter) as a first step.\n"
+        "4. **Chemical control**: If the threshold is crossed, spray imidacloprid 17.8 SL at 0.25 ml per liter "
+        "or thiamethoxam 25 WG at 0.2 g per liter of water, using 250-300 liters per acre. Repeat after 15 "
+        "days only if needed.\n"
+        "5. **Safety**: Spray in the evening when bees are not foraging, wear gloves and a mask, and keep a "
+        "gap of at least 21 days between the last spray and harvest.\n\n"
+        "Contact your nearest Krishi Vigyan Kendra if more than half of the plants are affected.",
+        ["Sow early (before 25 October) next season", "Install yellow sticky traps at 10 per acre",
+         "Do not spray during flowering hours to protect bees"],
+    ),
+    "hindi answer": (
+        "सरसों में माहू (एफिड) नियंत्रण:\n1. खेत की सप्ताह में दो बार निगरानी करें।\n"
+        "2. शुरुआत में नीम का तेल 5 मिली प्रति लीटर पानी में मिलाकर शाम को छिड़काव करें।\n"
+        "3. अधिक प्रकोप होने पर इमिडाक्लोप्रिड 17.8 एसएल 0.25 मिली प्रति लीटर पानी में छिड़कें।\n"
+        "4. नाइट्रोजन खाद की अधिक मात्रा से बचें।\n"
+        "अधिक जानकारी के लिए नजदीकी कृषि विज्ञान केंद्र से संपर्क करें।",
+        ["पीले चिपचिपे ट्रैप लगाएं", "अगले मौसम में समय पर बुवाई करें"],
+    ),
+}
+FORMATS = [("JSON", "application/json"), ("MessagePack", "application/msgpack"), ("CBOR", "application/cbor")]
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def canned_processor(answer: str, suggestions: list):
+    from app.models.schemas import FarmerQueryResponse, QueryCategory
+
+    async def process_farmer_query(query, category=None, farmer_context=None, use_cache=True, language=None):
+        return FarmerQueryResponse(
+            answer=answer, confidence_score=0.85, category=QueryCategory.PEST_DISEASE,
+            suggestions=suggestions, sources=SOURCES, timestamp=datetime.now()
+        )
+
+    return process_farmer_query
+
+
+async def measure(client, method: str, path: str, headers: dict, **kwargs) -> tuple:
+    """(body bytes on the wire, mean milliseconds per request)"""
+    response = await client.request(method, path, headers=headers, **kwargs)
+    assert response.status_code == 200, response.text
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        await client.request(method, path, headers=headers, **kwargs)
+    return response.num_bytes_downloaded, (time.perf_counter() - start) / REPEATS * 1000
+
+
+async def run() -> bool:
+    import httpx
+    from app.services.gemini_service import gemini_service
+    import main as app_main
+
+    print(f"🧪 Response sizes through the full middleware stack ({REPEATS} requests per cell)")
+    print("=" * 50)
+    ok = True
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        cases = [(name, "POST", "/api/v1/ask", {"json": {"query": "aphids on mustard"}}, answer)
+                 for name, answer in ANSWERS.items()]
+        cases.append(("batch of 10", "POST", "/api/v1/ask-batch",
+                      {"json": {"queries": [{"query": f"aphids on mustard {i}"} for i in range(10)]}},
+                      ANSWERS["detailed answer"]))
+        for name, method, path, kwargs, answer in cases:
+            gemini_service.process_farmer_query = canned_processor(*answer)
+            print(f"\n{name}:")
+            baseline = None
+            for format_name, media_type in FORMATS:
+                row = []
+                for encoding in ENCODINGS:
+                    size, ms = await measure(client, method, path,
+                                             {"Accept": media_type, "Accept-Encoding": encoding}, **kwargs)
+                    baseline = baseline or size
+                    row.append(f"{encoding} {size:6d} B ({size / baseline:4.0%}, {ms:.2f} ms)")
+                print(f"  {format_name:<12} " + "  ".join(row))
+                if format_name == "JSON" and name != "short tip":
+                    gzip_size = int(row[1].split()[1])
+                    if gzip_size > baseline * 0.6:
+                        print(f"❌ gzip saved less than 40% on the {name}")
+                        ok = False
+
+        # Revalidation of a static endpoint
+        first = await client.get("/api/v1/categories")
+        revalidated = await client.get("/api/v1/categories", headers={"If-None-Match": first.headers["etag"]})
+        print(f"\n/categories: {first.num_bytes_downloaded} B first time, "
+              f"{revalidated.status_code} with {revalidated.num_bytes_downloaded} B on revalidation "
+              f"(Cache-Control: {first.headers['cache-control']})")
+        if revalidated.status_code != 304 or revalidated.num_bytes_downloaded:
+            print("❌ /categories revalidation did not return an empty 304")
+            ok = False
+
+    print("\n🎉 Wire format benchmark passed" if ok else "\n❌ Wire format benchmark failed")
+    return ok
+
+
+def main() -> bool:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'wire.db')}")
+        os.environ.setdefault("MARKET_DB_PATH", os.path.join(tmp_dir, "market.db"))
+        return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
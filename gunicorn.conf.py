@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for production: several uvicorn workers behind one port.
+
+Run: gunicorn -c gunicorn.conf.py main:app
+
+Worker count, host and port come from the same settings as main.py
+(WORKERS=0 means one worker per CPU core). The app is imported in each
+worker after the fork, so every worker builds its own clients and pools.
+"""
+
+from app.config import get_settings, use_shared_store_file, worker_count
+
+settings = get_settings()
+
+bind = f"{settings.host}:{settings.port}"
+workers = worker_count(settings)
+worker_class = "uvicorn.workers.UvicornWorker"
+# Above the request deadline, so slow LLM answers finish before a worker is killed
+timeout = int(settings.request_deadline_seconds) + 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow memory growth cannot accumulate
+max_requests = 10000
+max_requests_jitter = 1000
+
+# Workers share the answer cache and rate limits through one SQLite file
+use_shared_store_file(settings)
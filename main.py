@@ -1,35 +1,103 @@
 import os
+import asyncio
 import logging
+import importlib
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.requests import Request
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
 # Import our modules
-from app.routers import farmer_query, health
-from app.config import get_settings
-from app.database import init_db
+from app.routers import farmer_query, health, jobs
+from app.config import get_settings, use_shared_store_file, worker_count
+from app.metrics import registry
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.deadline import DeadlineMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.services.http_client import close_http_client, get_http_client
+from app.services.location_resolver import location_resolver
+from app.services.image_analysis import image_analysis_service
+from app.services.speech_to_text import speech_service
+from app.services.query_log import query_log_writer
+from app.services.jobs import job_queue
+from app.services.gemini_service import gemini_service
+from app.services.knowledge_base import knowledge_base
+from app.services.prompts import prompt_builder
+from app.wire_format import StaticJSON
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
+# httpx logs every request URL at INFO, and the weather API takes its key in the query string
+logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+async def _background_startup():
+    """
+    Slow startup work, run after the server starts accepting requests.
+    Heavy imports (SQLAlchemy, the HTTP client's transport), the gazetteer,
+    agronomy index, glossary and tokenizer loads and the image model load happen in
+    worker threads so they never block the event loop.
+    """
+    await asyncio.to_thread(get_http_client)
+    await asyncio.to_thread(location_resolver.load)
+    if get_settings().knowledge_enabled:
+        # Rebuilds the index first if the bundled documents changed
+        await asyncio.to_thread(knowledge_base.load)
+    if get_settings().prompt_tokenizer_path:
+        await asyncio.to_thread(prompt_builder.load)
+    if gemini_service.translation is not None:
+        await asyncio.to_thread(gemini_service.translation.glossary.load)
+    database = await asyncio.to_thread(importlib.import_module, "app.database")
+    await database.init_db()
+    logger.info("✅ Database initialized")
+    if image_analysis_service.unavailable_reason is None:
+        try:
+            await asyncio.to_thread(image_analysis_service.classifier.load)
+        except Exception as e:
+            logger.error(f"❌ Image classifier failed to load: {e}")
+
+def _log_background_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"❌ Startup task {task.get_name()} failed: {task.exception()}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("🚀 Starting AI Farmer Query Support System...")
-    await init_db()
-    logger.info("✅ Database initialized")
+    # Database setup runs in the background so requests are served right away;
+    # the query log writer and health checks wait for it before their first run
+    startup = asyncio.create_task(_background_startup(), name="background_startup")
+    startup.add_done_callback(_log_background_failure)
+    settings = get_settings()
+    if settings.query_log_enabled:
+        query_log_writer.start(ready=startup)
+    if settings.jobs_enabled:
+        # Workers wait for startup too, so queued jobs are not run against a half-loaded app
+        job_queue.start(ready=startup)
+    if settings.llm_warmup:
+        # Build the Gemini client in the background so startup is not delayed
+        warmup = asyncio.create_task(asyncio.to_thread(gemini_service.warm_up), name="llm_warmup")
+        warmup.add_done_callback(_log_background_failure)
+    health.health_monitor.start(ready=startup)
     yield
     # Shutdown
     logger.info("🛑 Shutting down application...")
+    await health.health_monitor.stop()
+    # Before the HTTP client closes: running jobs go back to the queue, webhooks get a moment to finish
+    await job_queue.stop()
+    await query_log_writer.stop()
+    await image_analysis_service.close()
+    await speech_service.close()
+    await close_http_client()
 
 # Create FastAPI app
 app = FastAPI(
@@ -48,26 +116,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for farmers on metered mobile data
+if get_settings().compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=get_settings().compression_min_bytes,
+        gzip_level=get_settings().gzip_level,
+        brotli_quality=get_settings().brotli_quality
+    )
+
+# Per-request time budget shared by upstream calls (Gemini, weather, market)
+app.add_middleware(DeadlineMiddleware, default_seconds=get_settings().request_deadline_seconds)
+
+# Request metrics (outermost app middleware so it times the whole request)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(farmer_query.router, prefix="/api/v1", tags=["Farmer Queries"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["Jobs"])
 app.include_router(health.router, prefix="/api/v1", tags=["Health Check"])
 
+_welcome = StaticJSON({
+    "message": "Welcome to AI-Based Farmer Query Support System",
+    "version": "1.0.0",
+    "team": "SIH 2025",
+    "status": "active"
+}, get_settings().static_cache_max_age_seconds)
+
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Welcome endpoint"""
-    return {
-        "message": "Welcome to AI-Based Farmer Query Support System",
-        "version": "1.0.0",
-        "team": "SIH 2025",
-        "status": "active"
-    }
+    return _welcome.response(request)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus-style metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
     settings = get_settings()
-    uvicorn.run(
-        "main:app",
-        host=settings.host,
-        port=settings.port,
-        reload=settings.debug
-    )
\ No newline at end of file
+    workers = worker_count(settings)
+    if workers > 1:
+        # Production mode: no auto-reload, workers share caches and rate limits through SQLite
+        logger.info(f"🗄️ Shared cache and rate limits: {use_shared_store_file(settings)}")
+        uvicorn.run("main:app", host=settings.host, port=settings.port, workers=workers)
+    else:
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=settings.port,
+            reload=settings.debug
+        )
\ No newline at end of file
@@ -53,6 +53,64 @@ async def test_basic_functionality():
         print(f"❌ Market service failed: {e}")
         return False
     
+    # Test 5: Market price store with the bundled fixture CSVs
+    try:
+        import tempfile
+        from app.services.additional_services import MarketService
+        from app.services.market_store import MarketPriceStore
+        
+        fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "market")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = MarketPriceStore(os.path.join(tmp_dir, "market_prices.db"))
+            for name in sorted(os.listdir(os.path.join(fixtures, "fixtures"))):
+                store.ingest_csv(os.path.join(fixtures, "fixtures", name))
+            store.load_coordinates(os.path.join(fixtures, "mandis.csv"))
+            price_info = await MarketService(store=store).get_market_prices("onion", "Lasalgaon")
+            store.close()
+        assert price_info["market"] == "Lasalgaon" and price_info["price_per_kg"] > 0
+        print(f"✅ Market price store working: onion at {price_info['market']} "
+              f"₹{price_info['price_per_kg']}/kg ({price_info['trend']})")
+    except Exception as e:
+        print(f"❌ Market price store failed: {e}")
+        return False
+    
+    # Test 6: Location resolution against the bundled gazetteer
+    try:
+        from app.services.location_resolver import location_resolver
+        
+        match = location_resolver.resolve("Niphad, Nasik")
+        assert match is not None and match.place.district == "Nashik"
+        print(f"✅ Location resolver working: {match.label} ({match.matched})")
+    except Exception as e:
+        print(f"❌ Location resolver failed: {e}")
+        return False
+    
+    # Test 7: Image analysis (optional dependencies and model file)
+    try:
+        from app.services.image_analysis import image_analysis_service
+        
+        reason = image_analysis_service.unavailable_reason
+        if reason is None:
+            print("✅ Image classifier configured")
+        else:
+            print(f"⚠️ Image analysis disabled ({reason}); /ask-image will answer 503")
+    except Exception as e:
+        print(f"❌ Image analysis import failed: {e}")
+        return False
+    
+    # Test 8: Voice queries (optional dependency)
+    try:
+        from app.services.speech_to_text import speech_service
+        
+        reason = speech_service.unavailable_reason
+        if reason is None:
+            print("✅ Speech-to-text installed (model loads on the first voice query)")
+        else:
+            print(f"⚠️ Voice queries disabled ({reason}); /ask-voice will answer 503")
+    except Exception as e:
+        print(f"❌ Speech-to-text import failed: {e}")
+        return False
+    
     print("\n🎉 Basic setup verification complete!")
     print("\nNext steps:")
     print("1. Add your GEMINI_API_KEY to .env file")